@@ -0,0 +1,105 @@
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import random
+import threading
+import time
+import httpx
+import openai
+
+
+class Deadline_Exceeded(TimeoutError):
+    pass
+
+
+def is_retryable(error):
+    # Timeouts, dropped connections, rate limits and server errors are worth another attempt; bad requests are not
+    if isinstance(error, (Deadline_Exceeded, openai.APITimeoutError, openai.APIConnectionError,
+                          openai.RateLimitError, openai.InternalServerError)):
+        return True
+    return isinstance(error, (httpx.TimeoutException, httpx.NetworkError, ConnectionError, TimeoutError))
+
+
+class API_Client:
+    # One keep-alive connection pool and worker pool per process, shared by the OpenAI and vector store callers.
+    # Calls run on the worker pool with a deadline for the whole call, jittered exponential backoff between
+    # attempts, and optionally a hedged duplicate once the first attempt has been outstanding for hedge_after
+
+
+    def __init__(self, max_connections=20, max_workers=8, connect_timeout=5.0, default_timeout=60.0, base_url=None):
+        self.http_client = httpx.Client(limits=httpx.Limits(max_connections=max_connections,
+                                                            max_keepalive_connections=max_connections,
+                                                            keepalive_expiry=60),
+                                        timeout=httpx.Timeout(default_timeout, connect=connect_timeout))
+        # Retries are handled here, with the call's deadline in view, rather than by the SDK
+        self.openai = openai.OpenAI(http_client=self.http_client, max_retries=0, base_url=base_url)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="api_attempt")
+        self.hedges_sent = 0
+        self.hedges_won = 0
+        self.retries = 0
+
+
+    def call(self, request, deadline=None, attempt_timeout=None, retries=2, backoff=0.2, hedge_after=None):
+        # request(timeout) performs one attempt and should pass timeout on to the SDK. Both the call's deadline
+        # and each attempt's timeout are enforced here as well, so a request that ignores them can't hold up the caller
+        expires = None if deadline is None else time.monotonic() + deadline
+        attempt = 0
+        while True:
+            attempt_expires = expires
+            if attempt_timeout is not None:
+                attempt_expires = min(expires or float("inf"), time.monotonic() + attempt_timeout)
+            try:
+                return self.attempt(request, attempt_expires, hedge_after)
+            except Exception as e:
+                remaining = None if expires is None else expires - time.monotonic()
+                if attempt >= retries or not is_retryable(e) or (remaining is not None and remaining <= 0):
+                    raise
+                # Full jitter keeps processes that failed together from retrying in lockstep
+                delay = random.uniform(0, backoff * 2 ** attempt)
+                if remaining is not None:
+                    delay = min(delay, remaining)
+                attempt += 1
+                self.retries += 1
+                time.sleep(delay)
+
+
+    def attempt(self, request, expires, hedge_after):
+        timeout = None if expires is None else max(0.0, expires - time.monotonic())
+        futures = [self.executor.submit(request, timeout)]
+        if hedge_after is not None and (timeout is None or hedge_after < timeout):
+            done, _ = wait(futures, timeout=hedge_after)
+            if not done:
+                self.hedges_sent += 1
+                futures.append(self.executor.submit(request, None if expires is None else max(0.0, expires - time.monotonic())))
+
+        # The first successful response wins; the loser finishes in the background within its own timeout
+        pending = set(futures)
+        error = None
+        while pending:
+            remaining = None if expires is None else expires - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                break
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is not futures[0]:
+                        self.hedges_won += 1
+                    return future.result()
+                error = future.exception()
+        if error is not None and not pending:
+            raise error
+        raise Deadline_Exceeded(f"No response within {timeout:.2f}s")
+
+
+    def stats(self):
+        return {"retries": self.retries, "hedges_sent": self.hedges_sent, "hedges_won": self.hedges_won}
+
+
+_shared_client = None
+_shared_lock = threading.Lock()
+
+
+def shared_api_client():
+    global _shared_client
+    with _shared_lock:
+        if _shared_client is None:
+            _shared_client = API_Client()
+        return _shared_client
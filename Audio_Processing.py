@@ -7,15 +7,25 @@ def process_audio(file_path):
     # Load the .wav file with its native sample rate
     y, sr = librosa.load(file_path, sr=None)
 
+    reduced_noise = process_audio_array(y, sr)
+
+    # Save the processed audio back to the same file
+    sf.write(file_path, reduced_noise, sr, subtype='PCM_16')
+
+
+def process_audio_array(samples, sr, target_sr=None):
+    # Resample once up front so trimming and noise reduction run on the smaller signal
+    y = np.asarray(samples, dtype=np.float32)
+    if target_sr is not None and target_sr != sr:
+        y = librosa.resample(y, orig_sr=sr, target_sr=target_sr)
+        sr = target_sr
+
     # Trim silence and normalize audio
     trimmed_audio, _ = librosa.effects.trim(y, top_db=20)
+    if not len(trimmed_audio):
+        return trimmed_audio
     normalized_audio = librosa.util.normalize(trimmed_audio)
 
-    # Convert to NumPy array for noise reduction
-    samples = np.array(normalized_audio)
-
     # Reduce noise
-    reduced_noise = nr.reduce_noise(samples, sr=sr)
-
-    # Save the processed audio back to the same file
-    sf.write(file_path, reduced_noise, sr, subtype='PCM_16')
\ No newline at end of file
+    reduced_noise = nr.reduce_noise(normalized_audio, sr=sr)
+    return reduced_noise.astype(np.float32)
\ No newline at end of file
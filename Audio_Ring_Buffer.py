@@ -0,0 +1,92 @@
+from multiprocessing import resource_tracker, shared_memory
+import numpy as np
+
+
+class Audio_Ring_Buffer:
+    # Single-writer ring of float32 samples in shared memory. Offsets are absolute sample counts since creation,
+    # so a reader can tell from an (offset, length) descriptor whether the writer has lapped the samples it wants
+
+    HEADER_BYTES = 8
+
+
+    def __init__(self, capacity_seconds=120, sample_rate=16000, name=None):
+        self.sample_rate = sample_rate
+        if name is None:
+            self.capacity = int(capacity_seconds * sample_rate)
+            self.shm = shared_memory.SharedMemory(create=True, size=self.HEADER_BYTES + 4 * self.capacity)
+            self.owner = True
+        else:
+            self.shm = self.attach(name)
+            self.capacity = (self.shm.size - self.HEADER_BYTES) // 4
+            self.owner = False
+        self.map_views()
+        if self.owner:
+            self.written[0] = 0
+
+
+    @staticmethod
+    def attach(name):
+        try:
+            return shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            # Before Python 3.13 attaching registers the segment with this process's resource tracker,
+            # which would unlink it when any reader exits; only the creating process should own it
+            shm = shared_memory.SharedMemory(name=name)
+            resource_tracker.unregister(shm._name, "shared_memory")
+            return shm
+
+
+    def map_views(self):
+        self.written = np.ndarray((1,), dtype=np.int64, buffer=self.shm.buf, offset=0)
+        self.samples = np.ndarray((self.capacity,), dtype=np.float32, buffer=self.shm.buf, offset=self.HEADER_BYTES)
+
+
+    def __getstate__(self):
+        return {"name": self.shm.name, "sample_rate": self.sample_rate}
+
+
+    def __setstate__(self, state):
+        # Processes receive the ring by name and map the same segment
+        self.__init__(sample_rate=state["sample_rate"], name=state["name"])
+
+
+    def write(self, signal):
+        signal = np.asarray(signal, dtype=np.float32)
+        length = len(signal)
+        if length > self.capacity:
+            # Recording has no phrase time limit; keep the start, where the wake word is, rather than fail the capture loop
+            print(f"Utterance of {length / self.sample_rate:.0f}s exceeds the {self.capacity / self.sample_rate:.0f}s audio ring, "
+                  "keeping only its start.")
+            signal, length = signal[:self.capacity], self.capacity
+        offset = int(self.written[0])
+        start = offset % self.capacity
+        first = min(length, self.capacity - start)
+        self.samples[start:start + first] = signal[:first]
+        self.samples[:length - first] = signal[first:]
+        # Publish the new write position only after the samples are in place
+        self.written[0] = offset + length
+        return offset, length
+
+
+    def is_live(self, offset, length):
+        return int(self.written[0]) - offset <= self.capacity and offset + length <= int(self.written[0])
+
+
+    def read(self, offset, length):
+        # Zero-copy view when the span is contiguous, a copy when it wraps; None if it has been overwritten.
+        # The writer can still lap a view while it is in use, so check is_live again once done with it
+        if not self.is_live(offset, length):
+            return None
+        start = offset % self.capacity
+        if start + length <= self.capacity:
+            view = self.samples[start:start + length]
+        else:
+            view = np.concatenate((self.samples[start:], self.samples[:start + length - self.capacity]))
+        return view if self.is_live(offset, length) else None
+
+
+    def close(self):
+        del self.written, self.samples
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
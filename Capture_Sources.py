@@ -0,0 +1,141 @@
+import os
+import re
+import select
+import socket
+import struct
+import numpy as np
+
+
+def parse_capture_sources(spec):
+    # "mic", "kitchen=mic:1,office=mic:2", "test=wav:recordings/", "remote=socket:5005"
+    sources = []
+    for entry in filter(None, (part.strip() for part in spec.split(','))):
+        name, _, definition = entry.rpartition('=')
+        source_type, _, argument = definition.partition(':')
+        if source_type not in ("mic", "wav", "socket"):
+            raise ValueError(f"Unknown capture source type: {source_type}")
+        # Checked here so a bad spec fails at startup rather than inside the capture process
+        if source_type == "mic" and argument and not argument.isdigit():
+            raise ValueError(f"Capture source {entry!r}: mic takes a numeric device index, got {argument!r}")
+        if source_type == "wav" and not argument:
+            raise ValueError(f"Capture source {entry!r}: wav needs a file or directory, e.g. wav:recordings/")
+        if source_type == "socket" and not (argument.isdigit() and 0 < int(argument) < 65536):
+            raise ValueError(f"Capture source {entry!r}: socket needs a port between 1 and 65535, e.g. socket:5005")
+        sources.append({"name": name or None, "type": source_type, "argument": argument or None})
+
+    # Each name is its own conversation log, so two sources must never share one. A lone unnamed source keeps
+    # the default conversation; with several, unnamed ones are named after their type and argument
+    if len(sources) > 1:
+        for source in sources:
+            if source["name"] is None:
+                source["name"] = re.sub(r"\W+", "_", f"{source['type']}_{source['argument'] or 'default'}").strip("_")
+    names = [source["name"] for source in sources]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise ValueError(f"Capture source names must be unique, got duplicates: {', '.join(duplicates)}")
+    return sources
+
+
+def open_capture_source(source, capture_mode="utterance", partial_model_size="tiny", on_partial=None):
+    if source["type"] == "mic":
+        device_index = int(source["argument"]) if source["argument"] is not None else None
+        return Microphone_Source(device_index, capture_mode, partial_model_size, on_partial)
+    if source["type"] == "wav":
+        return Wav_Source(source["argument"])
+    return Socket_Source(int(source["argument"]))
+
+
+class Microphone_Source:
+
+
+    def __init__(self, device_index=None, capture_mode="utterance", partial_model_size="tiny", on_partial=None):
+        # Imported here so only processes that capture from a microphone load the audio stack
+        from Speech_Interface import audio_to_array, record_audio
+        self.audio_to_array = audio_to_array
+        self.record_audio = record_audio
+        self.device_index = device_index
+        # Streaming mode ends a turn on VAD silence plus a finished-looking partial transcript
+        # instead of waiting out record_audio's fixed 2 s pause threshold
+        self.streaming_capture = None
+        if capture_mode == "streaming":
+            from Streaming_Capture import Streaming_Capture
+            from Whisper_Transcriber import Whisper_Transcriber
+            self.streaming_capture = Streaming_Capture(Whisper_Transcriber(model_size=partial_model_size),
+                                                       on_partial=on_partial or (lambda text: print(f"Partial transcript: {text}")),
+                                                       device_index=device_index)
+
+
+    def next_utterance(self, stop_event):
+        if self.streaming_capture is not None:
+            signal, _ = self.streaming_capture.listen(stop_event)
+            return (signal, 16000) if signal is not None else None
+        audio = self.record_audio(self.device_index)
+        if audio is None:
+            return None
+        return self.audio_to_array(audio, sample_rate=None), audio.sample_rate
+
+
+class Wav_Source:
+    # Replays a WAV file, or every WAV in a directory in name order, as one utterance each; for testing
+
+
+    def __init__(self, path, interval=1.0):
+        if os.path.isdir(path):
+            self.files = [os.path.join(path, name) for name in sorted(os.listdir(path)) if name.endswith('.wav')]
+        else:
+            self.files = [path]
+        self.interval = interval
+        self.position = 0
+
+
+    def next_utterance(self, stop_event):
+        if self.position >= len(self.files):
+            stop_event.wait(self.interval)
+            return None
+        if self.position:
+            stop_event.wait(self.interval)
+        path = self.files[self.position]
+        self.position += 1
+        import librosa
+        signal, sample_rate = librosa.load(path, sr=None, mono=True)
+        print(f"Replaying {path}.")
+        return signal, sample_rate
+
+
+class Socket_Source:
+    # Accepts TCP clients on localhost sending utterances as a 4-byte big-endian length followed by
+    # that many bytes of 16 kHz mono 16-bit PCM
+
+
+    def __init__(self, port, host="127.0.0.1", sample_rate=16000):
+        self.sample_rate = sample_rate
+        self.server = socket.create_server((host, port))
+        self.clients = []
+
+
+    def receive_exactly(self, client, size):
+        data = bytearray()
+        while len(data) < size:
+            chunk = client.recv(size - len(data))
+            if not chunk:
+                raise ConnectionError("client disconnected")
+            data += chunk
+        return bytes(data)
+
+
+    def next_utterance(self, stop_event):
+        readable, _, _ = select.select([self.server] + self.clients, [], [], 0.5)
+        for ready in readable:
+            if ready is self.server:
+                client, _ = self.server.accept()
+                self.clients.append(client)
+                continue
+            try:
+                length, = struct.unpack(">I", self.receive_exactly(ready, 4))
+                pcm = self.receive_exactly(ready, length)
+            except (ConnectionError, OSError):
+                self.clients.remove(ready)
+                ready.close()
+                continue
+            return np.frombuffer(pcm, dtype=np.int16).astype(np.float32) / 32768, self.sample_rate
+        return None
@@ -0,0 +1,131 @@
+import json
+import os
+
+
+class Conversation_Log:
+    # Per-user conversation persistence: every message is appended to log.jsonl as the turn happens, and the
+    # in-context messages are periodically compacted into snapshot.json, after which the log starts over.
+    # Writes stay proportional to one message or one context window, however long the history gets, and a
+    # crash loses at most a partially written final line
+
+
+    def __init__(self, directory, user_name, snapshot_every=50, durable=True):
+        self.directory = os.path.join(directory, user_name)
+        self.log_path = os.path.join(self.directory, "log.jsonl")
+        self.snapshot_path = os.path.join(self.directory, "snapshot.json")
+        self.archive_path = os.path.join(self.directory, "archive.jsonl")
+        self.snapshot_every = snapshot_every
+        self.durable = durable
+        self.sequence = 0
+        self.appended_since_snapshot = 0
+        os.makedirs(self.directory, exist_ok=True)
+        self.log_file = None
+
+
+    def exists(self):
+        return os.path.exists(self.snapshot_path) or os.path.exists(self.log_path)
+
+
+    def read_records(self):
+        snapshot_sequence = 0
+        records = []
+        try:
+            with open(self.snapshot_path, 'r') as file:
+                snapshot = json.load(file)
+            snapshot_sequence = snapshot["sequence"]
+            records = snapshot["messages"]
+        except FileNotFoundError:
+            pass
+
+        try:
+            valid_bytes = 0
+            with open(self.log_path, 'rb') as file:
+                for line in file:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # Only the last line can be torn by a crash mid-write; cut it off so new appends start clean
+                        os.truncate(self.log_path, valid_bytes)
+                        break
+                    valid_bytes += len(line)
+                    # Records already folded into the snapshot are left over from a crash before the log was reset
+                    if record["sequence"] > snapshot_sequence:
+                        records.append(record)
+        except FileNotFoundError:
+            pass
+
+        self.sequence = max([snapshot_sequence] + [record["sequence"] for record in records])
+        self.appended_since_snapshot = sum(1 for record in records if record["sequence"] > snapshot_sequence)
+        return records
+
+
+    def load(self, token_budget=None):
+        # Returns (message, token count or None) pairs, newest last. With a budget only the newest messages
+        # that fit are returned, along with the older ones that were left out
+        records = self.read_records()
+        start = len(records)
+        used = 0
+        while start > 0 and token_budget is not None:
+            tokens = records[start - 1].get("tokens")
+            if tokens is None or used + tokens > token_budget:
+                break
+            used += tokens
+            start -= 1
+        if token_budget is None:
+            start = 0
+        loaded = [(record["message"], record.get("tokens")) for record in records[start:]]
+        left_out = [record["message"] for record in records[:start]]
+        return loaded, left_out
+
+
+    def record(self, message, tokens):
+        self.sequence += 1
+        return {"sequence": self.sequence, "tokens": tokens, "message": message}
+
+
+    def append(self, message, tokens=None):
+        # Returns True once enough messages have been appended that a snapshot is due
+        if self.log_file is None:
+            self.log_file = open(self.log_path, 'a')
+        self.log_file.write(json.dumps(self.record(message, tokens)) + "\n")
+        self.log_file.flush()
+        if self.durable:
+            os.fsync(self.log_file.fileno())
+        self.appended_since_snapshot += 1
+        return self.appended_since_snapshot >= self.snapshot_every
+
+
+    def snapshot(self, messages, tokens):
+        # The snapshot replaces the log's contents atomically; the log is only reset once the snapshot is in place
+        records = [{"sequence": self.sequence, "tokens": count, "message": message} for message, count in zip(messages, tokens)]
+        temp_path = self.snapshot_path + ".tmp"
+        with open(temp_path, 'w') as file:
+            json.dump({"sequence": self.sequence, "messages": records}, file)
+            file.flush()
+            if self.durable:
+                os.fsync(file.fileno())
+        os.replace(temp_path, self.snapshot_path)
+
+        if self.log_file is not None:
+            self.log_file.close()
+        self.log_file = open(self.log_path, 'w')
+        self.appended_since_snapshot = 0
+
+
+    def archive(self, messages):
+        # Messages leaving the context are kept here for good before the snapshot that drops them is written,
+        # so history survives even if saving them to the vector database fails
+        if not messages:
+            return
+        with open(self.archive_path, 'a') as file:
+            for message in messages:
+                file.write(json.dumps(message) + "\n")
+            file.flush()
+            if self.durable:
+                os.fsync(file.fileno())
+
+
+    def close(self):
+        if self.log_file is not None:
+            self.log_file.close()
+            self.log_file = None
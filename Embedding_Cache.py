@@ -0,0 +1,129 @@
+from array import array
+from collections import OrderedDict
+from hashlib import md5
+import os
+import sqlite3
+import threading
+import time
+
+
+class Embedding_Cache:
+
+
+    def __init__(self, file_path="system_files/embedding_cache.sqlite", memory_entries=1024, max_entries=100000, touch_batch=64):
+        directory = os.path.dirname(file_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.memory_entries = memory_entries
+        self.max_entries = max_entries
+        self.memory = OrderedDict()
+        # Memory hits are written back to last_used on disk in batches, so disk eviction still sees them as recent
+        self.touched = {}
+        self.touch_batch = touch_batch
+        self.lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self.connection = sqlite3.connect(file_path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS embeddings ("
+                                "model TEXT NOT NULL, "
+                                "text_hash TEXT NOT NULL, "
+                                "vector BLOB NOT NULL, "
+                                "last_used REAL NOT NULL, "
+                                "PRIMARY KEY (model, text_hash))")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        self.connection.commit()
+        self.disk_entries = self.connection.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+
+    @staticmethod
+    def hash_text(text):
+        # Same content hash upsert_to_index uses for vector ids
+        return str(md5(text.encode()).hexdigest())
+
+
+    def remember(self, key, vector):
+        self.memory[key] = vector
+        self.memory.move_to_end(key)
+        if len(self.memory) > self.memory_entries:
+            self.memory.popitem(last=False)
+
+
+    def get(self, model, text):
+        key = (model, self.hash_text(text))
+        with self.lock:
+            vector = self.memory.get(key)
+            if vector is not None:
+                self.memory.move_to_end(key)
+                self.memory_hits += 1
+                self.touched[key] = time.time()
+                if len(self.touched) >= self.touch_batch:
+                    self.write_touched()
+                    self.connection.commit()
+                return vector
+
+            row = self.connection.execute("SELECT vector FROM embeddings WHERE model = ? AND text_hash = ?", key).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            vector = array('f', row[0]).tolist()
+            self.connection.execute("UPDATE embeddings SET last_used = ? WHERE model = ? AND text_hash = ?", (time.time(), *key))
+            self.connection.commit()
+            self.remember(key, vector)
+            self.disk_hits += 1
+            return vector
+
+
+    def put(self, model, text, vector):
+        key = (model, self.hash_text(text))
+        with self.lock:
+            self.remember(key, list(vector))
+            exists = self.connection.execute("SELECT 1 FROM embeddings WHERE model = ? AND text_hash = ?", key).fetchone()
+            self.connection.execute("INSERT OR REPLACE INTO embeddings (model, text_hash, vector, last_used) VALUES (?, ?, ?, ?)",
+                                    (*key, array('f', vector).tobytes(), time.time()))
+            if exists is None:
+                self.disk_entries += 1
+                self.evict()
+            self.connection.commit()
+
+
+    def write_touched(self):
+        self.connection.executemany("UPDATE embeddings SET last_used = ? WHERE model = ? AND text_hash = ?",
+                                    [(used, *key) for key, used in self.touched.items()])
+        self.touched = {}
+
+
+    def evict(self):
+        excess = self.disk_entries - self.max_entries
+        if excess <= 0:
+            return
+        self.write_touched()
+        self.connection.execute("DELETE FROM embeddings WHERE rowid IN "
+                                "(SELECT rowid FROM embeddings ORDER BY last_used LIMIT ?)", (excess,))
+        self.disk_entries -= excess
+        self.evictions += excess
+
+
+    def stats(self):
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+            "memory_entries": len(self.memory),
+            "disk_entries": self.disk_entries,
+            "evictions": self.evictions,
+        }
+
+
+    def close(self):
+        with self.lock:
+            self.write_touched()
+            self.connection.commit()
+            self.connection.close()
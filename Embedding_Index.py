@@ -0,0 +1,111 @@
+from hashlib import md5
+import os
+import time
+import librosa
+import torch
+
+
+class Embedding_Index:
+    # Labelled audio samples embedded with the speaker model and cached on disk. Each sample is re-encoded only
+    # when its file changes, and the embeddings are kept as one matrix so a lookup is a single matrix product.
+    # Subclasses say where the samples are and what their labels mean by overriding samples()
+
+
+    def __init__(self, model, samples_dir, index_path, sample_rate=16000, refresh_interval=10.0):
+        self.model = model
+        self.samples_dir = samples_dir
+        self.index_path = index_path
+        self.sample_rate = sample_rate
+        self.enrollments = self.load()
+        self.sample_labels = []
+        self.embeddings = None
+        # New or changed sample files are picked up at most this often, not on every lookup
+        self.refresh_interval = refresh_interval
+        self.last_enrolled = 0.0
+        self.enroll()
+
+
+    def load(self):
+        try:
+            enrollments = torch.load(self.index_path)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            print(f"Error loading embedding index from {self.index_path}, re-enrolling: {e}")
+            return {}
+        # Entries cached before samples had a label field are re-enrolled
+        return {key: enrollment for key, enrollment in enrollments.items() if "label" in enrollment}
+
+
+    def save(self):
+        directory = os.path.dirname(self.index_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_path = self.index_path + ".tmp"
+        torch.save(self.enrollments, temp_path)
+        os.replace(temp_path, self.index_path)
+
+
+    def embed(self, signal):
+        return self.embed_batch([signal])[0]
+
+
+    def embed_batch(self, signals):
+        # Utterances are zero-padded into one batch; relative lengths keep the padding out of the pooled statistics
+        lengths = [len(signal) for signal in signals]
+        longest = max(lengths)
+        batch = torch.zeros(len(signals), longest)
+        for i, signal in enumerate(signals):
+            batch[i, :lengths[i]] = torch.as_tensor(signal, dtype=torch.float32)
+        with torch.no_grad():
+            embeddings = self.model.encode_batch(batch, wav_lens=torch.tensor(lengths, dtype=torch.float32) / longest)
+        return torch.nn.functional.normalize(embeddings.squeeze(1), dim=1)
+
+
+    def samples(self):
+        # Yields (cache key, path, label) for every sample file
+        raise NotImplementedError
+
+
+    def refresh(self):
+        if time.monotonic() - self.last_enrolled >= self.refresh_interval:
+            self.enroll()
+
+
+    def enroll(self):
+        self.last_enrolled = time.monotonic()
+        changed = False
+        seen = set()
+        for key, path, label in self.samples():
+            seen.add(key)
+            stat = os.stat(path)
+            enrollment = self.enrollments.get(key)
+            if enrollment and enrollment["mtime"] == stat.st_mtime and enrollment["size"] == stat.st_size:
+                continue
+
+            with open(path, 'rb') as file:
+                file_hash = md5(file.read()).hexdigest()
+            if enrollment and enrollment["md5"] == file_hash:
+                enrollment["mtime"], enrollment["size"] = stat.st_mtime, stat.st_size
+            else:
+                signal, _ = librosa.load(path, sr=self.sample_rate, mono=True)
+                self.enrollments[key] = {
+                    "label": label,
+                    "mtime": stat.st_mtime,
+                    "size": stat.st_size,
+                    "md5": file_hash,
+                    "embedding": self.embed(signal),
+                }
+                print(f"Enrolled sample {key} from {self.samples_dir}.")
+            changed = True
+
+        for name in set(self.enrollments) - seen:
+            del self.enrollments[name]
+            changed = True
+
+        if changed or self.embeddings is None:
+            names = sorted(self.enrollments)
+            self.sample_labels = [self.enrollments[name]["label"] for name in names]
+            self.embeddings = torch.stack([self.enrollments[name]["embedding"] for name in names]) if names else None
+        if changed:
+            self.save()
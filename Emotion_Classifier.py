@@ -0,0 +1,80 @@
+"""Nearest-centroid emotion classification over the voice embeddings used for speaker identification.
+
+Labelled examples are read from a directory with one subdirectory per emotion, named as the label should
+appear in the prompt:
+
+    emotion_samples/
+        Happy/
+            alec_laughing.wav
+            sam_excited.wav
+        Sad/
+            alec_quiet.wav
+        Angry/
+            ...
+
+Any sample rate works (files are resampled to 16 kHz mono); a few seconds of speech per file and several files
+per emotion, from more than one speaker, give usable centroids. Files are embedded once and cached in
+system_files/emotion_index.pt, and added, changed or removed files are picked up while Jarvis runs. With no
+samples, or no label that is a clear match, every utterance is classified as Neutral.
+"""
+import os
+import torch
+from Embedding_Index import Embedding_Index
+
+
+class Emotion_Classifier(Embedding_Index):
+    # Classifying an utterance costs a matrix product against the centroids rather than a second network.
+    # These embeddings are dominated by who is speaking, so a label is only returned when it is both close and
+    # clearly closer than the runner-up; otherwise the default is
+
+
+    def __init__(self, model, samples_dir="emotion_samples", index_path="system_files/emotion_index.pt",
+                 sample_rate=16000, default="Neutral", min_similarity=0.5, min_margin=0.05):
+        self.default = default
+        self.min_similarity = min_similarity
+        self.min_margin = min_margin
+        self.labels = []
+        self.centroids = None
+        self.centroids_for = None
+        super().__init__(model, samples_dir, index_path, sample_rate=sample_rate)
+        if self.embeddings is None:
+            print(f"No emotion samples in {samples_dir}/<Emotion>/*.wav, every utterance will be classified {default}.")
+
+
+    def samples(self):
+        if os.path.isdir(self.samples_dir):
+            for label_entry in os.scandir(self.samples_dir):
+                if not label_entry.is_dir():
+                    continue
+                for entry in os.scandir(label_entry.path):
+                    if entry.name.endswith('.wav'):
+                        yield f"{label_entry.name}/{entry.name}", entry.path, label_entry.name
+
+
+    def update_centroids(self):
+        # Recomputed only when enrollment rebuilt the embedding matrix
+        if self.centroids_for is self.embeddings:
+            return
+        self.centroids_for = self.embeddings
+        if self.embeddings is None:
+            self.labels, self.centroids = [], None
+            return
+        self.labels = sorted(set(self.sample_labels))
+        self.centroids = torch.nn.functional.normalize(torch.stack([
+            self.embeddings[[i for i, label in enumerate(self.sample_labels) if label == emotion]].mean(dim=0)
+            for emotion in self.labels
+        ]), dim=1)
+
+
+    def classify(self, embedding):
+        # Callers refresh the enrollment first, once per batch
+        self.update_centroids()
+        if self.centroids is None:
+            return self.default, 0.0
+        similarities = self.centroids @ embedding
+        top = torch.topk(similarities, min(2, len(self.labels)))
+        similarity = float(top.values[0])
+        margin = similarity - float(top.values[1]) if len(self.labels) > 1 else similarity
+        if similarity < self.min_similarity or margin < self.min_margin:
+            return self.default, similarity
+        return self.labels[int(top.indices[0])], similarity
@@ -1,37 +1,128 @@
-from Audio_Processing import process_audio
+from Audio_Ring_Buffer import Audio_Ring_Buffer
 from datetime import datetime
-from multiprocessing import Process, Queue, Event
-from OpenAI_Interface import OpenAI_Interface
-from Pinecone_Interface import Pinecone_Interface
-from Speech_Interface import record_audio, wav_to_audio, speech_to_text, text_to_speech
+from Latency_Tracer import Latency_Collector, record_stage
+from multiprocessing import Process, Queue, Event, get_start_method
+from Model_Loader import preload_models, print_startup_report, report_ready
+import numpy as np
+import os
+from queue import Empty
+import time
+from Process_Scheduler import Pause_Event, drain_fair, drain_queue, wait_for_queues
+from Result_Bus import Result_Bus, publish_result, put_bounded
+from Speculative_Retrieval import Speculative_Retriever, normalize_query
+from Capture_Sources import open_capture_source, parse_capture_sources
 
+# Role-specific modules (Whisper, SpeechBrain, OpenAI, Pinecone, TTS) are imported inside the process that
+# uses them, so spawned children don't each import every model library when they re-import this module
 
-def speech_recognition_process(user_messages_queue,
+
+def speech_recognition_process(capture_source,
+                               user_messages_queue,
                                audio_queue,
+                               audio_ring,
+                               results_queue,
                                pause_listening_event,
-                               stop_event):
+                               stop_event,
+                               capture_mode="utterance",
+                               partial_model_size="tiny",
+                               wake_word_mode="off",
+                               wake_word_threshold=None,
+                               source_index=0,
+                               trace_queue=None,
+                               startup_queue=None):
     
+    from Audio_Processing import process_audio_array
+    # A partial transcript that comes back unchanged from one re-transcription to the next is treated as stable
+    # and published for speculative retrieval, under the id of the capture in progress. Partials arriving once
+    # capture has returned are dropped, so they can never land on the next utterance's id
+    capturing = [None]
+    last_partial = [None]
+    published_partial = [False]
+
+    def publish_partial(text):
+        print(f"Partial transcript: {text}")
+        capture_id = capturing[0]
+        normalized = normalize_query(text)
+        if capture_id is not None and normalized and normalized == last_partial[0]:
+            publish_result(results_queue, capture_id, "partial", text)
+            published_partial[0] = True
+        last_partial[0] = normalized
+
+    capture_source = open_capture_source(capture_source, capture_mode, partial_model_size, on_partial=publish_partial)
+
+    # In gate mode only utterances the keyword spotter accepts reach Whisper; audit mode transcribes everything
+    # and lets message handling compare the spotter with the transcripts
+    wake_word_spotter = None
+    if wake_word_mode != "off":
+        from Wake_Word_Spotter import Wake_Word_Spotter
+        try:
+            wake_word_spotter = Wake_Word_Spotter(threshold=wake_word_threshold)
+        except FileNotFoundError as e:
+            print(f"Wake word spotter disabled: {e}")
+
+    report_ready(startup_queue)
+    # The id is assigned when capture starts and only moves on once it is used. A capture that is thrown away
+    # after a partial went out under its id is marked skipped, so speculative retrieval for it is cancelled
+    utterance_id = 1
     error_twice_sequentially = False
+
+    def discard(reason):
+        nonlocal utterance_id
+        if published_partial[0]:
+            publish_result(results_queue, utterance_id, "skipped", reason)
+            utterance_id += 1
+        published_partial[0] = False
+
     while not stop_event.is_set():
-        if pause_listening_event.is_set():
+        if not pause_listening_event.wait_until_clear(timeout=0.5):
             continue
         try:
-            audio = record_audio()
-            if pause_listening_event.is_set():
+            last_partial[0] = None
+            capturing[0] = utterance_id
+            try:
+                captured = capture_source.next_utterance(stop_event)
+            finally:
+                capturing[0] = None
+            if pause_listening_event.is_set() or captured is None:
+                discard("paused" if captured is not None else "no audio")
                 continue
-            if audio is not None:
-                audio_wav = audio.get_wav_data()
-                with open("system_files/user_message.wav", "wb") as f:
-                    f.write(audio_wav)
-                    process_audio("system_files/user_message.wav")
-                    audio = wav_to_audio("system_files/user_message.wav")
+            capture_end = time.monotonic()
+            # Preprocess the PCM buffer in memory and resample once to the 16 kHz rate STT and speaker ID expect
+            samples, sample_rate = captured
+            signal = process_audio_array(samples, sample_rate, target_sr=16000)
+            preprocessed = time.monotonic()
+
+            wake_word_detected = None
+            if wake_word_spotter is not None and len(signal):
+                wake_word_detected, score = wake_word_spotter.detect(signal)
+                if wake_word_mode == "gate" and not wake_word_detected:
+                    print(f"No wake word detected (score {score:.2f}), skipping transcription.")
+                    discard("no wake word")
+                    continue
+
+            if not len(signal):
+                discard("empty signal")
+            else:
                 # Process audio before determining if keyword is present to maximize responsiveness
-                # Uneeded results will be discarded in the message handling process
-                audio_queue.put(audio)
-                user_messages_queue.put(audio)
+                # Uneeded results will be discarded in the message handling process.
+                # The samples are written once to shared memory and only small descriptors travel over the queues.
+                # Under a backlog the oldest utterances are dropped; their analysis results are simply never joined
+                record_stage(trace_queue, (source_index, utterance_id), "capture_end", capture_end)
+                record_stage(trace_queue, (source_index, utterance_id), "preprocessed", preprocessed)
+                offset, length = audio_ring.write(signal)
+                # Published before the audio is queued, so it is on the results queue ahead of the transcript
+                if wake_word_detected is not None:
+                    publish_result(results_queue, utterance_id, "wake_word", wake_word_detected)
+                put_bounded(audio_queue, (utterance_id, offset, length))
+                # A transcription request dropped under backlog is marked skipped, so the transcript after it isn't held
+                put_bounded(user_messages_queue, (utterance_id, offset, length),
+                            on_drop=lambda dropped: publish_result(results_queue, dropped[0], "skipped", "backlog"))
+                utterance_id += 1
+                published_partial[0] = False
 
         except Exception as e:
             print("ERROR RECORDING AUDIO: ", e)
+            discard("capture error")
             if error_twice_sequentially:
                 stop_event.set()
                 print("Stopping audio recording process due to repeated errors.")
@@ -40,24 +131,124 @@ def speech_recognition_process(user_messages_queue,
                 error_twice_sequentially = True
 
 
-def voice_analysis_process(audio_queue,
-                           speaker_recognized_queue,
-                           emotion_recognized_queue,
-                           stop_event):
+def speech_to_text_process(user_messages_queues,
+                           audio_rings,
+                           results_queues,
+                           stop_event,
+                           model_size="base",
+                           threads=None,
+                           max_batch_size=8,
+                           trace_queue=None,
+                           startup_queue=None,
+                           warm_up=False):
+    
+    from Whisper_Transcriber import Whisper_Transcriber
+    # The model is loaded once here and stays warm for every utterance
+    transcriber = Whisper_Transcriber(model_size=model_size, threads=threads)
+    if warm_up:
+        # One decode of silence so the first real utterance doesn't pay for kernel selection and allocations
+        transcriber.transcribe(np.zeros(16000, dtype=np.float32))
+    report_ready(startup_queue)
+    next_source = 0
+    error_twice_sequentially = False
+
+    # Every utterance taken off the queue gets either a transcript or a skipped marker, so message handling
+    # never waits out its reorder window for one that isn't coming
+    def skip(source_index, utterance_id, reason):
+        print(f"Utterance {utterance_id} was {reason}.")
+        publish_result(results_queues[source_index], utterance_id, "skipped", reason)
+
+    while not stop_event.is_set():
+        batch = []
+        try:
+            if not wait_for_queues(user_messages_queues, 0.5):
+                continue
+            # Transcribe any backlog in one padded batch, taken round-robin across capture sources
+            for source_index, (utterance_id, offset, length) in drain_fair(user_messages_queues, max_batch_size, next_source):
+                signal = audio_rings[source_index].read(offset, length)
+                if signal is None:
+                    skip(source_index, utterance_id, "overwritten in the audio ring before transcription")
+                    continue
+                batch.append((source_index, utterance_id, offset, length, signal))
+            next_source += 1
+            if not batch:
+                continue
+            signals = [signal for *_, signal in batch]
+
+            start = time.monotonic()
+            texts = transcriber.transcribe_batch(signals)
+            elapsed = time.monotonic() - start
+
+            for (source_index, utterance_id, offset, length, signal), text in zip(batch, texts):
+                # The signals are views into the ring; one lapped while it was being decoded gives garbage
+                if not audio_rings[source_index].is_live(offset, length):
+                    skip(source_index, utterance_id, "overwritten in the audio ring during transcription")
+                    continue
+                duration = len(signal) / 16000
+                print(f"Transcribed {duration:.2f}s utterance in {elapsed:.2f}s "
+                      f"(batch of {len(signals)}, RTF {elapsed / max(duration, 1e-6):.2f}): {text}")
+                record_stage(trace_queue, (source_index, utterance_id), "transcribed")
+                publish_result(results_queues[source_index], utterance_id, "transcript", text)
+            error_twice_sequentially = False
+
+        except Exception as e:
+            print("ERROR TRANSCRIBING AUDIO: ", e)
+            for source_index, utterance_id, *_ in batch:
+                skip(source_index, utterance_id, "not transcribed")
+            if error_twice_sequentially:
+                stop_event.set()
+                print("Stopping speech to text process due to repeated errors.")
+                break
+            else:
+                error_twice_sequentially = True
+
+
+def voice_analysis_process(audio_queues,
+                           audio_rings,
+                           results_queues,
+                           stop_event,
+                           trace_queue=None,
+                           startup_queue=None,
+                           warm_up=False,
+                           max_batch_size=4):
     
+    from Voice_Analysis_Engine import Voice_Analysis_Engine
+    # Speaker and emotion both come from one shared embedding per utterance
+    voice_analysis_engine = Voice_Analysis_Engine()
+    if warm_up:
+        voice_analysis_engine.analyze(np.zeros(16000, dtype=np.float32))
+    report_ready(startup_queue)
+    next_source = 0
     error_twice_sequentially = False
     while not stop_event.is_set():
         try:
-            audio = audio_queue.get()
-            print("Audio received for analysis.")
-            
-            # speaker recognition
-            speaker_recognized_queue.put("Alec")
-            print("Speaker recognized.")
+            if not wait_for_queues(audio_queues, 0.5):
+                continue
+            # Utterances that queued up while the previous batch ran are embedded together
+            batch = []
+            for source_index, (utterance_id, offset, length) in drain_fair(audio_queues, max_batch_size, next_source):
+                signal = audio_rings[source_index].read(offset, length)
+                if signal is None:
+                    print(f"Utterance {utterance_id} was overwritten in the audio ring before analysis.")
+                    continue
+                batch.append((source_index, utterance_id, offset, length, signal))
+            next_source += 1
+            if not batch:
+                continue
+            print(f"Audio received for analysis ({len(batch)} utterances).")
 
-            # emotion recognition
-            emotion_recognized_queue.put("Neutral")
-            print("Emotion recognized.")
+            results = voice_analysis_engine.analyze_batch([signal for *_, signal in batch])
+            for (source_index, utterance_id, offset, length, _), (speaker, emotion) in zip(batch, results):
+                if not audio_rings[source_index].is_live(offset, length):
+                    print(f"Utterance {utterance_id} was overwritten in the audio ring during analysis.")
+                    continue
+                speaker = speaker or "Unknown"
+                record_stage(trace_queue, (source_index, utterance_id), "speaker_identified")
+                publish_result(results_queues[source_index], utterance_id, "speaker", speaker)
+                record_stage(trace_queue, (source_index, utterance_id), "emotion_classified")
+                publish_result(results_queues[source_index], utterance_id, "emotion", emotion)
+                print(f"Speaker recognized: {speaker}, emotion recognized: {emotion}")
+            error_twice_sequentially = False
 
         except Exception as e:
             print("ERROR PROCESSING AUDIO: ", e)
@@ -69,30 +260,68 @@ def voice_analysis_process(audio_queue,
                 error_twice_sequentially = True
 
 
-def message_handling_process(user_messages_queue,
-                             speaker_recognized_queue,
-                             emotion_recognized_queue,
+def message_handling_process(results_queue,
                              jarvis_messages_queue,
                              db_upsert_queue,
                              db_query_queue,
                              db_response_queue,
                              pause_listening_event,
-                             stop_event):
+                             stop_event,
+                             source_index=0,
+                             conversation="Alec",
+                             speaker_deadline=3.0,
+                             emotion_deadline=1.0,
+                             wake_word_mode="off",
+                             retrieval_mode="sequential",
+                             retrieval_timeout=10.0,
+                             retrieval_token_budget=1500,
+                             trace_queue=None,
+                             startup_queue=None):
     
+    from OpenAI_Interface import OpenAI_Interface
     error_twice_sequentially = False
     receiving_response_error_twice_sequentially = False
     OpenAI = OpenAI_Interface(model="gpt-4-1106-preview",
                               temperature=0,
                               stream=True,
                               db_upsert_queue=db_upsert_queue,
-                              jarvis_messages_queue=jarvis_messages_queue)
+                              jarvis_messages_queue=jarvis_messages_queue,
+                              conversation=conversation,
+                              trace_queue=trace_queue,
+                              retrieval_token_budget=retrieval_token_budget)
+    retriever = Speculative_Retriever(db_query_queue, db_response_queue, source_index=source_index)
+
+    # In speculative mode retrieval starts from a stable partial or the finished transcript, keyed on the user
+    # message alone, so it runs behind STT and alongside speaker and emotion analysis instead of after them
+    def speculate(utterance_id, stage, value):
+        # A capture thrown away after its partials went out (e.g. rejected by the wake-word gate) cancels its queries
+        if stage == "skipped":
+            retriever.discard(utterance_id)
+        elif stage in ("partial", "transcript") and "jarvis" in value.lower():
+            record_stage(trace_queue, (source_index, utterance_id), "retrieval_sent")
+            retriever.start(utterance_id, value, f"User message: {value}")
+
+    result_bus = Result_Bus(results_queue, on_result=speculate if retrieval_mode == "speculative" else None)
+    wake_word_audit = None
+    if wake_word_mode == "audit":
+        from Wake_Word_Spotter import Wake_Word_Audit
+        wake_word_audit = Wake_Word_Audit()
+    report_ready(startup_queue)
 
     while not stop_event.is_set():
         try:
-            audio = user_messages_queue.get()
-            text = speech_to_text(audio)
+            utterance_id, text = result_bus.next_transcript(timeout=0.5)
+            if utterance_id is None:
+                continue
             text_lower = text.lower()
 
+            if wake_word_audit is not None:
+                # The spotter's decision is published before the audio is queued, so it reaches the results queue
+                # ahead of the transcript; the short wait only covers the queue's feeder thread
+                detected = result_bus.wait_for(utterance_id, "wake_word", 0.1, default=None)
+                if detected is not None:
+                    wake_word_audit.record(detected, "jarvis" in text_lower)
+
             if text:
                 if "stop listening" in text_lower:
                     print("Shutting down Jarvis.")
@@ -101,19 +330,26 @@ def message_handling_process(user_messages_queue,
                 elif "jarvis" in text_lower:
                     try:
                         pause_listening_event.set()
-                        user = speaker_recognized_queue.get()
+                        user = result_bus.wait_for(utterance_id, "speaker", speaker_deadline, default="Unknown")
                         print(f"User: {user}\n")
                         timestamp = datetime.now().isoformat()
-                        db_query_queue.put((f"User: {user}\n"
-                                            f"Timestamp: {timestamp}\n"
-                                            f"User message: {text}\n"))
-                        db_results = db_response_queue.get()
-                        user_emotion = emotion_recognized_queue.get()
+                        if retrieval_mode == "speculative":
+                            db_results = retriever.result(utterance_id, text, f"User message: {text}", timeout=retrieval_timeout)
+                        else:
+                            record_stage(trace_queue, (source_index, utterance_id), "retrieval_sent")
+                            db_results = retriever.result(utterance_id, text,
+                                                          f"User: {user}\n"
+                                                          f"Timestamp: {timestamp}\n"
+                                                          f"User message: {text}\n", timeout=retrieval_timeout)
+                        record_stage(trace_queue, (source_index, utterance_id), "retrieved")
+                        user_emotion = result_bus.wait_for(utterance_id, "emotion", emotion_deadline, default="Neutral")
                         print(f"User emotion: {user_emotion}\n")
+                        # Analysis results for this and any skipped earlier utterances are stale from here on
+                        result_bus.finish(utterance_id)
 
-                        prompt = OpenAI.make_prompt(user, user_emotion, timestamp, text, db_results)
+                        prompt, prompt_tokens = OpenAI.make_prompt(user, user_emotion, timestamp, text, db_results)
                         print(prompt)
-                        OpenAI.message("user", prompt, OpenAI.tools)
+                        OpenAI.message("user", prompt, OpenAI.tools, trace_id=(source_index, utterance_id), token_count=prompt_tokens)
                         continue
 
                     except Exception as e:
@@ -126,10 +362,7 @@ def message_handling_process(user_messages_queue,
                             receiving_response_error_twice_sequentially = True
 
             # Remove irrelevant audio analysis results
-            if not speaker_recognized_queue.empty() and not emotion_recognized_queue.empty():
-                speaker_recognized_queue.get()
-                emotion_recognized_queue.get()
-                print("Cleared irrelevant audio analysis results.")
+            result_bus.finish(utterance_id)
 
         except Exception as e:
             print("ERROR IN AUDIO PROCESSING: ", e)
@@ -140,21 +373,34 @@ def message_handling_process(user_messages_queue,
             else:
                 error_twice_sequentially = True
 
-    OpenAI.save_messages("system_files/messages.json", "Alec")
+    OpenAI.save_messages()
 
 
 def text_to_speech_process(jarvis_messages_queue,
-                           pause_listening_event,
-                           stop_event):
+                           pause_listening_events,
+                           stop_event,
+                           trace_queue=None,
+                           startup_queue=None):
     
-    text_to_speech("Systems online, Sir.")
+    from TTS_Engine import TTS_Engine
+    # Listening resumes once everything queued so far has finished playing
+    def resume_listening():
+        for pause_listening_event in pause_listening_events:
+            pause_listening_event.clear()
+
+    tts_engine = TTS_Engine(on_idle=resume_listening,
+                            on_first_audio=lambda trace_id: record_stage(trace_queue, trace_id, "first_audio_out"))
+    tts_engine.start()
+    tts_engine.say("Systems online, Sir.")
+    report_ready(startup_queue)
     error_twice_sequentially = False
     while not stop_event.is_set():
         try:
-            sentence = jarvis_messages_queue.get()
-            print(f"Speaking: {sentence}\n") 
-            text_to_speech(sentence)
-            pause_listening_event.clear()
+            if not wait_for_queues([jarvis_messages_queue], 0.5):
+                continue
+            for sentence, trace_id in drain_queue(jarvis_messages_queue):
+                print(f"Speaking: {sentence}\n")
+                tts_engine.say(sentence, trace_id)
 
         except Exception as e:
             print("ERROR IN TTS: ", e)
@@ -165,59 +411,242 @@ def text_to_speech_process(jarvis_messages_queue,
             else:
                 error_twice_sequentially = True
 
+    tts_engine.stop()
+
 
 def database_interaction_process(db_upsert_queue,
                                  db_query_queue,
-                                 db_response_queue,
-                                 stop_event):
+                                 db_response_queues,
+                                 stop_event,
+                                 upsert_batch_size=32,
+                                 upsert_batch_window=0.5,
+                                 idle_timeout=0.5,
+                                 compaction_interval=0,
+                                 compaction_threshold=0.95,
+                                 upsert_retry_delay=5.0,
+                                 max_upsert_attempts=3,
+                                 startup_queue=None):
     
-    pinecone_interface = Pinecone_Interface()    
-    while not stop_event.is_set():
-        try:
-            while not db_upsert_queue.empty():
-                db_info = db_upsert_queue.get()
-                print(f"Upserting to index: {db_info}\n")
-                pinecone_interface.upsert_to_index(db_info)
+    from Pinecone_Interface import Pinecone_Interface
+    pinecone_interface = Pinecone_Interface()
+    report_ready(startup_queue)
+    pending_upserts = []
+    batch_started = None
+    # Texts that failed to upsert stay pending and are retried after a delay, up to max_upsert_attempts each
+    upsert_attempts = {}
+    retry_after = 0.0
 
+    def upsert_pending(texts):
+        try:
+            failed = pinecone_interface.upsert_batch_to_index(texts)
         except Exception as e:
             print("ERROR UPSERTING TO INDEX: ", e)
+            failed = list(dict.fromkeys(texts))
+        retry = []
+        for text in failed:
+            upsert_attempts[text] = upsert_attempts.get(text, 0) + 1
+            if upsert_attempts[text] < max_upsert_attempts:
+                retry.append(text)
+            else:
+                del upsert_attempts[text]
+                print(f"Dropped from upsert after {max_upsert_attempts} attempts: {text}\n")
+        for text in set(texts) - set(failed):
+            upsert_attempts.pop(text, None)
+        return retry
+
+    compaction_due = time.monotonic() + compaction_interval
+    while not stop_event.is_set():
+        # Opt-in, since merging deletes memories for good: near-duplicates are merged periodically, only while
+        # no query or upsert is waiting
+        if compaction_interval and time.monotonic() >= compaction_due and not pending_upserts \
+                and not wait_for_queues([db_query_queue, db_upsert_queue], 0):
+            pinecone_interface.compact_index(compaction_threshold)
+            compaction_due = time.monotonic() + compaction_interval
 
+        # Sleep until either queue has work, the open upsert batch is due, or it's time to check stop_event
+        timeout = idle_timeout
+        if pending_upserts:
+            upsert_due = max(batch_started + upsert_batch_window, retry_after)
+            timeout = max(0, min(idle_timeout, upsert_due - time.monotonic()))
+        wait_for_queues([db_query_queue, db_upsert_queue], timeout)
+
+        # Queries are on the critical path of a turn, so they are always served before background upserts
         try:
-            while not db_query_queue.empty():
-                query_text = db_query_queue.get()
+            # A query whose cancellation arrives in the same drain is never run
+            queries = drain_queue(db_query_queue)
+            cancelled = {(source_index, request_id) for source_index, request_id, query_text in queries if query_text is None}
+            for source_index, request_id, query_text in queries:
+                if query_text is None or (source_index, request_id) in cancelled:
+                    continue
                 results = pinecone_interface.query_index(query_text)
-                db_response_queue.put(results)
+                db_response_queues[source_index].put((request_id, results))
 
         except Exception as e:
             print("ERROR QUERYING INDEX: ", e)
 
+        for db_info in drain_queue(db_upsert_queue, max(0, upsert_batch_size - len(pending_upserts))):
+            print(f"Queued for upsert: {db_info}\n")
+            if not pending_upserts:
+                batch_started = time.monotonic()
+            pending_upserts.append(db_info)
 
-if __name__ == "__main__":
-    stop_event = Event()
-    pause_listening_event = Event()
-    user_messages_queue = Queue()
-    audio_queue = Queue()
-    speaker_recognized_queue = Queue()
-    emotion_recognized_queue = Queue()
+        # Coalesce upserts from one turn into a single embeddings request and bulk write
+        now = time.monotonic()
+        batch_due = pending_upserts and now >= retry_after and (len(pending_upserts) >= upsert_batch_size
+                                                                or now - batch_started >= upsert_batch_window)
+        # A query that arrived in the meantime goes first
+        if not batch_due or wait_for_queues([db_query_queue], 0):
+            continue
+        print(f"Upserting {len(pending_upserts)} items to index.\n")
+        pending_upserts = upsert_pending(pending_upserts)
+        if pending_upserts:
+            print(f"Retrying {len(pending_upserts)} failed upserts in {upsert_retry_delay:.0f}s.\n")
+            retry_after = time.monotonic() + upsert_retry_delay
+            batch_started = time.monotonic()
+
+    # On shutdown whatever is still queued or pending gets one last attempt
+    pending_upserts += drain_queue(db_upsert_queue)
+    if pending_upserts:
+        print(f"Upserting {len(pending_upserts)} items to index before shutting down.\n")
+        upsert_attempts.clear()
+        for text in upsert_pending(pending_upserts):
+            print(f"Dropped from upsert at shutdown: {text}\n")
+
+
+def latency_collector_process(trace_queue,
+                              stop_event,
+                              report_path="system_files/latency",
+                              report_interval=60,
+                              http_port=None,
+                              startup_queue=None):
+    
+    # Stage timestamps from every process are joined here; the report is rewritten periodically and on shutdown
+    collector = Latency_Collector()
+    if http_port:
+        collector.serve(http_port)
+    report_ready(startup_queue)
+    last_report = time.monotonic()
+    error_twice_sequentially = False
+    while not stop_event.is_set():
+        try:
+            if wait_for_queues([trace_queue], 0.5):
+                for trace_id, stage, timestamp in drain_queue(trace_queue):
+                    collector.accept(trace_id, stage, timestamp)
+            collector.expire()
+            if time.monotonic() - last_report >= report_interval:
+                collector.dump(report_path)
+                last_report = time.monotonic()
+
+        except Exception as e:
+            print("ERROR COLLECTING LATENCY: ", e)
+            if error_twice_sequentially:
+                print("Stopping latency collection due to repeated errors.")
+                break
+            else:
+                error_twice_sequentially = True
+
+    try:
+        collector.dump(report_path)
+    except OSError as e:
+        print("ERROR WRITING LATENCY REPORT: ", e)
+    collector.close()
+
+
+def main(stop_event=None):
+    # The benchmark harness passes its own stop event to run and shut down the full topology
+    launched = time.monotonic()
+    if stop_event is None:
+        stop_event = Event()
+    # One capture process, ring buffer and message handler per source, so each room has its own conversation.
+    # STT and voice analysis are shared worker pools that serve the sources round-robin
+    capture_sources = parse_capture_sources(os.getenv("CAPTURE_SOURCES", "mic"))
+    wake_word_mode = os.getenv("WAKE_WORD_MODE", "off")
     jarvis_messages_queue = Queue()
     db_upsert_queue = Queue()
     db_query_queue = Queue()
-    db_response_queue = Queue()
-
-    speech_recognition = Process(target=speech_recognition_process, args=(user_messages_queue, audio_queue, pause_listening_event, stop_event))
-    voice_analysis = Process(target=voice_analysis_process, args=(audio_queue, speaker_recognized_queue, emotion_recognized_queue, stop_event))
-    message_handling = Process(target=message_handling_process, args=(user_messages_queue, speaker_recognized_queue, emotion_recognized_queue, jarvis_messages_queue, db_upsert_queue, db_query_queue, db_response_queue, pause_listening_event, stop_event))
-    text_to_speech = Process(target=text_to_speech_process, args=(jarvis_messages_queue, pause_listening_event, stop_event))
-    database_interaction = Process(target=database_interaction_process, args=(db_upsert_queue, db_query_queue, db_response_queue, stop_event))
-
-    speech_recognition.start()
-    voice_analysis.start()
-    message_handling.start()
-    text_to_speech.start()
-    database_interaction.start()
-
-    speech_recognition.join()
-    voice_analysis.join()
-    message_handling.join()
-    text_to_speech.join()
-    database_interaction.join()
\ No newline at end of file
+    trace_queue = Queue(maxsize=4096)
+    startup_queue = Queue()
+    warm_up = os.getenv("MODEL_WARMUP", "0") == "1"
+    preload_models([name for name in os.getenv("PRELOAD_MODELS", "").split(',') if name], get_start_method(),
+                   whisper_model_size=os.getenv("WHISPER_MODEL", "base"))
+
+    # Audio queues are bounded and drop the oldest utterance when full, so a burst can't build an unbounded backlog
+    pause_listening_events = [Pause_Event() for _ in capture_sources]
+    user_messages_queues = [Queue(maxsize=8) for _ in capture_sources]
+    audio_queues = [Queue(maxsize=8) for _ in capture_sources]
+    results_queues = [Queue(maxsize=256) for _ in capture_sources]
+    db_response_queues = [Queue() for _ in capture_sources]
+    audio_rings = [Audio_Ring_Buffer(capacity_seconds=120, sample_rate=16000) for _ in capture_sources]
+
+    processes = []
+    for source_index, capture_source in enumerate(capture_sources):
+        processes.append(Process(target=speech_recognition_process, name=f"speech_recognition_{source_index}",
+                                 args=(capture_source, user_messages_queues[source_index], audio_queues[source_index], audio_rings[source_index],
+                                       results_queues[source_index], pause_listening_events[source_index], stop_event),
+                                 kwargs={"capture_mode": os.getenv("CAPTURE_MODE", "utterance"),
+                                         "partial_model_size": os.getenv("PARTIAL_WHISPER_MODEL", "tiny"),
+                                         "wake_word_mode": wake_word_mode,
+                                         "wake_word_threshold": float(os.getenv("WAKE_WORD_THRESHOLD")) if os.getenv("WAKE_WORD_THRESHOLD") else None,
+                                         "source_index": source_index,
+                                         "trace_queue": trace_queue,
+                                         "startup_queue": startup_queue}))
+        processes.append(Process(target=message_handling_process, name=f"message_handling_{source_index}",
+                                 args=(results_queues[source_index], jarvis_messages_queue, db_upsert_queue, db_query_queue,
+                                       db_response_queues[source_index], pause_listening_events[source_index], stop_event),
+                                 kwargs={"source_index": source_index,
+                                         "conversation": capture_source["name"] or "Alec",
+                                         "wake_word_mode": wake_word_mode,
+                                         "retrieval_mode": os.getenv("RETRIEVAL_MODE", "sequential"),
+                                         "retrieval_token_budget": int(os.getenv("RETRIEVAL_TOKEN_BUDGET", 1500)),
+                                         "trace_queue": trace_queue,
+                                         "startup_queue": startup_queue}))
+
+    for worker in range(int(os.getenv("STT_WORKERS", 1))):
+        processes.append(Process(target=speech_to_text_process, name=f"speech_to_text_{worker}", args=(user_messages_queues, audio_rings, results_queues, stop_event),
+                                 kwargs={"model_size": os.getenv("WHISPER_MODEL", "base"),
+                                         "threads": int(os.getenv("WHISPER_THREADS", 0)) or None,
+                                         "max_batch_size": int(os.getenv("STT_MAX_BATCH_SIZE", 8)),
+                                         "trace_queue": trace_queue,
+                                         "startup_queue": startup_queue,
+                                         "warm_up": warm_up}))
+    for worker in range(int(os.getenv("VOICE_ANALYSIS_WORKERS", 1))):
+        processes.append(Process(target=voice_analysis_process, name=f"voice_analysis_{worker}", args=(audio_queues, audio_rings, results_queues, stop_event),
+                                 kwargs={"trace_queue": trace_queue,
+                                         "startup_queue": startup_queue,
+                                         "warm_up": warm_up,
+                                         "max_batch_size": int(os.getenv("VOICE_ANALYSIS_MAX_BATCH_SIZE", 4))}))
+
+    processes.append(Process(target=text_to_speech_process, name="text_to_speech", args=(jarvis_messages_queue, pause_listening_events, stop_event),
+                             kwargs={"trace_queue": trace_queue, "startup_queue": startup_queue}))
+    processes.append(Process(target=database_interaction_process, name="database_interaction", args=(db_upsert_queue, db_query_queue, db_response_queues, stop_event),
+                             kwargs={"compaction_interval": float(os.getenv("MEMORY_COMPACTION_INTERVAL", 0)),
+                                     "compaction_threshold": float(os.getenv("MEMORY_COMPACTION_THRESHOLD", 0.95)),
+                                     "startup_queue": startup_queue}))
+    processes.append(Process(target=latency_collector_process, name="latency_collector", args=(trace_queue, stop_event),
+                             kwargs={"report_path": os.getenv("LATENCY_REPORT_PATH", "system_files/latency"),
+                                     "report_interval": float(os.getenv("LATENCY_REPORT_INTERVAL", 60)),
+                                     "http_port": int(os.getenv("LATENCY_HTTP_PORT", 0)) or None,
+                                     "startup_queue": startup_queue}))
+
+    for process in processes:
+        process.start()
+        print(f"Started {process.name} (pid {process.pid}).")
+
+    # Every process reports once its role is loaded; a process that dies during startup never will
+    startup_reports = []
+    while len(startup_reports) < len(processes) and not stop_event.is_set():
+        try:
+            startup_reports.append(startup_queue.get(timeout=0.5))
+        except Empty:
+            if not all(process.is_alive() for process in processes):
+                break
+    print_startup_report(startup_reports, launched)
+
+    for process in processes:
+        process.join()
+    for audio_ring in audio_rings:
+        audio_ring.close()
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
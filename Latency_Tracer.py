@@ -0,0 +1,143 @@
+from collections import OrderedDict, deque
+import csv
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import io
+import json
+import threading
+import time
+import numpy as np
+from Result_Bus import put_bounded
+
+
+# Each stage's duration is measured from the stage it waits on; STT and voice analysis run in parallel
+STAGE_STARTS = OrderedDict([("preprocessed", "capture_end"),
+                            ("transcribed", "preprocessed"),
+                            ("speaker_identified", "preprocessed"),
+                            ("emotion_classified", "speaker_identified"),
+                            ("retrieved", "retrieval_sent"),
+                            ("llm_request_sent", "retrieved"),
+                            ("first_token", "llm_request_sent"),
+                            ("first_sentence_queued", "first_token"),
+                            ("first_audio_out", "first_sentence_queued")])
+
+
+def record_stage(trace_queue, trace_id, stage, timestamp=None):
+    # time.monotonic is system-wide, so stamps taken in different processes are comparable
+    if trace_queue is None or trace_id is None:
+        return
+    put_bounded(trace_queue, (trace_id, stage, time.monotonic() if timestamp is None else timestamp))
+
+
+class Latency_Collector:
+    # Joins stage timestamps by trace id ((source index, utterance id)) and keeps rolling per-stage histograms,
+    # plus a capture-end-to-first-audio total and the per-stage breakdown of the most recent turns
+
+
+    def __init__(self, window=1000, ttl=30, recent_turns=50):
+        self.ttl = ttl
+        self.traces = OrderedDict()
+        self.durations = {stage: deque(maxlen=window) for stage in list(STAGE_STARTS) + ["total"]}
+        self.recent = deque(maxlen=recent_turns)
+        self.lock = threading.Lock()
+        self.server = None
+
+
+    def accept(self, trace_id, stage, timestamp):
+        with self.lock:
+            trace = self.traces.get(trace_id)
+            if trace is None:
+                trace = self.traces[trace_id] = {"received": time.monotonic()}
+            # Only the first occurrence counts, e.g. the first of several sentences reaching the speaker
+            trace.setdefault(stage, timestamp)
+            if stage == "first_audio_out":
+                self.finish(trace_id)
+
+
+    def expire(self):
+        # Turns not addressed to Jarvis never reach the LLM stages; they are folded in once they go quiet
+        now = time.monotonic()
+        with self.lock:
+            while self.traces:
+                trace_id, trace = next(iter(self.traces.items()))
+                if now - trace["received"] < self.ttl:
+                    break
+                self.finish(trace_id)
+
+
+    def finish(self, trace_id):
+        trace = self.traces.pop(trace_id)
+        if "capture_end" not in trace:
+            return
+        # Recent turns list each stage's duration in ms, which is where a slow turn's time went
+        timings = {"source": trace_id[0], "utterance": trace_id[1]}
+        for stage, start_stage in STAGE_STARTS.items():
+            if stage in trace and start_stage in trace:
+                duration = trace[stage] - trace[start_stage]
+                self.durations[stage].append(duration)
+                timings[stage] = round(1000 * duration, 1)
+        if "first_audio_out" in trace:
+            total = trace["first_audio_out"] - trace["capture_end"]
+            self.durations["total"].append(total)
+            timings["total"] = round(1000 * total, 1)
+        self.recent.append(timings)
+
+
+    def summary(self):
+        with self.lock:
+            stages = {}
+            for stage, durations in self.durations.items():
+                if not durations:
+                    continue
+                p50, p95, p99 = np.percentile(np.fromiter(durations, dtype=np.float64), [50, 95, 99]) * 1000
+                stages[stage] = {"count": len(durations), "p50_ms": round(p50, 1), "p95_ms": round(p95, 1), "p99_ms": round(p99, 1)}
+            return {"stages": stages, "recent_turns": list(self.recent)}
+
+
+    def to_csv(self):
+        output = io.StringIO()
+        writer = csv.writer(output)
+        writer.writerow(["stage", "count", "p50_ms", "p95_ms", "p99_ms"])
+        for stage, stats in self.summary()["stages"].items():
+            writer.writerow([stage, stats["count"], stats["p50_ms"], stats["p95_ms"], stats["p99_ms"]])
+        return output.getvalue()
+
+
+    def dump(self, path_prefix):
+        with open(path_prefix + ".json", 'w') as file:
+            json.dump(self.summary(), file, indent=4)
+        with open(path_prefix + ".csv", 'w', newline='') as file:
+            file.write(self.to_csv())
+
+
+    def serve(self, port, host="127.0.0.1"):
+        # GET /latency returns the JSON summary, /latency.csv the per-stage table
+        collector = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                if self.path == "/latency":
+                    body, content_type = json.dumps(collector.summary()).encode(), "application/json"
+                elif self.path == "/latency.csv":
+                    body, content_type = collector.to_csv().encode(), "text/csv"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        print(f"Latency report available at http://{host}:{port}/latency")
+
+
+    def close(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
@@ -0,0 +1,414 @@
+import functools
+import json
+import os
+import threading
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
+
+
+class Store_In_Use(RuntimeError):
+    pass
+
+
+class Match(dict):
+    # Mirrors Pinecone's response objects, which allow both match.metadata and match['metadata']
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+
+def nearest_centroids(rows, centroids, chunk_size=65536):
+    # Chunked, so the similarity matrix never holds more than chunk_size rows at once
+    labels = np.empty(len(rows), dtype=np.int32)
+    for start in range(0, len(rows), chunk_size):
+        chunk = np.asarray(rows[start:start + chunk_size], dtype=np.float32)
+        labels[start:start + chunk_size] = np.argmax(chunk @ centroids.T, axis=1)
+    return labels
+
+
+def spherical_kmeans(sample, n_lists, iterations=10, seed=0):
+    rng = np.random.default_rng(seed)
+    centroids = sample[rng.choice(len(sample), size=n_lists, replace=False)].copy()
+    for _ in range(iterations):
+        labels = nearest_centroids(sample, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, sample)
+        # Empty lists keep their previous centroid
+        filled = np.bincount(labels, minlength=n_lists) > 0
+        centroids[filled] = sums[filled]
+        centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+    return centroids
+
+
+def locked(method):
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+class Local_Vector_Store:
+
+
+    def __init__(self, path="system_files/vector_store", dtype="float32", ivf_threshold=100000, n_probe=8, initial_capacity=1024):
+        if dtype not in ("float32", "float16", "int8"):
+            raise ValueError(f"Unsupported vector dtype: {dtype}")
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.header_path = os.path.join(path, "header.json")
+        self.vectors_path = os.path.join(path, "vectors.dat")
+        self.metadata_path = os.path.join(path, "metadata.jsonl")
+        self.centroids_path = os.path.join(path, "centroids.npy")
+        self.assignments_path = os.path.join(path, "assignments.dat")
+        self.lock_file = self.acquire_lock(os.path.join(path, "store.lock"))
+        self.dtype = dtype
+        self.dimension = None
+        self.count = 0
+        self.capacity = 0
+        self.initial_capacity = initial_capacity
+        self.matrix = None
+        self.ids = []
+        self.metadata = []
+        self.id_to_row = {}
+
+        # Approximate (IVF) index, built once the store grows past ivf_threshold vectors
+        self.ivf_threshold = ivf_threshold
+        self.n_probe = n_probe
+        self.centroids = None
+        self.assignments = None
+        self.trained_count = 0
+        self.list_order = None
+        self.list_bounds = None
+        # Training runs on its own thread and only holds the lock while it copies rows or installs the index
+        self.lock = threading.RLock()
+        self.training_thread = None
+        self.deletions = 0
+
+        self.load()
+
+
+    def acquire_lock(self, lock_path):
+        # One process at a time may open a store, so the compaction CLI can't rewrite it under a running Jarvis
+        lock_file = open(lock_path, 'a+')
+        try:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            elif msvcrt is not None:
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            lock_file.close()
+            raise Store_In_Use(f"Vector store at {self.path} is open in another process")
+        return lock_file
+
+
+    def close(self):
+        if self.lock_file is not None:
+            self.lock_file.close()
+            self.lock_file = None
+
+
+    def load(self):
+        if not os.path.exists(self.header_path):
+            return
+        with open(self.header_path, 'r') as file:
+            header = json.load(file)
+        if header["dtype"] != self.dtype:
+            print(f"Vector store at {self.path} uses {header['dtype']}, ignoring requested {self.dtype}.")
+            self.dtype = header["dtype"]
+        self.dimension = header["dimension"]
+        self.capacity = header["capacity"]
+        self.trained_count = header.get("trained_count", 0)
+        self.matrix = np.memmap(self.vectors_path, dtype=self.dtype, mode="r+", shape=(self.capacity, self.dimension))
+
+        # Later lines for the same row override earlier ones, so the sidecar can stay append-only
+        rows = {}
+        with open(self.metadata_path, 'r') as file:
+            for line in file:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # A torn final line from a crash mid-write, the vector row is simply not committed
+                    continue
+                rows[entry["row"]] = (entry["id"], entry["metadata"])
+
+        self.count = min(header["count"], len(rows))
+        self.ids = [rows[row][0] for row in range(self.count)]
+        self.metadata = [rows[row][1] for row in range(self.count)]
+        self.id_to_row = {vector_id: row for row, vector_id in enumerate(self.ids)}
+
+        if self.trained_count and os.path.exists(self.centroids_path):
+            self.centroids = np.load(self.centroids_path)
+            self.assignments = np.memmap(self.assignments_path, dtype=np.int32, mode="r+", shape=(self.capacity,))
+
+
+    def save_header(self):
+        header = {
+            "dtype": self.dtype,
+            "dimension": self.dimension,
+            "count": self.count,
+            "capacity": self.capacity,
+            "trained_count": self.trained_count,
+        }
+        temp_path = self.header_path + ".tmp"
+        with open(temp_path, 'w') as file:
+            json.dump(header, file)
+        os.replace(temp_path, self.header_path)
+
+
+    def grow(self, required):
+        new_capacity = max(self.capacity, self.initial_capacity)
+        while new_capacity < required:
+            new_capacity *= 2
+        if new_capacity == self.capacity:
+            return
+
+        row_bytes = self.dimension * np.dtype(self.dtype).itemsize
+        if self.matrix is not None:
+            self.matrix.flush()
+        with open(self.vectors_path, 'ab') as file:
+            file.truncate(new_capacity * row_bytes)
+        self.matrix = np.memmap(self.vectors_path, dtype=self.dtype, mode="r+", shape=(new_capacity, self.dimension))
+
+        if self.assignments is not None:
+            self.assignments.flush()
+            with open(self.assignments_path, 'ab') as file:
+                file.truncate(new_capacity * np.dtype(np.int32).itemsize)
+            self.assignments = np.memmap(self.assignments_path, dtype=np.int32, mode="r+", shape=(new_capacity,))
+        self.capacity = new_capacity
+
+
+    def encode(self, vectors):
+        # Vectors are stored unit-normalized so the inner product is the cosine similarity
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.maximum(norms, 1e-12)
+        if self.dtype == "int8":
+            return np.clip(np.rint(vectors * 127), -127, 127).astype(np.int8)
+        return vectors.astype(self.dtype)
+
+
+    def score(self, rows, query):
+        scores = np.asarray(rows, dtype=np.float32) @ query
+        if self.dtype == "int8":
+            scores /= 127
+        return scores
+
+
+    @locked
+    def upsert(self, vectors):
+        if not vectors:
+            return {"upserted_count": 0}
+
+        values = np.asarray([vector['values'] for vector in vectors], dtype=np.float32)
+        if self.dimension is None:
+            self.dimension = values.shape[1]
+        elif values.shape[1] != self.dimension:
+            raise ValueError(f"Vector dimension {values.shape[1]} does not match index dimension {self.dimension}")
+
+        rows = []
+        new_rows = 0
+        for vector in vectors:
+            row = self.id_to_row.get(vector['id'])
+            if row is None:
+                row = self.count + new_rows
+                new_rows += 1
+                self.id_to_row[vector['id']] = row
+            rows.append(row)
+        self.grow(self.count + new_rows)
+
+        encoded = self.encode(values)
+        self.matrix[rows] = encoded
+        self.matrix.flush()
+
+        with open(self.metadata_path, 'a') as file:
+            for row, vector in zip(rows, vectors):
+                metadata = vector.get('metadata', {})
+                if row < len(self.ids):
+                    self.ids[row] = vector['id']
+                    self.metadata[row] = metadata
+                else:
+                    self.ids.append(vector['id'])
+                    self.metadata.append(metadata)
+                file.write(json.dumps({"id": vector['id'], "row": row, "metadata": metadata}) + "\n")
+        self.count += new_rows
+
+        if self.centroids is not None:
+            self.assignments[rows] = self.assign(encoded)
+            self.assignments.flush()
+            self.list_order = None
+        if self.count >= self.ivf_threshold and self.count >= 2 * self.trained_count:
+            self.start_training()
+
+        self.save_header()
+        return {"upserted_count": len(vectors)}
+
+
+    def assign(self, rows):
+        return nearest_centroids(rows, self.centroids)
+
+
+    def start_training(self):
+        if self.training_thread is None or not self.training_thread.is_alive():
+            self.training_thread = threading.Thread(target=self.train_ivf, daemon=True)
+            self.training_thread.start()
+
+
+    def train_ivf(self, iterations=10, seed=0, chunk_size=65536):
+        # Spherical k-means over a sample of the stored vectors, using the usual 4 * sqrt(n) list heuristic
+        with self.lock:
+            count, deletions = self.count, self.deletions
+            n_lists = max(1, min(int(4 * np.sqrt(count)), count // 39))
+            rng = np.random.default_rng(seed)
+            sample_rows = np.sort(rng.choice(count, size=min(count, 64 * n_lists), replace=False))
+            sample = np.asarray(self.matrix[sample_rows], dtype=np.float32)
+        centroids = spherical_kmeans(sample, n_lists, iterations, seed)
+
+        labels = np.empty(count, dtype=np.int32)
+        for start in range(0, count, chunk_size):
+            with self.lock:
+                if self.deletions != deletions:
+                    print("Vectors were deleted during IVF training, it will be retried on a later upsert.")
+                    return
+                chunk = np.asarray(self.matrix[start:min(start + chunk_size, count)], dtype=np.float32)
+            labels[start:start + len(chunk)] = nearest_centroids(chunk, centroids)
+
+        with self.lock:
+            if self.deletions != deletions:
+                return
+            self.centroids = centroids
+            np.save(self.centroids_path, centroids)
+            with open(self.assignments_path, 'wb') as file:
+                file.truncate(self.capacity * np.dtype(np.int32).itemsize)
+            self.assignments = np.memmap(self.assignments_path, dtype=np.int32, mode="r+", shape=(self.capacity,))
+            self.assignments[:count] = labels
+            # Rows upserted while training ran
+            self.assignments[count:self.count] = self.assign(self.matrix[count:self.count])
+            self.assignments.flush()
+            self.trained_count = self.count
+            self.list_order = None
+            self.save_header()
+        print(f"Trained IVF index with {n_lists} lists over {count} vectors.")
+
+
+    def candidate_rows(self, query):
+        if self.list_order is None:
+            # Group rows by inverted list once, then every query is a handful of slices
+            assignments = np.asarray(self.assignments[:self.count])
+            self.list_order = np.argsort(assignments, kind="stable")
+            self.list_bounds = np.searchsorted(assignments[self.list_order], np.arange(len(self.centroids) + 1))
+        n_probe = min(self.n_probe, len(self.centroids))
+        probe_lists = np.argpartition(-(self.centroids @ query), n_probe - 1)[:n_probe]
+        return np.sort(np.concatenate([self.list_order[self.list_bounds[l]:self.list_bounds[l + 1]] for l in probe_lists]))
+
+
+    @locked
+    def query(self, vector, top_k=5, include_metadata=True, exact=False, chunk_size=65536):
+        if self.count == 0:
+            return {"matches": []}
+
+        query = np.asarray(vector, dtype=np.float32)
+        query = query / max(np.linalg.norm(query), 1e-12)
+
+        if self.centroids is not None and not exact:
+            rows = self.candidate_rows(query)
+            scores = self.score(self.matrix[rows], query)
+        else:
+            rows = None
+            scores = np.concatenate([self.score(self.matrix[start:min(start + chunk_size, self.count)], query)
+                                     for start in range(0, self.count, chunk_size)])
+
+        top_k = min(top_k, len(scores))
+        if top_k == 0:
+            return {"matches": []}
+        best = np.argpartition(-scores, top_k - 1)[:top_k]
+        best = best[np.argsort(-scores[best])]
+
+        matches = []
+        for position in best:
+            row = int(rows[position]) if rows is not None else int(position)
+            match = Match(id=self.ids[row], score=float(scores[position]))
+            if include_metadata:
+                match["metadata"] = self.metadata[row]
+            matches.append(match)
+        return {"matches": matches}
+
+
+    @locked
+    def delete(self, ids):
+        # Each deleted row is filled with the current last row, so live rows stay contiguous and no index rebuild is needed
+        rows = sorted({self.id_to_row[vector_id] for vector_id in ids if vector_id in self.id_to_row}, reverse=True)
+        if not rows:
+            return {}
+        for row in rows:
+            last = self.count - 1
+            del self.id_to_row[self.ids[row]]
+            if row != last:
+                self.matrix[row] = self.matrix[last]
+                if self.assignments is not None:
+                    self.assignments[row] = self.assignments[last]
+                self.ids[row] = self.ids[last]
+                self.metadata[row] = self.metadata[last]
+                self.id_to_row[self.ids[row]] = row
+            self.ids.pop()
+            self.metadata.pop()
+            self.count -= 1
+        self.matrix.flush()
+        if self.assignments is not None:
+            self.assignments.flush()
+        self.list_order = None
+        self.deletions += 1
+
+        # Moved rows make most of the append-only sidecar stale, so it is rewritten whole
+        self.rewrite_metadata()
+        self.save_header()
+        self.shrink()
+        return {}
+
+
+    def rewrite_metadata(self):
+        temp_path = self.metadata_path + ".tmp"
+        with open(temp_path, 'w') as file:
+            for row, (vector_id, metadata) in enumerate(zip(self.ids, self.metadata)):
+                file.write(json.dumps({"id": vector_id, "row": row, "metadata": metadata}) + "\n")
+        os.replace(temp_path, self.metadata_path)
+
+
+    def shrink(self):
+        # Gives back the doubling headroom once a store has lost at least half its rows
+        new_capacity = max(self.initial_capacity, 1)
+        while new_capacity < self.count:
+            new_capacity *= 2
+        if new_capacity * 2 > self.capacity:
+            return
+
+        self.matrix.flush()
+        self.matrix = None
+        os.truncate(self.vectors_path, new_capacity * self.dimension * np.dtype(self.dtype).itemsize)
+        self.matrix = np.memmap(self.vectors_path, dtype=self.dtype, mode="r+", shape=(new_capacity, self.dimension))
+        if self.assignments is not None:
+            self.assignments.flush()
+            self.assignments = None
+            os.truncate(self.assignments_path, new_capacity * np.dtype(np.int32).itemsize)
+            self.assignments = np.memmap(self.assignments_path, dtype=np.int32, mode="r+", shape=(new_capacity,))
+        self.capacity = new_capacity
+        self.save_header()
+
+
+    def size_bytes(self):
+        return sum(os.path.getsize(path) for path in (self.vectors_path, self.metadata_path, self.assignments_path)
+                   if os.path.exists(path))
+
+
+    @locked
+    def describe_index_stats(self):
+        return {"dimension": self.dimension, "total_vector_count": self.count}
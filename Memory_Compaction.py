@@ -0,0 +1,129 @@
+import argparse
+import time
+import numpy as np
+from Local_Vector_Store import Local_Vector_Store, Store_In_Use, spherical_kmeans
+
+
+class Memory_Compactor:
+    # Finds memories whose embeddings are within a cosine threshold of each other and keeps one of each group.
+    # Rows are clustered first (the store's IVF lists once it has them, otherwise a quick k-means), and pairs are
+    # only compared within a cluster, so the cost stays near linear; duplicates split across clusters are missed
+
+
+    def __init__(self, store, threshold=0.95, cluster_size=512, block_size=1024):
+        self.store = store
+        self.threshold = threshold
+        self.cluster_size = cluster_size
+        self.block_size = block_size
+
+
+    def clusters(self):
+        count = self.store.count
+        if count <= 2 * self.cluster_size:
+            return [np.arange(count)]
+        if self.store.centroids is not None:
+            labels = np.asarray(self.store.assignments[:count])
+        else:
+            n_lists = count // self.cluster_size
+            sample_rows = np.sort(np.random.default_rng(0).choice(count, size=min(count, 64 * n_lists), replace=False))
+            centroids = spherical_kmeans(np.asarray(self.store.matrix[sample_rows], dtype=np.float32), n_lists, iterations=5)
+            labels = np.concatenate([np.argmax(np.asarray(self.store.matrix[start:start + 65536], dtype=np.float32) @ centroids.T, axis=1)
+                                     for start in range(0, count, 65536)])
+        order = np.argsort(labels, kind="stable")
+        bounds = np.flatnonzero(np.diff(labels[order])) + 1
+        return np.split(order, bounds)
+
+
+    def duplicate_pairs(self, rows):
+        vectors = np.asarray(self.store.matrix[rows], dtype=np.float32)
+        if self.store.dtype == "int8":
+            vectors /= 127
+        pairs = []
+        for start in range(0, len(rows), self.block_size):
+            similarities = vectors[start:start + self.block_size] @ vectors.T
+            first, second = np.nonzero(similarities >= self.threshold)
+            first += start
+            keep = first < second
+            pairs.extend(zip(rows[first[keep]], rows[second[keep]]))
+        return pairs
+
+
+    def duplicate_groups(self):
+        parents = {}
+
+        def find(row):
+            while parents.get(row, row) != row:
+                parents[row] = parents.get(parents[row], parents[row])
+                row = parents[row]
+            return row
+
+        for rows in self.clusters():
+            for first, second in self.duplicate_pairs(rows):
+                first, second = find(int(first)), find(int(second))
+                if first != second:
+                    parents[max(first, second)] = min(first, second)
+
+        groups = {}
+        for row in parents:
+            groups.setdefault(find(row), []).append(row)
+        for root, members in groups.items():
+            if root not in members:
+                members.append(root)
+        return list(groups.values())
+
+
+    def keeper(self, group):
+        # The longest text usually carries every detail of its near-duplicates; ties go to the newest row
+        return max(group, key=lambda row: (len(str(self.store.metadata[row].get('text', ''))), row))
+
+
+    def compact(self, dry_run=False):
+        with self.store.lock:
+            return self.compact_locked(dry_run)
+
+
+    def compact_locked(self, dry_run):
+        start = time.perf_counter()
+        before_count, before_bytes = self.store.count, self.store.size_bytes()
+        groups = self.duplicate_groups()
+        removed = [self.store.ids[row] for group in groups for row in group if row != self.keeper(group)]
+        if removed and not dry_run:
+            self.store.delete(removed)
+
+        after_count = before_count - len(removed)
+        report = {
+            "memories_before": before_count,
+            "memories_after": after_count,
+            "duplicate_groups": len(groups),
+            "removed": len(removed),
+            "reduction": len(removed) / before_count if before_count else 0.0,
+            "bytes_before": before_bytes,
+            "bytes_after": before_bytes if dry_run else self.store.size_bytes(),
+            "seconds": time.perf_counter() - start,
+            "dry_run": dry_run,
+        }
+        print(f"{'Would compact' if dry_run else 'Compacted'} vector store: {before_count} -> {after_count} memories "
+              f"({report['reduction']:.1%} fewer, {len(groups)} duplicate groups, "
+              f"{report['bytes_before'] / 1e6:.1f}MB -> {report['bytes_after'] / 1e6:.1f}MB) in {report['seconds']:.2f}s.")
+        return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Merge near-duplicate memories in the local vector store.")
+    parser.add_argument("--path", default="system_files/vector_store")
+    parser.add_argument("--threshold", type=float, default=0.95, help="Cosine similarity at which two memories count as duplicates")
+    parser.add_argument("--dry-run", action="store_true", help="Report what would be removed without changing the store")
+    args = parser.parse_args()
+    try:
+        store = Local_Vector_Store(path=args.path)
+    except Store_In_Use as e:
+        print(f"{e}, stop Jarvis before compacting.")
+        raise SystemExit(1)
+    try:
+        Memory_Compactor(store, threshold=args.threshold).compact(dry_run=args.dry_run)
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+from multiprocessing import current_process
+import sys
+import threading
+import time
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+# Models are loaded on first use and cached per process, so each process pays only for the models its role needs
+_models = {}
+_load_seconds = {}
+_lock = threading.Lock()
+
+
+def load_model(name, loader):
+    with _lock:
+        if name not in _models:
+            start = time.perf_counter()
+            _models[name] = loader()
+            _load_seconds[name] = time.perf_counter() - start
+            print(f"Loaded {name} in {_load_seconds[name]:.2f}s.")
+        return _models[name]
+
+
+def speaker_recognition_model():
+    def load():
+        from speechbrain.pretrained import SpeakerRecognition
+        return SpeakerRecognition.from_hparams(source="speechbrain/spkrec-ecapa-voxceleb", savedir="pretrained_models")
+    return load_model("speaker_recognition", load)
+
+
+def whisper_model(model_size, device):
+    def load():
+        import whisper
+        return whisper.load_model(model_size, device=device)
+    return load_model(f"whisper_{model_size}_{device}", load)
+
+
+# Fork-safe preloaders, by the names used in PRELOAD_MODELS
+PRELOADERS = {
+    "speaker_recognition": speaker_recognition_model,
+    "whisper": lambda model_size="base": whisper_model(model_size, "cpu"),
+}
+
+
+def preload_models(names, start_method, whisper_model_size="base"):
+    # With the fork start method, models loaded in the parent before any child starts are shared copy-on-write,
+    # so a pool of workers maps one copy instead of loading its own. Under spawn nothing is inherited, and only
+    # CPU models are preloaded because CUDA cannot be re-initialized in a forked child
+    if start_method != "fork":
+        if names:
+            print(f"Skipping model preloading under the {start_method} start method.")
+        return
+    for name in names:
+        if name == "whisper":
+            PRELOADERS[name](whisper_model_size)
+        elif name in PRELOADERS:
+            PRELOADERS[name]()
+        else:
+            print(f"Unknown model to preload: {name}")
+
+
+def peak_rss_mb():
+    if resource is not None:
+        # ru_maxrss is the true peak, in kilobytes on Linux and bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (2**20 if sys.platform == "darwin" else 1024)
+    if psutil is not None:
+        # Windows reports its peak working set; anywhere else psutil only knows the current RSS, which isn't a peak
+        peak = getattr(psutil.Process().memory_info(), "peak_wset", None)
+        return None if peak is None else peak / 2**20
+    return None
+
+
+def report_ready(startup_queue):
+    # Sent once a process has finished loading what its role needs; main prints the startup table
+    if startup_queue is None:
+        return
+    startup_queue.put((current_process().name, time.monotonic(), peak_rss_mb(), dict(_load_seconds)))
+
+
+def print_startup_report(reports, launched):
+    print(f"{'process':>22}  {'ready':>8}  {'peak rss':>9}  models")
+    total_rss = 0
+    for name, ready, rss, load_seconds in sorted(reports, key=lambda report: report[1]):
+        models = ", ".join(f"{model} {seconds:.2f}s" for model, seconds in load_seconds.items()) or "-"
+        rss_text = f"{rss:>7.0f}MB" if rss is not None else f"{'?':>9}"
+        total_rss += rss or 0
+        print(f"{name:>22}  {ready - launched:>7.2f}s  {rss_text}  {models}")
+    if reports:
+        print(f"Systems online after {max(report[1] for report in reports) - launched:.2f}s, "
+              f"{total_rss:.0f}MB peak resident across {len(reports)} processes.")
@@ -1,27 +1,63 @@
+from API_Client import shared_api_client
+from Conversation_Log import Conversation_Log
 import json
-import openai
 from dotenv import load_dotenv
+from Latency_Tracer import record_stage
+from Prompt_Builder import Prompt_Builder
+from Stream_Parsing import Sentence_Segmenter, Tool_Call_Stream
+import threading
 import tiktoken
 
 class OpenAI_Interface:
 
 
-    def __init__(self, model="gpt-4-1106-preview", temperature=0, stream=True, db_upsert_queue=None, jarvis_messages_queue=None):
+    def __init__(self, model="gpt-4-1106-preview", temperature=0, stream=True, db_upsert_queue=None, jarvis_messages_queue=None, conversation="Alec", trace_queue=None, retrieval_token_budget=1500):
         load_dotenv(".env")
-        self.client = openai.OpenAI()
+        self.api_client = shared_api_client()
+        self.client = self.api_client.openai
+        # Deadline for a streamed response to start; once it has, the same timeout bounds each gap between chunks
+        self.response_deadline = 30.0
         self.model = model
         self.temperature = temperature
         self.stream = stream
         self.instructions = self.load_instructions("system_files/Assistant_Instructions.json")
         self.tools = [self.instructions["Functions"][function] for function in self.instructions["Functions"]]
         self.default_messages = [{"role": "system", "content": json.dumps(self.instructions["Instructions"])}]
-        self.messages = self.load_messages("system_files/messages.json", "Alec")
+        self.conversation = conversation
         self.responding = False
         self.max_tokens = 128000
         self.encoding = tiktoken.encoding_for_model(self.model)
-        self.tokens_in_context = (self.count_tokens(json.dumps(self.instructions["Instructions"])))
         self.db_upsert_queue = db_upsert_queue
+
+        # Constant prompt sections are tokenized once, and every message's count is cached alongside it
+        self.spr_tokens = self.count_tokens(json.dumps(self.instructions["Write_SPR"]))
+        # Messages leaving the context are saved to the vector database in pieces of at most this many tokens,
+        # well under the embedding model's 8191 token input limit
+        self.memory_chunk_tokens = 1000
+        self.tools_tokens = self.count_tokens(json.dumps(self.tools))
+        self.prompt_builder = Prompt_Builder(self.encoding, retrieval_token_budget=retrieval_token_budget)
+        self.conversation_log = Conversation_Log("system_files/conversations", conversation)
+        self.messages, self.message_tokens = self.load_messages("system_files/messages.json", conversation)
+        self.tokens_in_context = sum(self.message_tokens)
+
+        # Sliding window: past the soft limit the oldest turns are summarized in chunks of this size on a
+        # background thread, while at least keep_recent_messages stay verbatim
+        self.soft_token_limit = int(self.max_tokens * 0.75)
+        self.compaction_chunk_tokens = self.max_tokens // 4
+        # The summary request holds the instructions, the chunk and room for the summary itself
+        self.summary_input_tokens = self.max_tokens - self.spr_tokens - 4096
+        self.keep_recent_messages = 10
+        self.summary_lock = threading.Lock()
+        self.summary_thread = None
+        self.pending_summary = None
+        # Bumped whenever the start of the context changes, so a summary of a stale chunk is never swapped in
+        self.context_generation = 0
         self.jarvis_messages_queue = jarvis_messages_queue
+        # Long sentences are also split at a clause boundary once this many characters are pending, so TTS starts sooner
+        self.min_clause_length = 60
+        self.trace_queue = trace_queue
+        self.trace_id = None
+        self.first_sentence_queued = False
 
 
     def load_instructions(self, filename):
@@ -34,185 +70,296 @@ class OpenAI_Interface:
         return len(self.encoding.encode(text))
     
 
-    def save_messages(self, file_path, user_name):
-            try:
-                data = {}
-                with open(file_path, 'r') as file:
-                    data = json.load(file)
-                data[user_name] = self.messages[1:]
-
-                with open(file_path, 'w') as file:
-                    json.dump(data, file, indent=4)
-            
-            except FileNotFoundError:
-                print(f"No existing file found. A new file will be created at {file_path}")
-            except json.JSONDecodeError:
-                print(f"Existing file at {file_path} is not a valid JSON. It will be overwritten.")
-            except Exception as e:
-                print(f"Error saving messages for {user_name} to JSON: {e}")
+    def save_messages(self):
+        # Compacts the log into a snapshot of what is in context now; every turn is already on disk by this point
+        try:
+            self.conversation_log.snapshot(self.messages[1:], self.message_tokens[1:])
+        except Exception as e:
+            print(f"Error saving messages for {self.conversation}: {e}")
 
 
-    def load_messages(self, file_path, user_name):
+    def load_legacy_messages(self, file_path, user_name):
+        # History from the old whole-file messages.json, imported into the conversation log once
         try:
             with open(file_path, 'r') as file:
-                data = json.load(file)
-                user_messages = data.get(user_name)
-                if user_messages is not None:
-                    return self.default_messages + user_messages
-                else:
-                    return self.default_messages
+                return json.load(file).get(user_name) or []
         except FileNotFoundError:
-            print(f"File {file_path} not found. Initializing with default messages.")
-            return self.default_messages
-        except json.JSONDecodeError:
-            print(f"Error decoding JSON from {file_path}. Initializing with default messages.")
-            return self.default_messages
+            return []
+        except Exception as e:
+            print(f"Error loading messages for {user_name} from {file_path}: {e}")
+            return []
+
+
+    def load_messages(self, file_path, user_name):
+        default_tokens = [self.count_tokens(msg['content']) for msg in self.default_messages]
+        messages, message_tokens = list(self.default_messages), list(default_tokens)
+        try:
+            if not self.conversation_log.exists():
+                legacy_messages = self.load_legacy_messages(file_path, user_name)
+                if legacy_messages:
+                    self.conversation_log.snapshot(legacy_messages, [self.count_tokens(msg['content']) for msg in legacy_messages])
+                    print(f"Imported {len(legacy_messages)} messages for {user_name} from {file_path}.")
+
+            # Only the newest messages that fit under the soft limit are read into context; older ones go to the
+            # vector database so they can still be retrieved
+            loaded, left_out = self.conversation_log.load(int(self.max_tokens * 0.75) - sum(default_tokens) - self.tools_tokens)
+            for message, tokens in loaded:
+                messages.append(message)
+                message_tokens.append(tokens if tokens is not None else self.count_tokens(message['content']))
+            if left_out:
+                # Snapshotting what was loaded right away means the next start doesn't archive and upsert them again
+                self.conversation_log.archive(left_out)
+                self.conversation_log.snapshot(messages[len(default_tokens):], message_tokens[len(default_tokens):])
+                self.save_to_memory(left_out)
+        except Exception as e:
+            print(f"Error loading messages for {user_name}: {e}")
+        return messages, message_tokens
+
+
+    def memory_chunks(self, messages):
+        # Consecutive messages joined up to memory_chunk_tokens, with any longer message split on its own
+        chunks, current, current_tokens = [], [], 0
+        for message in messages:
+            tokens = self.encoding.encode(message['content'])
+            if current and current_tokens + len(tokens) > self.memory_chunk_tokens:
+                chunks.append("\n".join(current))
+                current, current_tokens = [], 0
+            if len(tokens) > self.memory_chunk_tokens:
+                chunks.extend(self.encoding.decode(tokens[start:start + self.memory_chunk_tokens])
+                              for start in range(0, len(tokens), self.memory_chunk_tokens))
+                continue
+            current.append(message['content'])
+            current_tokens += len(tokens) + 1
+        if current:
+            chunks.append("\n".join(current))
+        return chunks
+
+
+    def save_to_memory(self, messages):
+        if self.db_upsert_queue is None:
+            return
+        for chunk in self.memory_chunks(messages):
+            self.db_upsert_queue.put(chunk)
+
+
+    def append_message(self, message, token_count=None):
+        if token_count is None:
+            token_count = self.count_tokens(message['content'])
+        self.messages.append(message)
+        self.message_tokens.append(token_count)
+        self.tokens_in_context += token_count
+        # Each message is persisted as it's added, so a crash loses nothing from completed turns
+        try:
+            if self.conversation_log.append(message, token_count):
+                self.save_messages()
         except Exception as e:
-            print(f"Error loading messages for {user_name} from JSON: {e}")
-            return self.default_messages
+            print(f"Error appending message for {self.conversation}: {e}")
 
 
-    def summarize_and_reset_context(self):
+    def summarize_messages(self, messages):
         summary_instructions = json.dumps(self.instructions["Write_SPR"])
-        conversation_history = "\n".join([msg['content'] for msg in self.messages])
+        conversation_history = "\n".join([msg['content'] for msg in messages])
         summary_message = f"{summary_instructions}\n{conversation_history}"
 
-        summary_response = self.client.chat.completions.create(
-            model=self.model,
-            messages=[{"role": "user", "content": summary_message}],
-            temperature=self.temperature
+        summary_response = self.api_client.call(
+            lambda timeout: self.client.chat.completions.create(
+                model=self.model,
+                messages=[{"role": "user", "content": summary_message}],
+                temperature=self.temperature,
+                timeout=timeout
+            ),
+            deadline=300, attempt_timeout=120
         ).choices[0].message
-
-        self.db_upsert_queue.put(summary_response)
-        print("Summary response added to db_write queue.\n")
-
-        self.messages = [] + self.default_messages
-        self.tokens_in_context = self.count_tokens(json.dumps(self.instructions["Instructions"]))
-
-
-    def message(self, role, content, tools):
-
-        new_msg_token_count = self.count_tokens(content)
-        if self.tokens_in_context + new_msg_token_count + self.count_tokens(json.dumps(self.instructions["Write_SPR"])) >= self.max_tokens:
-            self.summarize_and_reset_context()
+        return summary_response.content
+
+
+    def oldest_chunk(self, required_tokens, max_chunk_tokens=None):
+        # Messages 1..end of the returned chunk are the oldest turns; the system instructions at index 0 are never evicted
+        end = 1
+        freed = 0
+        last_evictable = len(self.messages) - self.keep_recent_messages
+        while end < last_evictable and (freed < self.compaction_chunk_tokens or self.tokens_in_context - freed + required_tokens >= self.max_tokens):
+            if max_chunk_tokens is not None and freed + self.message_tokens[end] > max_chunk_tokens:
+                break
+            freed += self.message_tokens[end]
+            end += 1
+        return end
+
+
+    def replace_oldest_chunk(self, end, replacement=None):
+        self.conversation_log.archive(self.messages[1:end])
+        replaced_tokens = sum(self.message_tokens[1:end])
+        if replacement is None:
+            del self.messages[1:end]
+            del self.message_tokens[1:end]
+            self.tokens_in_context -= replaced_tokens
+        else:
+            replacement_tokens = self.count_tokens(replacement['content'])
+            self.messages[1:end] = [replacement]
+            self.message_tokens[1:end] = [replacement_tokens]
+            self.tokens_in_context += replacement_tokens - replaced_tokens
+        self.context_generation += 1
+        # The start of the context changed, which the append-only log can't express
+        self.save_messages()
+
+
+    def start_background_summary(self):
+        if self.summary_thread is not None and self.summary_thread.is_alive():
+            return
+        end = self.oldest_chunk(self.spr_tokens, self.summary_input_tokens)
+        if end <= 1:
+            return
+        self.summary_thread = threading.Thread(target=self.background_summary,
+                                               args=(self.messages[1:end], end, self.context_generation),
+                                               daemon=True)
+        self.summary_thread.start()
+        print(f"Summarizing {end - 1} oldest messages in the background.\n")
+
+
+    def background_summary(self, chunk, end, generation):
+        try:
+            summary = self.summarize_messages(chunk)
+        except Exception as e:
+            # The chunk stays in context untouched, and the summary is retried after the next turn
+            print(f"BACKGROUND SUMMARY FAILED: {e}")
+            return
+        with self.summary_lock:
+            self.pending_summary = (generation, end, summary)
+
+
+    def apply_pending_summary(self):
+        # Runs between turns, so the swap never races the message list being read for a request
+        with self.summary_lock:
+            pending, self.pending_summary = self.pending_summary, None
+        if pending is None:
+            return
+        generation, end, summary = pending
+        if generation != self.context_generation:
+            print("Discarded a background summary of messages that are no longer in context.\n")
+            return
+
+        self.replace_oldest_chunk(end, {"role": "system", "content": f"Summary of earlier conversation:\n{summary}"})
+        self.db_upsert_queue.put(summary)
+        print(f"Swapped in background summary, {self.tokens_in_context} tokens in context.\n")
+
+
+    def evict_oldest(self, required_tokens):
+        # Hard limit reached before a background summary landed: drop the oldest turns without waiting on the model,
+        # saving them verbatim to the vector database so they can still be retrieved
+        end = self.oldest_chunk(required_tokens)
+        if end <= 1:
+            return
+        self.save_to_memory(self.messages[1:end])
+        self.replace_oldest_chunk(end)
+        print(f"Evicted {end - 1} oldest messages, {self.tokens_in_context} tokens in context.\n")
+
+
+    def queue_sentence(self, sentence):
+        # Sentences carry the turn's trace id so the speaker process can stamp when its audio starts
+        if not self.first_sentence_queued:
+            self.first_sentence_queued = True
+            record_stage(self.trace_queue, self.trace_id, "first_sentence_queued")
+        self.jarvis_messages_queue.put((sentence, self.trace_id))
+
+
+    def message(self, role, content, tools, trace_id=None, token_count=None):
+
+        self.apply_pending_summary()
+        new_msg_token_count = token_count if token_count is not None else self.count_tokens(content)
+        if self.tokens_in_context + new_msg_token_count + self.tools_tokens >= self.max_tokens:
+            self.evict_oldest(new_msg_token_count + self.tools_tokens)
 
         try:
-            self.messages.append({
+            self.append_message({
                 "role": role,
                 "content": content,
-            })
-            self.tokens_in_context += new_msg_token_count
+            }, new_msg_token_count)
 
             if role == "user":
                 self.responding = True
-                response = self.client.chat.completions.create(
-                    model=self.model,
-                    messages=self.messages,
-                    temperature=self.temperature,
-                    tools=tools,
-                    stream=self.stream,
+                self.trace_id = trace_id
+                self.first_sentence_queued = False
+                record_stage(self.trace_queue, trace_id, "llm_request_sent")
+                response = self.api_client.call(
+                    lambda timeout: self.client.chat.completions.create(
+                        model=self.model,
+                        messages=self.messages,
+                        temperature=self.temperature,
+                        tools=tools,
+                        stream=self.stream,
+                        timeout=timeout,
+                    ),
+                    deadline=self.response_deadline, attempt_timeout=self.response_deadline / 2
                 )
 
-                func_call = {"name": None, "arguments": ""}
-                collecting_tokens = False
-                current_sentence = ""
+                tool_calls_stream = Tool_Call_Stream()
+                segmenters = {}
                 system_message = {"role": "system", "content": ""}
 
+                first_token = True
                 for chunk in response:
-                    tool_calls = chunk.choices[0].delta.tool_calls if chunk.choices[0].delta and chunk.choices[0].delta.tool_calls else None
+                    if first_token:
+                        first_token = False
+                        record_stage(self.trace_queue, trace_id, "first_token")
+                    tool_calls = chunk.choices[0].delta.tool_calls if chunk.choices and chunk.choices[0].delta and chunk.choices[0].delta.tool_calls else None
                     if not tool_calls:
                         continue
 
-                    for func_chunk in tool_calls:
-                        function = func_chunk.function if func_chunk else None
-
-                        if not function:
-                            continue
-
-                        if function.name:
-                            if func_call["name"] is not None:
-                                system_message["content"] += json.dumps(func_call)
-                                self.process_function_call(func_call)
-                            func_call["name"] = function.name
-                            func_call["arguments"] = ""
-                            continue
-
-                        if not function.arguments:
-                            continue
+                    for tool_call in tool_calls:
+                        call, deltas = tool_calls_stream.feed(tool_call)
 
-                        if func_call["name"] == "respond_to_user":
-                            if collecting_tokens:
-                                current_sentence += function.arguments
-                                if any(punctuation in current_sentence for punctuation in ('.', '?', '!')):
-                                    current_sentence.strip('"')
-                                    self.jarvis_messages_queue.put(current_sentence)
-                                    current_sentence = ""
-                            if function.arguments == '":"':
-                                collecting_tokens = True
-                            continue
+                        # Speak each sentence of a response as soon as its text has been decoded
+                        if call["name"] == "respond_to_user":
+                            segmenter = segmenters.setdefault(tool_call.index, Sentence_Segmenter(self.min_clause_length))
+                            for text in deltas.values():
+                                for sentence in segmenter.feed(text):
+                                    self.queue_sentence(sentence)
 
-                        func_call["arguments"] += function.arguments
+                        if call["parser"].complete and not call["processed"]:
+                            system_message["content"] += self.finish_function_call(call, segmenters.pop(tool_call.index, None))
 
-                if func_call["name"] is not None:
-                    system_message["content"] += json.dumps(func_call)
-                    self.process_function_call(func_call)
+                for index, call in sorted(tool_calls_stream.calls.items()):
+                    if not call["processed"] and call["name"] is not None:
+                        system_message["content"] += self.finish_function_call(call, segmenters.pop(index, None))
 
-                self.tokens_in_context += self.count_tokens(system_message["content"])
-                self.messages.append(system_message)
+                self.append_message(system_message)
 
         except Exception as e:
             print(f"MESSAGE OPENAI FAILED: {e}")
             self.responding = False
 
+        if self.tokens_in_context >= self.soft_token_limit:
+            self.start_background_summary()
 
-    def process_function_call(self, func_call):
+
+    def finish_function_call(self, call, segmenter=None):
+        call["processed"] = True
+        if segmenter is not None:
+            remainder = segmenter.flush()
+            if remainder:
+                self.queue_sentence(remainder)
+
+        func_call = {"name": call["name"], "arguments": call["parser"].text()}
+        self.process_function_call(func_call, call["parser"].value())
+        return json.dumps(func_call)
+
+
+    def process_function_call(self, func_call, arguments=None):
         function_name = func_call["name"]
-        arguments = func_call["arguments"]
-        arguments = arguments.strip('}{')
-        start_index = arguments.find(':') + 1
-        arguments = arguments[start_index:]
+        if arguments is None:
+            try:
+                arguments = json.loads(func_call["arguments"])
+            except json.JSONDecodeError:
+                print(f"Could not parse arguments for {function_name}: {func_call['arguments']}")
+                return
 
         if function_name == "save_to_vector_database":
-            self.db_upsert_queue.put(arguments)
+            # The function takes a single text argument, whatever the schema names it
+            text = " ".join(str(value) for value in arguments.values())
+            if text:
+                self.db_upsert_queue.put(text)
 
 
     def make_prompt(self, user, user_emotion, timestamp, text, query_results):
-        formatted_query_results = "\n\n".join(f"{index + 1}. {result}" for index, result in enumerate(query_results))
-
-        if query_results:
-            prompt =("**Metadata**\n"
-                    f"User: {user} \n"
-                    f"User emotion: {user_emotion} \n"
-                    f"Timestamp: {timestamp}\n\n"
-
-                    "**User's message**\n"
-                    f"{text}\n\n"
-
-                    "**Vector database results**\n"
-                    f"{formatted_query_results}\n\n"
-
-                    "**Response guidelines**\n"
-                    "Format your response as a response call first, and then include as many database calls you deem necessary. "
-                    "Your response should remain within the context of the user's message and avoid tangential topics. "
-                    "Use the metadata to augment your response if it's relevant. "
-                    "Ie. acknowledge significant emotions, demonstrate temporal awareness, etc. "
-                    "Use the most relevant information from the vector database results to enrich and personalize your response. "
-                    "Do not save information from the vector database results to the vector database to avoid redundancy."
-                    )
-        else:
-            prompt =("**Metadata**\n"
-                    f"User: {user} \n"
-                    f"User emotion: {user_emotion} \n"
-                    f"Timestamp: {timestamp}\n\n"
-
-                    "**User's essage to Jarvis**\n"
-                    f"{text}\n\n"
-
-                    "**Response guidelines**\n"
-                    "Format your response as a response call first, and then include as many database calls you deem necessary. "
-                    "Your response should remain within the context of the user's message and avoid tangential topics. "
-                    "Use the metadata to augment your response if it's relevant. "
-                    "Ie. acknowledge significant emotions, demonstrate temporal awareness, etc. "
-                    )
-        
-        return prompt
\ No newline at end of file
+        # Returns (prompt, token count); pass the count on to message() so the prompt isn't encoded twice
+        return self.prompt_builder.build(user, user_emotion, timestamp, text, query_results)
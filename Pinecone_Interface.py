@@ -1,70 +1,176 @@
+from API_Client import shared_api_client
 from hashlib import md5
-import openai
 import os
 import pinecone
 import dotenv
+from Embedding_Cache import Embedding_Cache
+from Local_Vector_Store import Local_Vector_Store
+from Memory_Compaction import Memory_Compactor
+from Semantic_Query_Cache import Semantic_Query_Cache
 
 
 class Pinecone_Interface:
     def __init__(self):
         dotenv.load_dotenv(".env")
         try:
-            pinecone.init(
-                api_key=os.getenv("PINECONE_API_KEY"),
-                environment=os.getenv("PINECONE_ENVIRONMENT")
-            )
-            self.index = pinecone.Index(os.getenv("PINECONE_INDEX"))
+            # VECTOR_STORE=local keeps memories in an embedded store instead of the remote Pinecone index
+            if os.getenv("VECTOR_STORE", "pinecone").lower() == "local":
+                self.index = Local_Vector_Store(
+                    path=os.getenv("LOCAL_VECTOR_STORE_PATH", "system_files/vector_store"),
+                    dtype=os.getenv("LOCAL_VECTOR_STORE_DTYPE", "float32")
+                )
+            else:
+                pinecone.init(
+                    api_key=os.getenv("PINECONE_API_KEY"),
+                    environment=os.getenv("PINECONE_ENVIRONMENT")
+                )
+                self.index = pinecone.Index(os.getenv("PINECONE_INDEX"))
             self.embedding_model = "text-embedding-ada-002"
-            self.client = openai.OpenAI()
+            self.api_client = shared_api_client()
+            self.client = self.api_client.openai
+            # The query embedding is on the turn's critical path, so it gets a tight deadline and a hedged duplicate;
+            # upsert batches run in the background and can wait longer
+            self.query_deadline = float(os.getenv("QUERY_EMBEDDING_DEADLINE", 3.0))
+            self.query_hedge_after = float(os.getenv("QUERY_EMBEDDING_HEDGE_AFTER", 0.5))
+            self.upsert_deadline = float(os.getenv("UPSERT_EMBEDDING_DEADLINE", 30.0))
+            self.embedding_cache = Embedding_Cache(
+                file_path=os.getenv("EMBEDDING_CACHE_PATH", "system_files/embedding_cache.sqlite"),
+                max_entries=int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", 100000))
+            )
+            # Repeated and reworded questions are answered from recent results instead of another index query
+            self.query_cache = Semantic_Query_Cache(
+                threshold=float(os.getenv("QUERY_CACHE_THRESHOLD", 0.97)),
+                ttl=float(os.getenv("QUERY_CACHE_TTL", 600)),
+                max_entries=int(os.getenv("QUERY_CACHE_MAX_ENTRIES", 256))
+            )
         except Exception as e:
             print("ERROR INITIALIZING PINECONE: ", e)
 
     def vectorize_text(self, text):
         try:
-            response = self.client.embeddings.create(
-                input=text,
-                model=self.embedding_model
+            cached_vector = self.embedding_cache.get(self.embedding_model, text)
+            if cached_vector is not None:
+                return [cached_vector]
+            response = self.api_client.call(
+                lambda timeout: self.client.embeddings.create(input=text, model=self.embedding_model, timeout=timeout),
+                deadline=self.query_deadline, attempt_timeout=self.query_deadline / 2, hedge_after=self.query_hedge_after
             )
             vec_text_list = [embedding_data.embedding for embedding_data in response.data]
+            if vec_text_list:
+                self.embedding_cache.put(self.embedding_model, text, vec_text_list[0])
             return vec_text_list
         except Exception as e:
             print("ERROR VECTORIZING TEXT: ", e)
             return []
 
+    def vectorize_texts(self, texts):
+        # One embeddings request for every text that is not already cached
+        vectors = [self.embedding_cache.get(self.embedding_model, text) for text in texts]
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            for i, vector in zip(missing, self.embed_batch([texts[i] for i in missing])):
+                vectors[i] = vector
+        return vectors
+
+    def embed_batch(self, texts):
+        # A failed request is split in half and retried, so one bad input only costs its own vector
+        try:
+            response = self.api_client.call(
+                lambda timeout: self.client.embeddings.create(input=texts, model=self.embedding_model, timeout=timeout),
+                deadline=self.upsert_deadline, attempt_timeout=self.upsert_deadline / 3
+            )
+            vectors = [embedding_data.embedding for embedding_data in sorted(response.data, key=lambda data: data.index)]
+            for text, vector in zip(texts, vectors):
+                self.embedding_cache.put(self.embedding_model, text, vector)
+            return vectors
+        except Exception as e:
+            if len(texts) == 1:
+                print(f"ERROR VECTORIZING TEXT ({len(texts[0])} characters): ", e)
+                return [None]
+            middle = len(texts) // 2
+            return self.embed_batch(texts[:middle]) + self.embed_batch(texts[middle:])
+
     def upsert_to_index(self, text):
+        self.upsert_batch_to_index([text])
+
+    def upsert_batch_to_index(self, texts, chunk_size=100):
+        # Returns the texts that were not written, so the caller can retry them
         try:
-            vectors = self.vectorize_text(text)
-            if vectors:
-                vector_id = str(md5(text.encode()).hexdigest())
-                metadata = {'text': text}
-                upsert_response = self.index.upsert(
-                    vectors=[
-                        {
-                            'id': vector_id,
-                            'values': vectors[0],
-                            'metadata': metadata
-                        }
-                    ]
-                )
-            else:
-                print("Error: Vectorization failed.")
+            # Vector ids are content hashes, so repeated texts within a batch collapse to one write
+            unique_texts = {}
+            for text in texts:
+                unique_texts.setdefault(str(md5(text.encode()).hexdigest()), text)
+            vector_ids = list(unique_texts)
+            vectors = self.vectorize_texts(list(unique_texts.values()))
         except Exception as e:
             print("ERROR UPSERTING TO INDEX: ", e)
+            return list(texts)
+
+        records = [
+            {
+                'id': vector_id,
+                'values': vector,
+                'metadata': {'text': unique_texts[vector_id]}
+            }
+            for vector_id, vector in zip(vector_ids, vectors) if vector is not None
+        ]
+        failed = [unique_texts[vector_id] for vector_id, vector in zip(vector_ids, vectors) if vector is None]
+        if failed:
+            print(f"Error: Vectorization failed for {len(failed)} of {len(vector_ids)} texts.")
+
+        written = []
+        for start in range(0, len(records), chunk_size):
+            chunk = records[start:start + chunk_size]
+            try:
+                self.index.upsert(vectors=chunk)
+                written.extend(chunk)
+            except Exception as e:
+                print("ERROR UPSERTING TO INDEX: ", e)
+                failed.extend(record['metadata']['text'] for record in chunk)
+        try:
+            self.query_cache.invalidate([record['values'] for record in written])
+        except Exception as e:
+            # A stale cached answer is possible until it expires, so start over
+            print("ERROR INVALIDATING QUERY CACHE: ", e)
+            self.query_cache.clear()
+        return failed
 
     def query_index(self, query_text, top_k=5):
         try:
             query_vector = self.vectorize_text(query_text)
             if query_vector:
-                query_response = self.index.query(
-                    vector=query_vector[0],
-                    top_k=top_k, 
-                    include_metadata=True,
-                )
+                cached_text = self.query_cache.get(query_vector[0], top_k)
+                if cached_text is not None:
+                    return cached_text
+                if isinstance(self.index, Local_Vector_Store):
+                    # An in-process search has nothing to time out or retry, so it skips the API worker pool
+                    query_response = self.index.query(vector=query_vector[0], top_k=top_k, include_metadata=True)
+                else:
+                    # A stalled remote query gives up at the deadline so the turn continues without memories
+                    query_response = self.api_client.call(
+                        lambda timeout: self.index.query(vector=query_vector[0], top_k=top_k, include_metadata=True),
+                        deadline=self.query_deadline, retries=1
+                    )
                 returned_text = [match.metadata['text'] for match in query_response['matches']]
+                self.query_cache.put(query_vector[0], top_k, returned_text, [match.score for match in query_response['matches']])
                 return returned_text
             else:
                 print("Error: Query vectorization failed.")
                 return []
         except Exception as e:
+            # Callers get no memories rather than None, and the turn continues without them
             print(f"ERROR QUERYING INDEX: {type(e).__name__}, {e}")
+            return []
 
+    def compact_index(self, threshold=0.95):
+        # Only the local store can enumerate its vectors; the remote index is left as it is
+        if not isinstance(self.index, Local_Vector_Store):
+            return None
+        try:
+            report = Memory_Compactor(self.index, threshold=threshold).compact()
+            if report["removed"]:
+                self.query_cache.clear()
+            return report
+        except Exception as e:
+            print("ERROR COMPACTING INDEX: ", e)
+            return None
@@ -0,0 +1,73 @@
+from multiprocessing import Condition, Value
+from multiprocessing.connection import wait
+from queue import Empty
+
+
+def wait_for_queues(queues, timeout=None):
+    # A multiprocessing.Queue's reader pipe becomes readable as soon as an item is flushed into it,
+    # so one wait() call blocks on every queue at once without spinning
+    ready = wait([queue._reader for queue in queues], timeout)
+    return [queue for queue in queues if queue._reader in ready]
+
+
+def drain_queue(queue, limit=None):
+    items = []
+    while limit is None or len(items) < limit:
+        try:
+            items.append(queue.get_nowait())
+        except Empty:
+            break
+    return items
+
+
+def drain_fair(queues, limit, start=0):
+    # Round-robin over the queues starting at index start, so one busy source can't starve the others.
+    # Returns (queue_index, item) pairs
+    items = []
+    exhausted = set()
+    index = start
+    while len(items) < limit and len(exhausted) < len(queues):
+        position = index % len(queues)
+        if position not in exhausted:
+            taken = drain_queue(queues[position], 1)
+            if taken:
+                items.append((position, taken[0]))
+            else:
+                exhausted.add(position)
+        index += 1
+    return items
+
+
+class Pause_Event:
+    # Drop-in for multiprocessing.Event that can also block until it is cleared
+
+
+    def __init__(self):
+        self.flag = Value('b', False, lock=False)
+        self.condition = Condition()
+
+
+    def set(self):
+        with self.condition:
+            self.flag.value = True
+            self.condition.notify_all()
+
+
+    def clear(self):
+        with self.condition:
+            self.flag.value = False
+            self.condition.notify_all()
+
+
+    def is_set(self):
+        return bool(self.flag.value)
+
+
+    def wait(self, timeout=None):
+        with self.condition:
+            return self.condition.wait_for(lambda: bool(self.flag.value), timeout)
+
+
+    def wait_until_clear(self, timeout=None):
+        with self.condition:
+            return self.condition.wait_for(lambda: not self.flag.value, timeout)
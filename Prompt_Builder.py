@@ -0,0 +1,79 @@
+GUIDELINES = ("**Response guidelines**\n"
+              "Format your response as a response call first, and then include as many database calls you deem necessary. "
+              "Your response should remain within the context of the user's message and avoid tangential topics. "
+              "Use the metadata to augment your response if it's relevant. "
+              "Ie. acknowledge significant emotions, demonstrate temporal awareness, etc.")
+
+RESULTS_GUIDELINES = (" Use the most relevant information from the vector database results to enrich and personalize your response. "
+                      "Do not save information from the vector database results to the vector database to avoid redundancy.")
+
+
+class Prompt_Builder:
+    # Assembles the per-turn user prompt from pieces whose token counts add up exactly. The static sections are
+    # tokenized once; every dynamic piece is stripped and ends in a blank line before a section that starts with
+    # "**", which the tokenizer never merges across, so the pieces' counts sum to the count of the whole prompt.
+    # Retrieved memories are packed in relevance order into a token budget, each capped at max_result_tokens
+
+
+    def __init__(self, encoding, retrieval_token_budget=1500, max_result_tokens=400, min_result_tokens=32):
+        self.encoding = encoding
+        self.retrieval_token_budget = retrieval_token_budget
+        self.max_result_tokens = max_result_tokens
+        self.min_result_tokens = min_result_tokens
+        self.results_header = self.compile("**Vector database results**\n")
+        self.guidelines = self.compile(GUIDELINES)
+        self.results_guidelines = self.compile(GUIDELINES + RESULTS_GUIDELINES)
+
+
+    def compile(self, text):
+        return text, len(self.encoding.encode(text))
+
+
+    def truncate(self, text, max_tokens):
+        # Cut by characters first so a very long summary is never tokenized whole; no token spans more than a few dozen
+        cut = text[:max_tokens * 32]
+        tokens = self.encoding.encode(cut)
+        if len(tokens) <= max_tokens and len(cut) == len(text):
+            return text
+        return self.encoding.decode(tokens[:max_tokens - 1]).rstrip() + "..."
+
+
+    def pack_results(self, query_results):
+        packed, used = [], 0
+        for result in query_results:
+            remaining = self.retrieval_token_budget - used
+            if remaining < self.min_result_tokens:
+                break
+            result = " ".join(str(result).split())
+            if not result:
+                continue
+            # The numbering and separator cost a few tokens of their own
+            text = self.truncate(result, min(self.max_result_tokens, remaining - 8))
+            item = f"{len(packed) + 1}. {text}\n\n"
+            tokens = len(self.encoding.encode(item))
+            if used + tokens > self.retrieval_token_budget:
+                continue
+            packed.append(item)
+            used += tokens
+        return packed, used
+
+
+    def build(self, user, user_emotion, timestamp, text, query_results):
+        # Returns the prompt and its exact token count, so it never has to be encoded again
+        head = (f"**Metadata**\n"
+                f"User: {user} \n"
+                f"User emotion: {user_emotion} \n"
+                f"Timestamp: {timestamp}\n\n"
+                "**User's message**\n"
+                f"{text.strip()}\n\n")
+        sections = [head]
+        tokens = len(self.encoding.encode(head))
+
+        packed, results_tokens = self.pack_results(query_results or [])
+        if packed:
+            sections += [self.results_header[0]] + packed + [self.results_guidelines[0]]
+            tokens += self.results_header[1] + results_tokens + self.results_guidelines[1]
+        else:
+            sections.append(self.guidelines[0])
+            tokens += self.guidelines[1]
+        return "".join(sections), tokens
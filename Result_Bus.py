@@ -0,0 +1,143 @@
+from collections import OrderedDict
+import heapq
+from queue import Empty, Full
+import time
+from Process_Scheduler import drain_queue, wait_for_queues
+
+
+def put_bounded(queue, item, policy="drop_oldest", on_drop=None):
+    # Returns the number of items dropped to make room; with drop_newest the new item itself is the one dropped.
+    # on_drop is called with each dropped item, e.g. to tell the consumer its result will never come
+    try:
+        queue.put_nowait(item)
+        return 0
+    except Full:
+        pass
+    if policy == "drop_newest":
+        if on_drop is not None:
+            on_drop(item)
+        return 1
+    dropped = 0
+    while True:
+        try:
+            oldest = queue.get_nowait()
+            dropped += 1
+            if on_drop is not None:
+                on_drop(oldest)
+        except Empty:
+            pass
+        try:
+            queue.put_nowait(item)
+            return dropped
+        except Full:
+            continue
+
+
+def publish_result(results_queue, utterance_id, stage, value):
+    dropped = put_bounded(results_queue, (utterance_id, stage, value))
+    if dropped:
+        print(f"Result bus full, dropped {dropped} stale results.")
+
+
+class Result_Bus:
+    # Joins per-stage analysis results by utterance id. Ids increase monotonically per capture source, so once
+    # an utterance is finished every result at or below it is stale and is rejected on arrival in O(1).
+    # Transcripts are handed out in id order: with several STT workers a later one can arrive first, and is held
+    # for up to reorder_window while the gap below it may still fill. An id that will never get a transcript
+    # (dropped under backlog, overwritten in the audio ring, thrown away at capture) is published as "skipped",
+    # which closes its gap at once
+
+
+    def __init__(self, results_queue, ttl=30, max_pending=64, on_result=None, reorder_window=1.0):
+        self.results_queue = results_queue
+        # Called with every accepted result as it arrives, e.g. to act on a partial transcript before the final one
+        self.on_result = on_result
+        self.ttl = ttl
+        self.max_pending = max_pending
+        self.pending = OrderedDict()
+        self.transcripts = []
+        self.reorder_window = reorder_window
+        self.last_transcript = None
+        self.finished_through = -1
+        self.dropped = 0
+
+
+    def accept(self, utterance_id, stage, value):
+        if utterance_id <= self.finished_through:
+            self.dropped += 1
+            return
+        entry = self.pending.get(utterance_id)
+        if entry is None:
+            entry = self.pending[utterance_id] = {"received": time.monotonic()}
+        entry[stage] = value
+        if stage in ("transcript", "skipped"):
+            heapq.heappush(self.transcripts, (utterance_id, time.monotonic()))
+        if self.on_result is not None:
+            self.on_result(utterance_id, stage, value)
+
+
+    def expire(self):
+        now = time.monotonic()
+        while self.pending:
+            utterance_id, entry = next(iter(self.pending.items()))
+            if now - entry["received"] < self.ttl and len(self.pending) <= self.max_pending:
+                break
+            self.pending.popitem(last=False)
+            self.dropped += 1
+
+
+    def collect(self, timeout=0):
+        if timeout and not wait_for_queues([self.results_queue], timeout):
+            return
+        for utterance_id, stage, value in drain_queue(self.results_queue):
+            self.accept(utterance_id, stage, value)
+        self.expire()
+
+
+    def next_transcript(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            held_until = None
+            while self.transcripts:
+                utterance_id, arrived = self.transcripts[0]
+                entry = self.pending.get(utterance_id)
+                if entry is None or "transcript" not in entry or "delivered" in entry:
+                    heapq.heappop(self.transcripts)
+                    if entry is not None and "skipped" in entry:
+                        self.last_transcript = max(self.last_transcript or 0, utterance_id)
+                    continue
+                if self.last_transcript is not None and utterance_id > self.last_transcript + 1 \
+                        and time.monotonic() - arrived < self.reorder_window:
+                    held_until = arrived + self.reorder_window
+                    break
+                heapq.heappop(self.transcripts)
+                self.last_transcript = utterance_id
+                entry["delivered"] = True
+                return utterance_id, entry["transcript"]
+            remaining = 0.5 if deadline is None else deadline - time.monotonic()
+            if remaining <= 0:
+                return None, None
+            if held_until is not None:
+                remaining = min(remaining, max(held_until - time.monotonic(), 0.01))
+            self.collect(min(remaining, 0.5))
+
+
+    def wait_for(self, utterance_id, stage, timeout, default=None):
+        # Past the stage deadline the turn proceeds with the default rather than stalling on a slow worker
+        deadline = time.monotonic() + timeout
+        while True:
+            entry = self.pending.get(utterance_id)
+            if entry is not None and stage in entry:
+                return entry[stage]
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                print(f"No {stage} result for utterance {utterance_id} within {timeout}s, using {default}.")
+                return default
+            self.collect(remaining)
+
+
+    def finish(self, utterance_id):
+        self.finished_through = max(self.finished_through, utterance_id)
+        # Entries are in arrival order, which isn't id order once workers finish out of turn
+        for finished in [pending_id for pending_id in self.pending if pending_id <= self.finished_through]:
+            del self.pending[finished]
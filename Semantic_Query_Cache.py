@@ -0,0 +1,86 @@
+import time
+import numpy as np
+
+
+class Semantic_Query_Cache:
+    # Answers a query from memory when an earlier query's embedding is within a cosine threshold of it and still
+    # fresh. Upserts invalidate only the entries whose results the new memories could have entered: those where a
+    # new vector would score at least as high as the entry's current last match
+
+
+    def __init__(self, threshold=0.97, ttl=600, max_entries=256, slack=0.02):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.slack = slack
+        self.vectors = []
+        self.entries = []
+        self.matrix = None
+        self.hits = 0
+        self.misses = 0
+
+
+    def normalize(self, vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        return vector / max(np.linalg.norm(vector), 1e-12)
+
+
+    def get_matrix(self):
+        if self.matrix is None and self.vectors:
+            self.matrix = np.stack(self.vectors)
+        return self.matrix
+
+
+    def expire(self):
+        now = time.monotonic()
+        keep = [i for i, entry in enumerate(self.entries) if now - entry["created"] < self.ttl]
+        if len(keep) < len(self.entries):
+            self.remove(keep)
+
+
+    def remove(self, keep):
+        self.vectors = [self.vectors[i] for i in keep]
+        self.entries = [self.entries[i] for i in keep]
+        self.matrix = None
+
+
+    def get(self, vector, top_k):
+        self.expire()
+        matrix = self.get_matrix()
+        if matrix is not None:
+            similarities = matrix @ self.normalize(vector)
+            best = int(np.argmax(similarities))
+            if similarities[best] >= self.threshold and self.entries[best]["top_k"] == top_k:
+                self.hits += 1
+                return self.entries[best]["results"]
+        self.misses += 1
+        return None
+
+
+    def put(self, vector, top_k, results, scores):
+        # With fewer than top_k matches any new memory could join the results, so the bar is -1
+        min_score = min(scores) if len(scores) >= top_k else -1.0
+        self.vectors.append(self.normalize(vector))
+        self.entries.append({"created": time.monotonic(), "top_k": top_k, "results": results, "min_score": min_score})
+        self.matrix = None
+        if len(self.entries) > self.max_entries:
+            self.remove(range(len(self.entries) - self.max_entries, len(self.entries)))
+
+
+    def invalidate(self, vectors):
+        matrix = self.get_matrix()
+        if matrix is None or not len(vectors):
+            return
+        new_vectors = np.stack([self.normalize(vector) for vector in vectors])
+        best_scores = (matrix @ new_vectors.T).max(axis=1)
+        keep = [i for i, entry in enumerate(self.entries) if best_scores[i] < entry["min_score"] - self.slack]
+        if len(keep) < len(self.entries):
+            self.remove(keep)
+
+
+    def clear(self):
+        self.remove([])
+
+
+    def stats(self):
+        return {"entries": len(self.entries), "hits": self.hits, "misses": self.misses}
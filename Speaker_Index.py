@@ -0,0 +1,38 @@
+import os
+import torch
+from Embedding_Index import Embedding_Index
+
+
+class Speaker_Index(Embedding_Index):
+
+
+    def __init__(self, model, voices_dir="user_voices", index_path="system_files/speaker_index.pt", sample_rate=16000,
+                 refresh_interval=10.0):
+        super().__init__(model, voices_dir, index_path, sample_rate=sample_rate, refresh_interval=refresh_interval)
+
+
+    def samples(self):
+        # Each user_voices/<name>[.<n>].wav is one enrollment sample for <name>
+        if os.path.isdir(self.samples_dir):
+            for entry in os.scandir(self.samples_dir):
+                if entry.name.endswith('.wav'):
+                    yield entry.name, entry.path, entry.name.split('.')[0]
+
+
+    def identify(self, signal, similarity_threshold=0.75):
+        # One forward pass for the input, then a single matrix product against every enrolled sample
+        self.refresh()
+        return self.identify_embedding(self.embed(signal), similarity_threshold)
+
+
+    def identify_embedding(self, embedding, similarity_threshold=0.75):
+        # Callers refresh the enrollment first, once per batch
+        if self.embeddings is None:
+            return None, 0.0
+
+        similarities = self.embeddings @ embedding
+        best = int(torch.argmax(similarities))
+        similarity = float(similarities[best])
+        if similarity > similarity_threshold:
+            return self.sample_labels[best], similarity
+        return None, similarity
@@ -0,0 +1,116 @@
+from collections import OrderedDict
+from difflib import SequenceMatcher
+from itertools import count
+import re
+import time
+from Process_Scheduler import drain_queue, wait_for_queues
+
+
+def normalize_query(text):
+    return " ".join(re.sub(r"[^\w\s']", " ", text.lower()).split())
+
+
+def query_similarity(a, b):
+    # Word-level similarity of two normalized queries, so punctuation and a changed word or two barely matter
+    return SequenceMatcher(None, a.split(), b.split()).ratio()
+
+
+class Speculative_Retriever:
+    # Sends an utterance's vector query to the database process ahead of need, from a stable partial or the
+    # just-finished transcript, so it runs while speaker and emotion analysis do. The final query reuses that
+    # result only for the same utterance and when the user's words are close enough; nothing is reused across
+    # utterances, and every other query for that utterance or an earlier one is cancelled
+
+
+    def __init__(self, db_query_queue, db_response_queue, source_index=0, similarity_threshold=0.85, max_in_flight=16):
+        self.db_query_queue = db_query_queue
+        self.db_response_queue = db_response_queue
+        self.source_index = source_index
+        self.similarity_threshold = similarity_threshold
+        self.max_in_flight = max_in_flight
+        self.request_ids = count(1)
+        # request id -> (utterance id, normalized user text), until its result is used or cancelled
+        self.in_flight = OrderedDict()
+        self.responses = {}
+        self.hits = 0
+        self.misses = 0
+
+
+    def collect(self, timeout=0):
+        if timeout and not wait_for_queues([self.db_response_queue], timeout):
+            return
+        for request_id, results in drain_queue(self.db_response_queue):
+            # Responses to cancelled requests are dropped
+            if request_id in self.in_flight:
+                self.responses[request_id] = results
+
+
+    def closest(self, utterance_id, text):
+        best, best_similarity = None, 0.0
+        for request_id, (candidate_id, candidate) in self.in_flight.items():
+            if candidate_id != utterance_id:
+                continue
+            similarity = 1.0 if candidate == text else query_similarity(text, candidate)
+            if similarity > best_similarity:
+                best, best_similarity = request_id, similarity
+        return best if best_similarity >= self.similarity_threshold else None
+
+
+    def send(self, utterance_id, text, query):
+        # Matched on the user's words alone, but the full query is what gets embedded
+        request_id = next(self.request_ids)
+        self.in_flight[request_id] = (utterance_id, text)
+        self.db_query_queue.put((self.source_index, request_id, query))
+        return request_id
+
+
+    def cancel(self, request_id):
+        # Removes it from the database process's queue if it hasn't been run yet
+        self.in_flight.pop(request_id, None)
+        if self.responses.pop(request_id, None) is None:
+            self.db_query_queue.put((self.source_index, request_id, None))
+
+
+    def discard(self, utterance_id):
+        # The utterance was thrown away before transcription, so nothing will ever ask for its results
+        for request_id, (candidate_id, _) in list(self.in_flight.items()):
+            if candidate_id == utterance_id:
+                self.cancel(request_id)
+
+
+    def start(self, utterance_id, text, query=None):
+        # Speculative: returns at once, leaving the query running in the database process
+        text = normalize_query(text)
+        if not text:
+            return
+        self.collect()
+        if self.closest(utterance_id, text) is not None:
+            return
+        while len(self.in_flight) >= self.max_in_flight:
+            self.cancel(next(iter(self.in_flight)))
+        self.send(utterance_id, text, query or text)
+
+
+    def result(self, utterance_id, text, query=None, timeout=10.0):
+        text = normalize_query(text)
+        self.collect()
+        match = self.closest(utterance_id, text)
+        for request_id, (candidate_id, _) in list(self.in_flight.items()):
+            if request_id != match and candidate_id <= utterance_id:
+                self.cancel(request_id)
+        if match is None:
+            self.misses += 1
+            match = self.send(utterance_id, text, query or text)
+        else:
+            self.hits += 1
+
+        deadline = time.monotonic() + timeout
+        while match not in self.responses:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                print(f"No retrieval results within {timeout}s, continuing without memories.")
+                self.cancel(match)
+                return []
+            self.collect(min(remaining, 0.5))
+        self.in_flight.pop(match)
+        return self.responses.pop(match)
@@ -1,29 +1,21 @@
-import os
-import pyttsx3
-import soundfile
-from speechbrain.pretrained import SpeakerRecognition
+import numpy
+from Model_Loader import speaker_recognition_model
 import speech_recognition
-import torch
-import whisper
 
 
-# Text to speech voice
-_voice = 'HKEY_LOCAL_MACHINE\SOFTWARE\Microsoft\Speech\Voices\Tokens\CereVoice William 6.1.0'
 
-# Speech to text model
-whisper.load_model('base')
+# Speech to text and speaker recognition models, loaded on first use in the process that needs them
+_transcriber = None
+_speaker_index = None
 
-# Speaker recognition model
-model = SpeakerRecognition.from_hparams(source="speechbrain/spkrec-ecapa-voxceleb", savedir="pretrained_models")
 
-
-def record_audio():
+def record_audio(device_index=None):
     try:
         recognizer = speech_recognition.Recognizer()
         #recognizer.dynamic_energy_threshold = True
         recognizer.energy_threshold = 2500
         recognizer.pause_threshold = 2
-        with speech_recognition.Microphone() as source:
+        with speech_recognition.Microphone(device_index=device_index) as source:
             audio = recognizer.listen(source)
             return audio
     except Exception as e:
@@ -39,17 +31,21 @@ def wav_to_audio(file_path):
 
 
 def speech_to_text(audio):
+    global _transcriber
     try:
-        recognizer = speech_recognition.Recognizer()
-        return recognizer.recognize_whisper(audio)
-    except speech_recognition.WaitTimeoutError:
-        return None
-    except speech_recognition.UnknownValueError:
-        print("Audio could not be transcribed")
+        if _transcriber is None:
+            from Whisper_Transcriber import Whisper_Transcriber
+            _transcriber = Whisper_Transcriber(model_size='base')
+        return _transcriber.transcribe(audio_to_array(audio))
+    except Exception as e:
+        print(f"Audio could not be transcribed: {e}")
         return None
 
     
 def text_to_speech(text):
+    # Imported here so capture processes don't load the audio output stack
+    import pyttsx3
+    from TTS_Engine import _voice
     try:
         audio_engine = pyttsx3.init()
         audio_engine.setProperty('voice', _voice)
@@ -60,38 +56,28 @@ def text_to_speech(text):
         print(f"Text to speech error: {e}")
 
 
-def recognize_speaker(input_audio_path):
-    # Thresholds
-    high_similarity_threshold = 0.9
-    lower_similarity_threshold = 0.75
-
-    # Directory containing user voice samples
-    user_voices_dir = 'user_voices'
-
-    # Process the input audio to get its embedding
-    input_signal, _ = soundfile.read(input_audio_path)
-    input_embedding = model.encode_batch(input_signal).squeeze(0)
+def audio_to_array(audio, sample_rate=16000):
+    # 16-bit PCM from AudioData as a float32 signal in [-1, 1], at its native rate if sample_rate is None
+    pcm = audio.get_raw_data(convert_rate=sample_rate, convert_width=2)
+    return numpy.frombuffer(pcm, dtype=numpy.int16).astype(numpy.float32) / 32768
 
-    # Initialize variables to track the most likely speaker
-    highest_similarity = 0
-    most_likely_speaker = None
 
-    # Process and compare each user's voice sample immediately
-    for filename in os.listdir(user_voices_dir):
-        if filename.endswith('.wav'):
-            user_name = filename.split('.')[0]
-            signal, _ = soundfile.read(os.path.join(user_voices_dir, filename))
-            user_embedding = model.encode_batch(signal).squeeze(0)
+def load_speaker_index():
+    global _speaker_index
+    if _speaker_index is None:
+        from Speaker_Index import Speaker_Index
+        _speaker_index = Speaker_Index(speaker_recognition_model(), voices_dir='user_voices')
+    return _speaker_index
 
-            similarity = torch.nn.functional.cosine_similarity(input_embedding, user_embedding, dim=0)
 
-            # Early return if a user exceeds the high threshold
-            if similarity > high_similarity_threshold:
-                return user_name
+def recognize_speaker(input_audio, similarity_threshold=0.75):
+    load_speaker_index()
 
-            # Keep track of the most likely speaker above the lower threshold
-            if similarity > highest_similarity and similarity > lower_similarity_threshold:
-                highest_similarity = similarity
-                most_likely_speaker = user_name
+    if isinstance(input_audio, str):
+        import librosa
+        input_signal, _ = librosa.load(input_audio, sr=_speaker_index.sample_rate, mono=True)
+    else:
+        input_signal = input_audio
 
-    return most_likely_speaker
+    speaker, _ = _speaker_index.identify(input_signal, similarity_threshold)
+    return speaker
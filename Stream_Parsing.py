@@ -0,0 +1,215 @@
+import json
+
+
+_ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+
+
+class Streaming_JSON_Parser:
+    # Incrementally decodes a JSON object as it streams in, reporting the decoded text of each
+    # top-level string value as soon as its characters arrive
+
+
+    def __init__(self):
+        self.chunks = []
+        self.depth = 0
+        self.started = False
+        self.in_string = False
+        self.escape = False
+        self.unicode_digits = None
+        self.high_surrogate = None
+        self.string_is_key = False
+        self.expect_key = False
+        self.key_chars = []
+        self.current_key = None
+        self.deltas = {}
+
+
+    @property
+    def complete(self):
+        return self.started and self.depth == 0 and not self.in_string
+
+
+    def emit(self, text):
+        if self.string_is_key:
+            self.key_chars.append(text)
+        elif self.depth == 1:
+            self.deltas[self.current_key] = self.deltas.get(self.current_key, "") + text
+
+
+    def decode_unicode(self, code_point):
+        if 0xD800 <= code_point <= 0xDBFF:
+            self.high_surrogate = code_point
+            return
+        if 0xDC00 <= code_point <= 0xDFFF and self.high_surrogate is not None:
+            code_point = 0x10000 + ((self.high_surrogate - 0xD800) << 10) + (code_point - 0xDC00)
+        self.high_surrogate = None
+        self.emit(chr(code_point))
+
+
+    def feed(self, text):
+        # Returns {key: newly decoded text} for the top-level string values touched by this chunk
+        self.chunks.append(text)
+        self.deltas = {}
+        for char in text:
+            if self.in_string:
+                if self.unicode_digits is not None:
+                    self.unicode_digits += char
+                    if len(self.unicode_digits) == 4:
+                        self.decode_unicode(int(self.unicode_digits, 16))
+                        self.unicode_digits = None
+                elif self.escape:
+                    self.escape = False
+                    if char == 'u':
+                        self.unicode_digits = ""
+                    else:
+                        self.emit(_ESCAPES.get(char, char))
+                elif char == '\\':
+                    self.escape = True
+                elif char == '"':
+                    self.in_string = False
+                    if self.string_is_key:
+                        self.current_key = "".join(self.key_chars)
+                        self.string_is_key = False
+                        self.expect_key = False
+                else:
+                    self.emit(char)
+            elif char == '"':
+                self.in_string = True
+                self.string_is_key = self.depth == 1 and self.expect_key
+                if self.string_is_key:
+                    self.key_chars = []
+            elif char in '{[':
+                self.depth += 1
+                self.started = True
+                if self.depth == 1:
+                    self.expect_key = char == '{'
+            elif char in '}]':
+                self.depth -= 1
+            elif char == ',' and self.depth == 1:
+                self.expect_key = True
+        return self.deltas
+
+
+    def text(self):
+        return "".join(self.chunks)
+
+
+    def value(self):
+        try:
+            return json.loads(self.text())
+        except json.JSONDecodeError:
+            return None
+
+
+class Tool_Call_Stream:
+    # Accumulates parallel streamed tool calls by their index
+
+
+    def __init__(self):
+        self.calls = {}
+
+
+    def feed(self, tool_call):
+        call = self.calls.setdefault(tool_call.index, {"name": None, "parser": Streaming_JSON_Parser(), "processed": False})
+        function = tool_call.function
+        deltas = {}
+        if function is not None:
+            if function.name:
+                call["name"] = function.name
+            if function.arguments:
+                deltas = call["parser"].feed(function.arguments)
+        return call, deltas
+
+
+class Sentence_Segmenter:
+    # Splits streamed text into speakable sentences in O(1) amortized work per character: fed text is kept as a
+    # list of chunks and joined once per emitted segment.
+    # A terminal '.', '?' or '!' (plus any closing quotes or brackets) only ends a sentence once whitespace
+    # follows it, which keeps decimals and URLs intact; known abbreviations and initials never end one.
+    # Curly quotes hold sentences together for up to max_quote_length characters; straight '"' is ambiguous
+    # (6" pipe) and never does. With min_clause_length set, a ',', ';' or ':' boundary also ends a segment once
+    # it's at least that long
+
+    ABBREVIATIONS = {"mr", "mrs", "ms", "dr", "prof", "sr", "jr", "st", "vs", "etc", "e.g", "i.e", "approx",
+                     "no", "fig", "inc", "ltd", "co", "mt", "jan", "feb", "mar", "apr", "jun", "jul", "aug",
+                     "sep", "sept", "oct", "nov", "dec", "u.s", "a.m", "p.m"}
+    CLOSERS = '"\')]}”’'
+    OPENERS = '(["“‘'
+    MAX_WORD = 16
+
+
+    def __init__(self, min_clause_length=None, max_quote_length=300):
+        self.min_clause_length = min_clause_length
+        self.max_quote_length = max_quote_length
+        self.reset()
+
+
+    def reset(self):
+        self.parts = []
+        self.length = 0
+        self.boundary = False
+        self.quote_start = None
+        # The end of the current word, enough to recognize an abbreviation, and its full length
+        self.word_tail = ""
+        self.word_length = 0
+
+
+    def in_quote(self, offset):
+        return self.quote_start is not None and offset - self.quote_start < self.max_quote_length
+
+
+    def is_abbreviation(self, text, word_start, position):
+        if self.word_length + position - word_start > self.MAX_WORD:
+            return False
+        word = (self.word_tail + text[word_start:position]).lstrip(self.CLOSERS + self.OPENERS).lower()
+        return word in self.ABBREVIATIONS or (len(word) == 1 and word.isalpha())
+
+
+    def feed(self, text):
+        segments = []
+        start = 0
+        word_start = 0
+        for position, char in enumerate(text):
+            # Offset of this character from the start of the pending segment
+            offset = self.length + position - start
+
+            if self.boundary:
+                if char in self.CLOSERS:
+                    if char == '”':
+                        self.quote_start = None
+                    continue
+                if char.isspace() and not self.in_quote(offset):
+                    segment = ("".join(self.parts) + text[start:position]).strip()
+                    if segment:
+                        segments.append(segment)
+                    self.parts, self.length, start = [], 0, position
+                    self.boundary = False
+                    self.quote_start = None
+                    offset = 0
+                else:
+                    self.boundary = False
+
+            if char.isspace():
+                word_start = position + 1
+                self.word_tail, self.word_length = "", 0
+            elif char == '“':
+                self.quote_start = offset
+            elif char == '”':
+                self.quote_start = None
+            elif char in '.?!':
+                if char != '.' or not self.is_abbreviation(text, word_start, position):
+                    self.boundary = True
+            elif char in ',;:' and self.min_clause_length and not self.in_quote(offset) and offset >= self.min_clause_length:
+                self.boundary = True
+
+        self.parts.append(text[start:])
+        self.length += len(text) - start
+        self.word_length += len(text) - word_start
+        self.word_tail = (self.word_tail + text[word_start:])[-self.MAX_WORD:]
+        return segments
+
+
+    def flush(self):
+        segment = "".join(self.parts).strip()
+        self.reset()
+        return segment
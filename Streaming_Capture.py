@@ -0,0 +1,146 @@
+from collections import deque
+import threading
+import numpy as np
+import speech_recognition
+from Voice_Activity_Detector import Voice_Activity_Detector
+
+
+def frames_to_signal(frames):
+    return np.frombuffer(b"".join(frames), dtype=np.int16).astype(np.float32) / 32768
+
+
+class Incremental_Transcriber:
+    # Re-transcribes the growing utterance on a background thread so the capture loop never stops reading frames.
+    # Only the newest buffer is kept pending, so a slow model skips intermediate partials instead of falling behind
+
+
+    def __init__(self, transcriber, on_partial=None, sample_rate=16000, window_seconds=30):
+        self.transcriber = transcriber
+        self.on_partial = on_partial
+        self.window_samples = window_seconds * sample_rate
+        self.condition = threading.Condition()
+        self.pending = None
+        self.utterance = 0
+        self.text = ""
+        self.covered_samples = 0
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+
+    def reset(self):
+        with self.condition:
+            self.utterance += 1
+            self.pending = None
+            self.text = ""
+            self.covered_samples = 0
+
+
+    def submit(self, signal):
+        with self.condition:
+            self.pending = (self.utterance, signal)
+            self.condition.notify_all()
+
+
+    def result(self):
+        with self.condition:
+            return self.text, self.covered_samples
+
+
+    def run(self):
+        while True:
+            with self.condition:
+                while self.pending is None and self.running:
+                    self.condition.wait()
+                if not self.running:
+                    return
+                utterance, signal = self.pending
+                self.pending = None
+
+            try:
+                text = self.transcriber.transcribe(signal[-self.window_samples:])
+            except Exception as e:
+                print(f"Partial transcription error: {e}")
+                continue
+
+            with self.condition:
+                if utterance != self.utterance:
+                    continue
+                self.text = text
+                self.covered_samples = len(signal)
+            if self.on_partial is not None:
+                self.on_partial(text)
+
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+
+
+class Streaming_Capture:
+
+
+    def __init__(self, transcriber, on_partial=None, sample_rate=16000, frame_ms=30, energy_threshold=2500,
+                 pre_roll_seconds=0.3, partial_interval=0.5, min_silence=0.5, max_silence=1.2, max_utterance_seconds=30,
+                 device_index=None):
+        self.vad = Voice_Activity_Detector(sample_rate=sample_rate, frame_ms=frame_ms, energy_threshold=energy_threshold)
+        self.incremental = Incremental_Transcriber(transcriber, on_partial=on_partial, sample_rate=sample_rate)
+        self.sample_rate = sample_rate
+        self.device_index = device_index
+        frames_per_second = 1000 / frame_ms
+        self.pre_roll_frames = int(pre_roll_seconds * frames_per_second)
+        self.partial_frames = max(1, int(partial_interval * frames_per_second))
+        self.min_silence_frames = int(min_silence * frames_per_second)
+        self.max_silence_frames = int(max_silence * frames_per_second)
+        self.max_utterance_frames = int(max_utterance_seconds * frames_per_second)
+
+
+    def end_of_turn(self, speech, silent_frames):
+        if silent_frames >= self.max_silence_frames or len(speech) >= self.max_utterance_frames:
+            return True
+        if silent_frames < self.min_silence_frames:
+            return False
+        # A short pause ends the turn only once the partial covers all of the speech and reads as a finished sentence
+        text, covered_samples = self.incremental.result()
+        speech_samples = (len(speech) - silent_frames) * self.vad.frame_samples
+        return covered_samples >= speech_samples and text.rstrip('"\' ').endswith(('.', '?', '!'))
+
+
+    def listen(self, stop_event=None):
+        self.vad.reset()
+        self.incremental.reset()
+        pre_roll = deque(maxlen=self.pre_roll_frames + self.vad.start_frames)
+        speech = []
+        silent_frames = 0
+        last_submitted = 0
+
+        with speech_recognition.Microphone(device_index=self.device_index, sample_rate=self.sample_rate,
+                                           chunk_size=self.vad.frame_samples) as source:
+            while stop_event is None or not stop_event.is_set():
+                frame = source.stream.read(self.vad.frame_samples)
+                speaking = self.vad.is_speech(frame)
+
+                if not speech:
+                    pre_roll.append(frame)
+                    if speaking:
+                        speech = list(pre_roll)
+                    continue
+
+                speech.append(frame)
+                silent_frames = 0 if speaking else silent_frames + 1
+
+                # Refresh the partial on a fixed cadence while talking, and once more as soon as a pause starts
+                if silent_frames == 1 or (speaking and len(speech) - last_submitted >= self.partial_frames):
+                    self.incremental.submit(frames_to_signal(speech))
+                    last_submitted = len(speech)
+
+                if self.end_of_turn(speech, silent_frames):
+                    text, _ = self.incremental.result()
+                    return frames_to_signal(speech[:len(speech) - silent_frames]), text
+
+        return None, ""
+
+
+    def stop(self):
+        self.incremental.stop()
@@ -0,0 +1,171 @@
+from collections import OrderedDict, deque
+from hashlib import md5
+import os
+import queue
+import threading
+import time
+import wave
+import pyaudio
+import pyttsx3
+
+
+# Text to speech voice
+_voice = 'HKEY_LOCAL_MACHINE\SOFTWARE\Microsoft\Speech\Voices\Tokens\CereVoice William 6.1.0'
+
+
+class TTS_Engine:
+    # One warm pyttsx3 engine renders sentences into audio buffers on its own thread while a second thread
+    # plays the previous buffer, so sentence N+1 is synthesized during sentence N's playback
+
+
+    def __init__(self, voice=_voice, cache_dir="system_files/tts_cache", memory_entries=64, disk_entries=512, lookahead=3, on_idle=None, on_first_audio=None):
+        self.voice = voice
+        self.cache_dir = cache_dir
+        self.memory_entries = memory_entries
+        self.disk_entries = disk_entries
+        self.on_idle = on_idle
+        self.on_first_audio = on_first_audio
+        self.playing_trace_id = None
+        os.makedirs(cache_dir, exist_ok=True)
+
+        self.memory_cache = OrderedDict()
+        self.disk_cache = OrderedDict((entry.name, None) for entry in sorted(os.scandir(cache_dir), key=lambda entry: entry.stat().st_mtime)
+                                      if entry.name.endswith('.wav') and not entry.name.startswith("rendering."))
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+        self.sentences = queue.Queue()
+        self.buffers = queue.Queue(maxsize=lookahead)
+        self.lock = threading.Lock()
+        self.outstanding = 0
+        self.turn_started = None
+        self.first_audio_latencies = deque(maxlen=100)
+        self.threads = [threading.Thread(target=self.synthesis_loop, daemon=True),
+                        threading.Thread(target=self.playback_loop, daemon=True)]
+
+
+    def start(self):
+        for thread in self.threads:
+            thread.start()
+
+
+    def say(self, text, trace_id=None):
+        with self.lock:
+            if self.outstanding == 0:
+                self.turn_started = time.monotonic()
+            self.outstanding += 1
+        self.sentences.put((text, trace_id))
+
+
+    def stop(self):
+        self.sentences.put(None)
+        for thread in self.threads:
+            thread.join()
+
+
+    def cache_key(self, text):
+        return md5(f"{self.voice}|{text}".encode()).hexdigest() + ".wav"
+
+
+    def read_wav(self, path):
+        with wave.open(path, 'rb') as wav:
+            return wav.readframes(wav.getnframes()), wav.getsampwidth(), wav.getnchannels(), wav.getframerate()
+
+
+    def render(self, engine, text):
+        key = self.cache_key(text)
+        audio = self.memory_cache.get(key)
+        if audio is not None:
+            self.memory_cache.move_to_end(key)
+            self.cache_hits += 1
+            return audio
+
+        path = os.path.join(self.cache_dir, key)
+        if key in self.disk_cache and os.path.exists(path):
+            self.disk_cache.move_to_end(key)
+            os.utime(path)
+            self.cache_hits += 1
+        else:
+            temp_path = os.path.join(self.cache_dir, "rendering." + key)
+            engine.save_to_file(text, temp_path)
+            engine.runAndWait()
+            os.replace(temp_path, path)
+            self.disk_cache[key] = None
+            self.cache_misses += 1
+            while len(self.disk_cache) > self.disk_entries:
+                evicted, _ = self.disk_cache.popitem(last=False)
+                try:
+                    os.remove(os.path.join(self.cache_dir, evicted))
+                except FileNotFoundError:
+                    pass
+
+        audio = self.read_wav(path)
+        self.memory_cache[key] = audio
+        if len(self.memory_cache) > self.memory_entries:
+            self.memory_cache.popitem(last=False)
+        return audio
+
+
+    def synthesis_loop(self):
+        # pyttsx3 engines are not thread safe, so the engine lives entirely on this thread
+        engine = pyttsx3.init()
+        if self.voice:
+            engine.setProperty('voice', self.voice)
+        while True:
+            item = self.sentences.get()
+            if item is None:
+                self.buffers.put(None)
+                return
+            text, trace_id = item
+            try:
+                audio = self.render(engine, text)
+            except Exception as e:
+                print(f"Text to speech error: {e}")
+                audio = None
+            self.buffers.put((text, audio, trace_id))
+
+
+    def playback_loop(self):
+        player = pyaudio.PyAudio()
+        stream = None
+        stream_format = None
+        try:
+            while True:
+                item = self.buffers.get()
+                if item is None:
+                    return
+                text, audio, trace_id = item
+
+                if audio is not None:
+                    frames, sample_width, channels, sample_rate = audio
+                    # The output stream stays open between buffers, so consecutive sentences play back to back
+                    if stream_format != (sample_width, channels, sample_rate):
+                        if stream is not None:
+                            stream.close()
+                        stream = player.open(format=player.get_format_from_width(sample_width),
+                                             channels=channels, rate=sample_rate, output=True)
+                        stream_format = (sample_width, channels, sample_rate)
+
+                    with self.lock:
+                        turn_started, self.turn_started = self.turn_started, None
+                    if turn_started is not None:
+                        latency = time.monotonic() - turn_started
+                        self.first_audio_latencies.append(latency)
+                        print(f"First audio {latency * 1000:.0f}ms after first sentence "
+                              f"(mean {1000 * sum(self.first_audio_latencies) / len(self.first_audio_latencies):.0f}ms, "
+                              f"cache hits {self.cache_hits}, misses {self.cache_misses}).")
+                    # Reported once per traced turn, when its first sentence starts playing
+                    if trace_id is not None and trace_id != self.playing_trace_id and self.on_first_audio is not None:
+                        self.on_first_audio(trace_id)
+                    self.playing_trace_id = trace_id
+                    stream.write(frames)
+
+                with self.lock:
+                    self.outstanding -= 1
+                    idle = self.outstanding == 0
+                if idle and self.on_idle is not None:
+                    self.on_idle()
+        finally:
+            if stream is not None:
+                stream.close()
+            player.terminate()
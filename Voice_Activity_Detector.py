@@ -0,0 +1,43 @@
+import numpy as np
+
+try:
+    import webrtcvad
+except ImportError:
+    webrtcvad = None
+
+
+class Voice_Activity_Detector:
+    # Frame-level speech detector, using WebRTC's VAD when it's installed and an RMS energy gate otherwise
+
+
+    def __init__(self, sample_rate=16000, frame_ms=30, energy_threshold=2500, aggressiveness=2, start_frames=3):
+        if frame_ms not in (10, 20, 30):
+            raise ValueError("frame_ms must be 10, 20 or 30")
+        self.sample_rate = sample_rate
+        self.frame_ms = frame_ms
+        self.frame_samples = sample_rate * frame_ms // 1000
+        self.energy_threshold = energy_threshold
+        # Require a few voiced frames in a row before declaring speech so clicks don't open a turn
+        self.start_frames = start_frames
+        self.voiced_run = 0
+        self.vad = webrtcvad.Vad(aggressiveness) if webrtcvad is not None and sample_rate in (8000, 16000, 32000, 48000) else None
+
+
+    def is_voiced(self, frame):
+        # frame is 16-bit PCM bytes of exactly frame_samples samples
+        if self.vad is not None:
+            return self.vad.is_speech(frame, self.sample_rate)
+        samples = np.frombuffer(frame, dtype=np.int16).astype(np.float32)
+        return float(np.sqrt(np.mean(samples * samples))) > self.energy_threshold
+
+
+    def is_speech(self, frame):
+        if self.is_voiced(frame):
+            self.voiced_run += 1
+        else:
+            self.voiced_run = 0
+        return self.voiced_run >= self.start_frames
+
+
+    def reset(self):
+        self.voiced_run = 0
@@ -0,0 +1,32 @@
+from Emotion_Classifier import Emotion_Classifier
+from Model_Loader import speaker_recognition_model
+from Speaker_Index import Speaker_Index
+
+
+class Voice_Analysis_Engine:
+    # One ECAPA forward pass per utterance feeds both speaker identification and emotion classification.
+    # Utterances that queue up are embedded together in a single padded batch
+
+
+    def __init__(self, voices_dir="user_voices", emotion_samples_dir="emotion_samples", similarity_threshold=0.75):
+        model = speaker_recognition_model()
+        self.similarity_threshold = similarity_threshold
+        self.speaker_index = Speaker_Index(model, voices_dir=voices_dir)
+        self.emotion_classifier = Emotion_Classifier(model, samples_dir=emotion_samples_dir)
+
+
+    def analyze(self, signal):
+        return self.analyze_batch([signal])[0]
+
+
+    def analyze_batch(self, signals):
+        # Returns (speaker or None, emotion) for each signal
+        embeddings = self.speaker_index.embed_batch(signals)
+        self.speaker_index.refresh()
+        self.emotion_classifier.refresh()
+        results = []
+        for embedding in embeddings:
+            speaker, _ = self.speaker_index.identify_embedding(embedding, self.similarity_threshold)
+            emotion, _ = self.emotion_classifier.classify(embedding)
+            results.append((speaker, emotion))
+        return results
@@ -0,0 +1,89 @@
+import os
+import librosa
+import numpy as np
+
+
+class Wake_Word_Spotter:
+    # Template keyword spotter: each wake_words/*.wav recording of "Jarvis" becomes an MFCC template, and an
+    # utterance matches when some template aligns to a stretch of it with a low enough per-frame DTW cost
+
+    DEFAULT_THRESHOLD = 3.0
+
+
+    def __init__(self, templates_dir="wake_words", threshold=None, sample_rate=16000, n_mfcc=13, margin=1.25):
+        self.sample_rate = sample_rate
+        self.n_mfcc = n_mfcc
+        self.templates = []
+        if os.path.isdir(templates_dir):
+            for filename in sorted(os.listdir(templates_dir)):
+                if filename.endswith('.wav'):
+                    signal, _ = librosa.load(os.path.join(templates_dir, filename), sr=sample_rate, mono=True)
+                    self.templates.append(self.features(signal))
+        if not self.templates:
+            raise FileNotFoundError(f"No wake word templates found in {templates_dir}")
+        self.threshold = threshold if threshold is not None else self.calibrate(margin)
+        print(f"Wake word spotter loaded {len(self.templates)} templates, threshold {self.threshold:.2f}.")
+
+
+    def features(self, signal):
+        # Drop c0 (overall energy) and normalize each coefficient so loudness and channel don't dominate the match
+        mfcc = librosa.feature.mfcc(y=np.asarray(signal, dtype=np.float32), sr=self.sample_rate,
+                                    n_mfcc=self.n_mfcc + 1, n_fft=400, hop_length=160)[1:]
+        return (mfcc - mfcc.mean(axis=1, keepdims=True)) / (mfcc.std(axis=1, keepdims=True) + 1e-8)
+
+
+    def match_cost(self, template, features):
+        if features.shape[1] < template.shape[1] // 2:
+            return np.inf
+        cost, _ = librosa.sequence.dtw(X=template, Y=features, subseq=True, metric='euclidean')
+        return float(cost[-1].min()) / template.shape[1]
+
+
+    def calibrate(self, margin):
+        # Leave-one-out: the worst best-match between the templates themselves, plus a margin
+        if len(self.templates) < 2:
+            return self.DEFAULT_THRESHOLD
+        costs = [min(self.match_cost(other, template) for j, other in enumerate(self.templates) if j != i)
+                 for i, template in enumerate(self.templates)]
+        return max(costs) * margin
+
+
+    def score(self, signal):
+        features = self.features(signal)
+        return min(self.match_cost(template, features) for template in self.templates)
+
+
+    def detect(self, signal):
+        score = self.score(signal)
+        return score <= self.threshold, score
+
+
+class Wake_Word_Audit:
+    # Compares the spotter's decisions with Whisper's transcripts to measure how often it would gate out real requests
+
+
+    def __init__(self, report_every=20):
+        self.report_every = report_every
+        self.utterances = 0
+        self.addressed = 0
+        self.false_rejects = 0
+        self.false_accepts = 0
+
+
+    def record(self, detected, transcript_addressed):
+        self.utterances += 1
+        if transcript_addressed:
+            self.addressed += 1
+            if not detected:
+                self.false_rejects += 1
+        elif detected:
+            self.false_accepts += 1
+        if self.utterances % self.report_every == 0:
+            print(self.report())
+
+
+    def report(self):
+        false_reject_rate = self.false_rejects / self.addressed if self.addressed else 0.0
+        false_accept_rate = self.false_accepts / (self.utterances - self.addressed) if self.utterances > self.addressed else 0.0
+        return (f"Wake word audit: {self.utterances} utterances, false rejects {self.false_rejects}/{self.addressed} "
+                f"({false_reject_rate:.1%}), false accepts {self.false_accepts} ({false_accept_rate:.1%}).")
@@ -0,0 +1,48 @@
+import numpy
+import torch
+import whisper
+from Model_Loader import whisper_model
+
+
+class Whisper_Transcriber:
+
+
+    def __init__(self, model_size="base", threads=None, device=None, language="en"):
+        if threads:
+            torch.set_num_threads(threads)
+        self.model_size = model_size
+        self.device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+        # Shared with anything preloaded in this process, e.g. by a forking parent
+        self.model = whisper_model(model_size, self.device)
+        self.options = whisper.DecodingOptions(language=language, fp16=self.device == "cuda", without_timestamps=True)
+
+
+    def transcribe(self, signal):
+        return self.transcribe_batch([signal])[0]
+
+
+    def transcribe_batch(self, signals):
+        # Whisper decodes fixed 30 s windows, so every utterance that fits is padded into one mel batch
+        # and a single forward pass serves them all; longer ones take the chunked transcribe() path
+        texts = [None] * len(signals)
+        batch = [i for i, signal in enumerate(signals) if len(signal) <= whisper.audio.N_SAMPLES]
+
+        if batch:
+            mels = torch.stack([
+                whisper.log_mel_spectrogram(whisper.pad_or_trim(torch.from_numpy(numpy.asarray(signals[i], dtype=numpy.float32))),
+                                            n_mels=self.model.dims.n_mels)
+                for i in batch
+            ]).to(self.model.device)
+            with torch.no_grad():
+                results = whisper.decode(self.model, mels, self.options)
+            for i, result in zip(batch, results):
+                texts[i] = result.text.strip()
+
+        for i, signal in enumerate(signals):
+            if texts[i] is None:
+                result = self.model.transcribe(numpy.asarray(signal, dtype=numpy.float32),
+                                               language=self.options.language,
+                                               fp16=self.options.fp16)
+                texts[i] = result["text"].strip()
+
+        return texts
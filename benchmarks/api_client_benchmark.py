@@ -0,0 +1,60 @@
+import argparse
+import os
+import sys
+import time
+import numpy as np
+import openai
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from API_Client import API_Client
+from mock_openai_server import Mock_OpenAI_Server
+
+
+def run(name, request, count):
+    latencies, failures = [], 0
+    for i in range(count):
+        start = time.perf_counter()
+        try:
+            request(f"query {i}")
+        except Exception:
+            failures += 1
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies = np.array(latencies)
+    print(f"{name:>22}: p50 {np.percentile(latencies, 50):7.1f}ms  p95 {np.percentile(latencies, 95):7.1f}ms  "
+          f"p99 {np.percentile(latencies, 99):7.1f}ms  max {latencies.max():7.1f}ms  failures {failures}/{count}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare query embedding latency and failures with and without the pooled "
+                                                 "client's deadlines, retries and hedging, against a stub server injecting faults.")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.02, help="Base server latency in seconds")
+    parser.add_argument("--slow-rate", type=float, default=0.05)
+    parser.add_argument("--slow-latency", type=float, default=2.0)
+    parser.add_argument("--error-rate", type=float, default=0.02)
+    parser.add_argument("--drop-rate", type=float, default=0.01)
+    parser.add_argument("--deadline", type=float, default=3.0)
+    parser.add_argument("--hedge-after", type=float, default=0.2)
+    args = parser.parse_args()
+
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+    server = Mock_OpenAI_Server(latency=args.latency, slow_rate=args.slow_rate, slow_latency=args.slow_latency,
+                                error_rate=args.error_rate, drop_rate=args.drop_rate).start()
+    try:
+        # What Pinecone_Interface did before: a fresh SDK client per caller with its own default retry policy
+        plain = openai.OpenAI(base_url=server.base_url)
+        run("sdk defaults", lambda text: plain.embeddings.create(input=text, model="text-embedding-ada-002"), args.requests)
+
+        client = API_Client(base_url=server.base_url)
+        embed = lambda text: (lambda timeout: client.openai.embeddings.create(input=text, model="text-embedding-ada-002", timeout=timeout))
+        run("deadline + retries", lambda text: client.call(embed(text), deadline=args.deadline, attempt_timeout=args.deadline / 2),
+            args.requests)
+        run("deadline + hedging", lambda text: client.call(embed(text), deadline=args.deadline, attempt_timeout=args.deadline / 2,
+                                                            hedge_after=args.hedge_after), args.requests)
+        print(f"client stats {client.stats()}, server stats {server.requests}")
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+import argparse
+from collections import defaultdict
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from mock_openai_server import Mock_OpenAI_Server
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+REPO_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+STARTED_PATTERN = re.compile(r"Started (\S+) \(pid (\d+)\)\.")
+# Read-only configuration Jarvis needs from its working directory. The run itself happens in a temporary copy, so
+# its conversation logs, caches and vector store never touch the checkout's system_files
+CONFIG_PATHS = ["system_files/Assistant_Instructions.json", "system_files/speaker_index.pt",
+                "system_files/emotion_index.pt", "user_voices", "emotion_samples"]
+
+
+class Process_Sampler:
+    # Polls CPU time and resident memory of each named Jarvis process while the run is in progress
+
+
+    def __init__(self, interval=0.5):
+        self.interval = interval
+        self.processes = {}
+        self.cpu_seconds = defaultdict(float)
+        self.peak_rss_mb = defaultdict(float)
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+
+    def add(self, name, pid):
+        if psutil is None:
+            return
+        try:
+            with self.lock:
+                self.processes[name] = psutil.Process(pid)
+        except psutil.NoSuchProcess:
+            pass
+
+
+    def sample(self):
+        with self.lock:
+            processes = list(self.processes.items())
+        for name, process in processes:
+            try:
+                cpu = process.cpu_times()
+                self.cpu_seconds[name] = cpu.user + cpu.system
+                self.peak_rss_mb[name] = max(self.peak_rss_mb[name], process.memory_info().rss / 2**20)
+            except psutil.NoSuchProcess:
+                pass
+
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            self.sample()
+
+
+def read_latency_report(path):
+    try:
+        with open(path, 'r') as file:
+            return json.load(file)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+def prepare_work_dir(work_dir):
+    for relative_path in CONFIG_PATHS:
+        source = os.path.join(REPO_ROOT, relative_path)
+        destination = os.path.join(work_dir, relative_path)
+        if os.path.isdir(source):
+            shutil.copytree(source, destination)
+        elif os.path.exists(source):
+            os.makedirs(os.path.dirname(destination), exist_ok=True)
+            shutil.copy2(source, destination)
+
+
+def run_pipeline(args, work_dir, server):
+    environment = dict(os.environ,
+                       OPENAI_API_KEY="benchmark",
+                       OPENAI_BASE_URL=server.base_url,
+                       VECTOR_STORE="pinecone",
+                       CAPTURE_SOURCES=f"benchmark=wav:{os.path.abspath(args.corpus)}",
+                       EMBEDDING_CACHE_PATH=os.path.join(work_dir, "embedding_cache.sqlite"),
+                       LATENCY_REPORT_PATH=os.path.join(work_dir, "latency"),
+                       LATENCY_REPORT_INTERVAL="1",
+                       PYTHONUNBUFFERED="1")
+    log = open(os.path.join(work_dir, "jarvis.log"), 'w')
+    jarvis = subprocess.Popen([sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "offline_jarvis.py")],
+                              cwd=work_dir, env=environment, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                              stderr=subprocess.STDOUT, text=True)
+    sampler = Process_Sampler()
+    sampler.add("main", jarvis.pid)
+    sampler.thread.start()
+
+    def read_output():
+        for line in jarvis.stdout:
+            log.write(line)
+            started = STARTED_PATTERN.search(line)
+            if started:
+                sampler.add(started.group(1), int(started.group(2)))
+
+    reader = threading.Thread(target=read_output, daemon=True)
+    reader.start()
+
+    # Each corpus recording is one turn; the run ends when they have all been answered or the timeout passes
+    report_path = os.path.join(work_dir, "latency.json")
+    started = time.monotonic()
+    timed_out = True
+    while time.monotonic() - started < args.timeout and jarvis.poll() is None:
+        report = read_latency_report(report_path)
+        if report and report["stages"].get("total", {}).get("count", 0) >= args.turns:
+            timed_out = False
+            break
+        time.sleep(1)
+    wall_seconds = time.monotonic() - started
+
+    sampler.sample()
+    try:
+        jarvis.stdin.write("stop\n")
+        jarvis.stdin.close()
+        jarvis.wait(timeout=60)
+    except (OSError, subprocess.TimeoutExpired):
+        jarvis.kill()
+        jarvis.wait()
+    sampler.stop_event.set()
+    reader.join(timeout=5)
+    log.close()
+
+    if timed_out:
+        print(f"Timed out after {wall_seconds:.0f}s; see {os.path.join(work_dir, 'jarvis.log')}.")
+    report = read_latency_report(report_path) or {"stages": {}}
+    return {"wall_seconds": round(wall_seconds, 1),
+            "timed_out": timed_out,
+            "stages": report["stages"],
+            "cpu_seconds": {name: round(seconds, 2) for name, seconds in sampler.cpu_seconds.items()},
+            "peak_rss_mb": {name: round(rss, 1) for name, rss in sampler.peak_rss_mb.items()},
+            "openai_requests": dict(server.requests)}
+
+
+def flatten(results):
+    # Metrics compared against the baseline, all of them lower-is-better
+    metrics = {}
+    for stage, stats in results["stages"].items():
+        for percentile in ("p50_ms", "p95_ms", "p99_ms"):
+            metrics[f"{stage}.{percentile}"] = stats[percentile]
+    for name, seconds in results["cpu_seconds"].items():
+        metrics[f"cpu_seconds.{name}"] = seconds
+    metrics["peak_rss_mb.total"] = round(sum(results["peak_rss_mb"].values()), 1)
+    return metrics
+
+
+def compare(metrics, baseline, tolerance, absolute_slack):
+    regressions = []
+    for name, expected in baseline.items():
+        measured = metrics.get(name)
+        if measured is None:
+            continue
+        if measured > expected * (1 + tolerance) and measured - expected > absolute_slack:
+            regressions.append((name, expected, measured))
+    return regressions
+
+
+def print_results(results):
+    print(f"{'stage':>22}  {'count':>5}  {'p50':>9}  {'p95':>9}  {'p99':>9}")
+    for stage, stats in results["stages"].items():
+        label = "time to first audio" if stage == "total" else stage
+        print(f"{label:>22}  {stats['count']:>5}  {stats['p50_ms']:>7.1f}ms  {stats['p95_ms']:>7.1f}ms  {stats['p99_ms']:>7.1f}ms")
+    if results["cpu_seconds"]:
+        print(f"\n{'process':>22}  {'cpu':>8}  {'cpu %':>6}  {'peak rss':>9}")
+        for name, seconds in sorted(results["cpu_seconds"].items()):
+            print(f"{name:>22}  {seconds:>7.2f}s  {100 * seconds / results['wall_seconds']:>5.1f}%  {results['peak_rss_mb'][name]:>7.1f}MB")
+    else:
+        print("\nInstall psutil to record CPU and memory per process.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the full Jarvis pipeline offline against a WAV corpus, "
+                                                 "a mock OpenAI server and an in-memory Pinecone index, in a temporary "
+                                                 "copy of the configuration. Speech is still synthesized and played, so "
+                                                 "a TTS voice and an audio output device are required; turns only "
+                                                 "complete once their first audio starts playing.")
+    parser.add_argument("--corpus", required=True, help="Directory of WAV recordings, each one a request addressed to Jarvis")
+    parser.add_argument("--turns", type=int, default=None, help="Turns to wait for (default: one per recording)")
+    parser.add_argument("--token-rate", type=float, default=50, help="Streamed completion tokens per second")
+    parser.add_argument("--first-token-delay", type=float, default=0.3)
+    parser.add_argument("--timeout", type=float, default=600)
+    parser.add_argument("--baseline", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines", "end_to_end.json"))
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative slowdown before a metric counts as a regression")
+    parser.add_argument("--absolute-slack", type=float, default=20, help="Differences below this (ms, s or MB) never count as regressions")
+    parser.add_argument("--output", default=None, help="Write the full results as JSON")
+    args = parser.parse_args()
+    if args.turns is None:
+        args.turns = len([name for name in os.listdir(args.corpus) if name.endswith('.wav')])
+
+    server = Mock_OpenAI_Server(tokens_per_second=args.token_rate, first_token_delay=args.first_token_delay).start()
+    try:
+        with tempfile.TemporaryDirectory() as work_dir:
+            prepare_work_dir(work_dir)
+            results = run_pipeline(args, work_dir, server)
+    finally:
+        server.stop()
+
+    print_results(results)
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=4)
+
+    metrics = flatten(results)
+    if args.update_baseline:
+        if results["timed_out"]:
+            sys.exit("Not updating the baseline from a run that timed out.")
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, 'w') as file:
+            json.dump(metrics, file, indent=4, sort_keys=True)
+        print(f"\nBaseline written to {args.baseline}.")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"\nNo baseline at {args.baseline}; run with --update-baseline to record one.")
+        sys.exit(1 if results["timed_out"] else 0)
+    with open(args.baseline, 'r') as file:
+        baseline = json.load(file)
+    regressions = compare(metrics, baseline, args.tolerance, args.absolute_slack)
+    for name, expected, measured in regressions:
+        print(f"REGRESSION {name}: {measured} vs baseline {expected}")
+    if regressions or results["timed_out"]:
+        sys.exit(1)
+    print("\nNo regressions against the baseline.")
+
+
+if __name__ == "__main__":
+    main()
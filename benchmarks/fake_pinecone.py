@@ -0,0 +1,50 @@
+import json
+import os
+import sys
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from Local_Vector_Store import Match
+
+
+class Fake_Index:
+    # In-memory stand-in for pinecone.Index with the same upsert/query/describe_index_stats surface.
+    # BENCHMARK_MEMORIES can name a JSONL file of {"id", "values", "metadata"} records to preload
+
+
+    def __init__(self, name=None):
+        self.name = name
+        self.records = {}
+        self.ids = []
+        self.matrix = None
+        memories_path = os.getenv("BENCHMARK_MEMORIES")
+        if memories_path:
+            with open(memories_path, 'r') as file:
+                self.upsert(vectors=[json.loads(line) for line in file if line.strip()])
+
+
+    def upsert(self, vectors):
+        for vector in vectors:
+            values = np.asarray(vector["values"], dtype=np.float32)
+            self.records[vector["id"]] = (values / (np.linalg.norm(values) or 1.0), vector.get("metadata", {}))
+        # The matrix is rebuilt on the next query
+        self.matrix = None
+        return {"upserted_count": len(vectors)}
+
+
+    def query(self, vector, top_k=5, include_metadata=False, **kwargs):
+        if not self.records:
+            return {"matches": []}
+        if self.matrix is None:
+            self.ids = list(self.records)
+            self.matrix = np.stack([self.records[id][0] for id in self.ids])
+        query = np.asarray(vector, dtype=np.float32)
+        scores = self.matrix @ (query / (np.linalg.norm(query) or 1.0))
+        top = np.argsort(-scores)[:top_k]
+        return {"matches": [Match(id=self.ids[i], score=float(scores[i]),
+                                  metadata=self.records[self.ids[i]][1] if include_metadata else None) for i in top]}
+
+
+    def describe_index_stats(self):
+        dimension = len(next(iter(self.records.values()))[0]) if self.records else 0
+        return {"dimension": dimension, "total_vector_count": len(self.records)}
@@ -0,0 +1,179 @@
+import base64
+from hashlib import md5
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import random
+import socket
+import threading
+import time
+import numpy as np
+
+
+DEFAULT_RESPONSE = ("Certainly, Sir. I have gone through everything you asked about, and the short answer is yes. "
+                    "The longer answer involves a few details worth mentioning, so bear with me for a moment. "
+                    "Let me know if you would like me to look into anything else.")
+
+
+class Mock_OpenAI_Server:
+    # Local stand-in for the chat completions and embeddings endpoints. Streamed completions answer with a
+    # respond_to_user tool call, then a save_to_vector_database call, emitted as argument deltas at a fixed
+    # token rate; embeddings are unit vectors seeded from the md5 of the input, so repeated runs match.
+    # For client testing every request can be given base latency, a slow tail, 500 errors or dropped connections
+
+
+    def __init__(self, port=0, host="127.0.0.1", tokens_per_second=50, chars_per_token=4,
+                 response_text=DEFAULT_RESPONSE, first_token_delay=0.3, dimension=1536,
+                 latency=0.0, slow_rate=0.0, slow_latency=2.0, error_rate=0.0, drop_rate=0.0, seed=0):
+        self.latency = latency
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.error_rate = error_rate
+        self.drop_rate = drop_rate
+        self.random = random.Random(seed)
+        self.random_lock = threading.Lock()
+        self.tokens_per_second = tokens_per_second
+        self.chars_per_token = chars_per_token
+        self.response_text = response_text
+        self.first_token_delay = first_token_delay
+        self.dimension = dimension
+        self.requests = {"chat": 0, "embeddings": 0, "errors": 0, "drops": 0}
+        self.server = ThreadingHTTPServer((host, port), self.handler())
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+
+    def start(self):
+        self.thread.start()
+        return self
+
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+    def embedding(self, text):
+        rng = np.random.default_rng(int(md5(text.encode()).hexdigest()[:16], 16))
+        vector = rng.standard_normal(self.dimension).astype(np.float32)
+        return vector / np.linalg.norm(vector)
+
+
+    def tool_calls(self, messages):
+        user_message = next((message["content"] for message in reversed(messages) if message.get("role") == "user"), "")
+        return [("respond_to_user", json.dumps({"response": self.response_text})),
+                ("save_to_vector_database", json.dumps({"text": f"Benchmark memory {md5(user_message.encode()).hexdigest()[:8]}"}))]
+
+
+    def chunk(self, model, delta, finish_reason=None):
+        return {"id": "chatcmpl-benchmark", "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+
+
+    def fault(self):
+        # Decides this request's injected delay and failure, if any
+        with self.random_lock:
+            delay = self.latency + (self.slow_latency if self.random.random() < self.slow_rate else 0.0)
+            roll = self.random.random()
+        if roll < self.drop_rate:
+            return delay, "drop"
+        if roll < self.drop_rate + self.error_rate:
+            return delay, "error"
+        return delay, None
+
+
+    def handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # HTTP/1.1 so clients can keep connections alive between requests
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                delay, fault = server.fault()
+                time.sleep(delay)
+                if fault == "drop":
+                    server.requests["drops"] += 1
+                    self.close_connection = True
+                    self.connection.shutdown(socket.SHUT_RDWR)
+                    return
+                if fault == "error":
+                    server.requests["errors"] += 1
+                    self.send_json({"error": {"message": "Injected server error", "type": "server_error"}}, status=500)
+                    return
+                if self.path.endswith("/chat/completions"):
+                    server.requests["chat"] += 1
+                    if body.get("stream"):
+                        self.stream_completion(body)
+                    else:
+                        self.send_json(self.completion(body))
+                elif self.path.endswith("/embeddings"):
+                    server.requests["embeddings"] += 1
+                    self.send_json(self.embeddings(body))
+                else:
+                    self.send_error(404)
+
+            def completion(self, body):
+                # Non-streamed requests only come from context summaries
+                return {"id": "chatcmpl-benchmark", "object": "chat.completion", "created": int(time.time()), "model": body.get("model"),
+                        "choices": [{"index": 0, "finish_reason": "stop",
+                                     "message": {"role": "assistant", "content": "Summary of the earlier conversation."}}],
+                        "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}}
+
+            def embeddings(self, body):
+                texts = body["input"] if isinstance(body["input"], list) else [body["input"]]
+                data = []
+                for index, text in enumerate(texts):
+                    vector = server.embedding(text)
+                    # Recent SDKs request base64 and decode it back to floats themselves
+                    if body.get("encoding_format") == "base64":
+                        embedding = base64.b64encode(vector.tobytes()).decode()
+                    else:
+                        embedding = vector.tolist()
+                    data.append({"object": "embedding", "index": index, "embedding": embedding})
+                return {"object": "list", "data": data, "model": body.get("model"), "usage": {"prompt_tokens": 0, "total_tokens": 0}}
+
+            def stream_completion(self, body):
+                model = body.get("model")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Cache-Control", "no-cache")
+                # The stream has no length, so it ends by closing the connection
+                self.send_header("Connection", "close")
+                self.close_connection = True
+                self.end_headers()
+                time.sleep(server.first_token_delay)
+                interval = 1 / server.tokens_per_second
+                for index, (name, arguments) in enumerate(server.tool_calls(body.get("messages", []))):
+                    self.send_event(server.chunk(model, {"role": "assistant", "tool_calls": [
+                        {"index": index, "id": f"call_{index}", "type": "function", "function": {"name": name, "arguments": ""}}]}))
+                    for start in range(0, len(arguments), server.chars_per_token):
+                        time.sleep(interval)
+                        self.send_event(server.chunk(model, {"tool_calls": [
+                            {"index": index, "function": {"arguments": arguments[start:start + server.chars_per_token]}}]}))
+                self.send_event(server.chunk(model, {}, finish_reason="tool_calls"))
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+
+            def send_event(self, payload):
+                self.wfile.write(f"data: {json.dumps(payload)}\n\n".encode())
+                self.wfile.flush()
+
+            def send_json(self, payload, status=200):
+                encoded = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(encoded)))
+                self.end_headers()
+                self.wfile.write(encoded)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
@@ -0,0 +1,31 @@
+import os
+import sys
+import threading
+from multiprocessing import Event
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import pinecone
+from fake_pinecone import Fake_Index
+
+# Runs the real Jarvis topology with the Pinecone client swapped for the in-memory fake. The patch is applied
+# at import time so it also holds in spawned children, which re-import this module as __mp_main__
+pinecone.init = lambda **kwargs: None
+pinecone.Index = Fake_Index
+
+import Jarvis
+
+
+def main():
+    # The benchmark harness stops the run by writing a line to (or closing) stdin
+    stop_event = Event()
+
+    def wait_for_stop():
+        sys.stdin.readline()
+        stop_event.set()
+
+    threading.Thread(target=wait_for_stop, daemon=True).start()
+    Jarvis.main(stop_event)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+import argparse
+import os
+import resource
+import statistics
+import sys
+import time
+from multiprocessing import Event, Process, Queue
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from Process_Scheduler import Pause_Event, drain_queue, wait_for_queues
+
+
+# The two loop shapes below mirror database_interaction_process and speech_recognition_process
+# before and after the switch to blocking waits, with the Pinecone and microphone calls stubbed out
+
+def polling_database_loop(db_upsert_queue, db_query_queue, db_response_queue, stop_event):
+    while not stop_event.is_set():
+        while not db_upsert_queue.empty():
+            db_upsert_queue.get()
+        while not db_query_queue.empty():
+            sent = db_query_queue.get()
+            db_response_queue.put((sent, time.monotonic()))
+
+
+def event_driven_database_loop(db_upsert_queue, db_query_queue, db_response_queue, stop_event):
+    while not stop_event.is_set():
+        wait_for_queues([db_query_queue, db_upsert_queue], 0.5)
+        for sent in drain_queue(db_query_queue):
+            db_response_queue.put((sent, time.monotonic()))
+        drain_queue(db_upsert_queue)
+
+
+def polling_listening_loop(pause_listening_event, stop_event):
+    while not stop_event.is_set():
+        if pause_listening_event.is_set():
+            continue
+
+
+def event_driven_listening_loop(pause_listening_event, stop_event):
+    while not stop_event.is_set():
+        pause_listening_event.wait_until_clear(timeout=0.5)
+        # record_audio() would block on the microphone here; keep the loop parked like it would be
+        stop_event.wait(0.5)
+
+
+def child_cpu_seconds():
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def measure(database_loop, listening_loop, idle_seconds, queries):
+    stop_event = Event()
+    pause_listening_event = Pause_Event()
+    pause_listening_event.set()
+    db_upsert_queue, db_query_queue, db_response_queue = Queue(), Queue(), Queue()
+
+    cpu_before = child_cpu_seconds()
+    processes = [
+        Process(target=database_loop, args=(db_upsert_queue, db_query_queue, db_response_queue, stop_event)),
+        Process(target=listening_loop, args=(pause_listening_event, stop_event)),
+    ]
+    for process in processes:
+        process.start()
+
+    # Idle phase: Jarvis is speaking, so listening is paused and no database work arrives
+    time.sleep(idle_seconds)
+
+    latencies = []
+    for _ in range(queries):
+        db_query_queue.put(time.monotonic())
+        sent, received = db_response_queue.get()
+        latencies.append((received - sent) * 1000)
+        time.sleep(0.01)
+
+    stop_event.set()
+    pause_listening_event.clear()
+    for process in processes:
+        process.join()
+
+    elapsed = idle_seconds + queries * 0.01
+    cpu_percent = 100 * (child_cpu_seconds() - cpu_before) / elapsed
+    latencies.sort()
+    return cpu_percent, statistics.median(latencies), latencies[int(0.99 * (len(latencies) - 1))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare idle CPU and query dispatch latency of polling vs blocking process loops.")
+    parser.add_argument("--idle-seconds", type=float, default=5)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    for name, database_loop, listening_loop in (("polling", polling_database_loop, polling_listening_loop),
+                                                ("event-driven", event_driven_database_loop, event_driven_listening_loop)):
+        cpu_percent, p50, p99 = measure(database_loop, listening_loop, args.idle_seconds, args.queries)
+        print(f"{name:>12}: idle CPU {cpu_percent:6.1f}% of one core  "
+              f"query dispatch p50 {p50:.3f}ms  p99 {p99:.3f}ms")
+
+
+if __name__ == "__main__":
+    main()
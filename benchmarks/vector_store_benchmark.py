@@ -0,0 +1,65 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from Local_Vector_Store import Local_Vector_Store
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the local vector store against a synthetic memory corpus.")
+    parser.add_argument("--size", type=int, default=1000000)
+    parser.add_argument("--dimension", type=int, default=1536)
+    parser.add_argument("--dtype", default="float32", choices=["float32", "float16", "int8"])
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=10000)
+    parser.add_argument("--n-probe", type=int, default=8)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as path:
+        # Keep the IVF build out of the load loop so it is timed separately
+        store = Local_Vector_Store(path=path, dtype=args.dtype, ivf_threshold=args.size + 1, n_probe=args.n_probe)
+
+        start = time.perf_counter()
+        for offset in range(0, args.size, args.batch_size):
+            count = min(args.batch_size, args.size - offset)
+            values = rng.standard_normal((count, args.dimension), dtype=np.float32)
+            store.upsert([{"id": str(offset + i), "values": values[i], "metadata": {"text": f"memory {offset + i}"}}
+                          for i in range(count)])
+        print(f"Loaded {args.size} vectors in {time.perf_counter() - start:.1f}s")
+
+        # Queries are perturbed copies of stored vectors so recall is meaningful on random data
+        targets = rng.choice(args.size, size=args.queries, replace=False)
+        queries = np.asarray(store.matrix[targets], dtype=np.float32)
+        queries += 0.05 * rng.standard_normal(queries.shape, dtype=np.float32)
+
+        exact_results, exact_times = [], []
+        for query in queries:
+            start = time.perf_counter()
+            exact_results.append([match.id for match in store.query(query, top_k=args.top_k, exact=True)["matches"]])
+            exact_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        store.train_ivf()
+        print(f"Built IVF index in {time.perf_counter() - start:.1f}s")
+
+        recall, ivf_times = 0, []
+        for query, expected in zip(queries, exact_results):
+            start = time.perf_counter()
+            found = [match.id for match in store.query(query, top_k=args.top_k)["matches"]]
+            ivf_times.append(time.perf_counter() - start)
+            recall += len(set(found) & set(expected)) / len(expected)
+
+        for name, times in (("exact", exact_times), ("ivf", ivf_times)):
+            times_ms = np.array(times) * 1000
+            print(f"{name:>5}: p50 {np.percentile(times_ms, 50):.2f}ms  p95 {np.percentile(times_ms, 95):.2f}ms  p99 {np.percentile(times_ms, 99):.2f}ms")
+        print(f"IVF recall@{args.top_k}: {recall / len(queries):.3f}")
+
+
+if __name__ == "__main__":
+    main()
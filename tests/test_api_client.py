@@ -0,0 +1,62 @@
+import threading
+import time
+import pytest
+
+pytest.importorskip("httpx")
+pytest.importorskip("openai")
+from API_Client import API_Client, Deadline_Exceeded
+
+
+@pytest.fixture
+def client():
+    return API_Client(max_workers=4)
+
+
+def test_retryable_errors_are_retried(client):
+    attempts = []
+
+    def request(timeout):
+        attempts.append(timeout)
+        if len(attempts) < 3:
+            raise ConnectionError("dropped")
+        return "ok"
+
+    assert client.call(request, deadline=5, retries=2, backoff=0.01) == "ok"
+    assert len(attempts) == 3
+    assert client.stats()["retries"] == 2
+
+
+def test_other_errors_are_raised_at_once(client):
+    attempts = []
+
+    def request(timeout):
+        attempts.append(timeout)
+        raise ValueError("bad request")
+
+    with pytest.raises(ValueError):
+        client.call(request, deadline=5, retries=3, backoff=0.01)
+    assert len(attempts) == 1
+
+
+def test_the_deadline_bounds_a_stalled_request(client):
+    release = threading.Event()
+    started = time.monotonic()
+    with pytest.raises(Deadline_Exceeded):
+        client.call(lambda timeout: release.wait(5), deadline=0.2, retries=0)
+    assert time.monotonic() - started < 1.0
+    release.set()
+
+
+def test_a_hedged_duplicate_wins_over_a_slow_first_attempt(client):
+    calls = []
+    lock = threading.Lock()
+
+    def request(timeout):
+        with lock:
+            calls.append(timeout)
+            first = len(calls) == 1
+        time.sleep(1.0 if first else 0.01)
+        return "slow" if first else "fast"
+
+    assert client.call(request, deadline=3, hedge_after=0.05) == "fast"
+    assert client.stats()["hedges_won"] == 1
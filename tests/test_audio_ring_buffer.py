@@ -0,0 +1,74 @@
+import pickle
+import numpy as np
+import pytest
+from Audio_Ring_Buffer import Audio_Ring_Buffer
+
+
+@pytest.fixture
+def ring():
+    # 1 s of 10 Hz audio, so capacity is 10 samples
+    ring = Audio_Ring_Buffer(capacity_seconds=1, sample_rate=10)
+    yield ring
+    ring.close()
+
+
+def samples(start, length):
+    return np.arange(start, start + length, dtype=np.float32)
+
+
+def test_contiguous_read_is_a_view(ring):
+    offset, length = ring.write(samples(0, 4))
+    view = ring.read(offset, length)
+    assert np.array_equal(view, samples(0, 4))
+    assert np.shares_memory(view, ring.samples)
+
+
+def test_wrapping_write_reads_back_in_order(ring):
+    ring.write(samples(0, 7))
+    offset, length = ring.write(samples(100, 6))
+    assert (offset, length) == (7, 6)
+    signal = ring.read(offset, length)
+    assert np.array_equal(signal, samples(100, 6))
+    assert not np.shares_memory(signal, ring.samples)
+
+
+def test_lapped_span_is_not_live(ring):
+    offset, length = ring.write(samples(0, 4))
+    ring.write(samples(10, 6))
+    assert ring.is_live(offset, length)
+    ring.write(samples(20, 1))
+    assert not ring.is_live(offset, length)
+    assert ring.read(offset, length) is None
+
+
+def test_view_overwritten_after_read_fails_the_recheck(ring):
+    offset, length = ring.write(samples(0, 5))
+    view = ring.read(offset, length)
+    # The writer laps the ring while a slow reader still holds the view
+    ring.write(samples(50, 10))
+    assert not np.array_equal(view, samples(0, 5))
+    assert not ring.is_live(offset, length)
+
+
+def test_spans_not_yet_written_are_not_live(ring):
+    offset, length = ring.write(samples(0, 3))
+    assert not ring.is_live(offset, length + 1)
+    assert ring.read(offset + length, 1) is None
+
+
+def test_oversized_write_keeps_the_start(ring):
+    offset, length = ring.write(samples(0, 25))
+    assert (offset, length) == (0, 10)
+    assert np.array_equal(ring.read(offset, length), samples(0, 10))
+
+
+def test_readers_attach_by_name(ring):
+    offset, length = ring.write(samples(0, 4))
+    reader = pickle.loads(pickle.dumps(ring))
+    try:
+        assert reader.capacity == ring.capacity
+        assert np.array_equal(reader.read(offset, length), samples(0, 4))
+        ring.write(samples(10, 10))
+        assert reader.read(offset, length) is None
+    finally:
+        reader.close()
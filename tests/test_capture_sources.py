@@ -0,0 +1,40 @@
+import pytest
+from Capture_Sources import parse_capture_sources
+
+
+def test_a_lone_unnamed_source_keeps_the_default_conversation():
+    assert parse_capture_sources("mic") == [{"name": None, "type": "mic", "argument": None}]
+
+
+def test_named_sources_and_arguments_are_parsed():
+    assert parse_capture_sources(" kitchen=mic:1 , office=socket:5005,test=wav:recordings/ ") == [
+        {"name": "kitchen", "type": "mic", "argument": "1"},
+        {"name": "office", "type": "socket", "argument": "5005"},
+        {"name": "test", "type": "wav", "argument": "recordings/"},
+    ]
+
+
+def test_unnamed_sources_get_distinct_names_when_there_are_several():
+    sources = parse_capture_sources("mic,mic:2,wav:tests/clip.wav")
+    assert [source["name"] for source in sources] == ["mic_default", "mic_2", "wav_tests_clip_wav"]
+
+
+def test_duplicate_names_are_rejected():
+    with pytest.raises(ValueError, match="duplicates: room"):
+        parse_capture_sources("room=mic:1,room=mic:2")
+    with pytest.raises(ValueError, match="duplicates: mic_default"):
+        parse_capture_sources("mic,mic_default=mic:3")
+
+
+@pytest.mark.parametrize("spec, message", [
+    ("speaker", "Unknown capture source type"),
+    ("socket", "socket needs a port"),
+    ("remote=socket:", "socket needs a port"),
+    ("socket:http", "socket needs a port"),
+    ("socket:70000", "socket needs a port"),
+    ("wav", "wav needs a file or directory"),
+    ("mic:front", "numeric device index"),
+])
+def test_invalid_arguments_fail_at_parse_time(spec, message):
+    with pytest.raises(ValueError, match=message):
+        parse_capture_sources(spec)
@@ -0,0 +1,64 @@
+import json
+import os
+from Conversation_Log import Conversation_Log
+
+
+def message(i):
+    return {"role": "user", "content": f"message {i}"}
+
+
+def test_appended_messages_load_back_in_order(tmp_path):
+    log = Conversation_Log(str(tmp_path), "alec", durable=False)
+    for i in range(3):
+        log.append(message(i), tokens=10)
+    log.close()
+    loaded, left_out = Conversation_Log(str(tmp_path), "alec").load()
+    assert [entry[0] for entry in loaded] == [message(i) for i in range(3)]
+    assert left_out == []
+
+
+def test_token_budget_keeps_the_newest_messages(tmp_path):
+    log = Conversation_Log(str(tmp_path), "alec", durable=False)
+    for i in range(5):
+        log.append(message(i), tokens=10)
+    log.close()
+    loaded, left_out = Conversation_Log(str(tmp_path), "alec").load(token_budget=25)
+    assert [entry[0] for entry in loaded] == [message(3), message(4)]
+    assert left_out == [message(0), message(1), message(2)]
+
+
+def test_snapshot_replaces_the_log(tmp_path):
+    log = Conversation_Log(str(tmp_path), "alec", snapshot_every=3, durable=False)
+    due = [log.append(message(i), tokens=1) for i in range(3)]
+    assert due == [False, False, True]
+    log.snapshot([message(1), message(2)], [1, 1])
+    log.append(message(3), tokens=1)
+    log.close()
+
+    assert os.path.getsize(log.log_path) == len(json.dumps({"sequence": 4, "tokens": 1, "message": message(3)})) + 1
+    loaded, _ = Conversation_Log(str(tmp_path), "alec").load()
+    assert [entry[0] for entry in loaded] == [message(1), message(2), message(3)]
+
+
+def test_a_torn_final_line_is_cut_off(tmp_path):
+    log = Conversation_Log(str(tmp_path), "alec", durable=False)
+    log.append(message(0))
+    log.close()
+    with open(log.log_path, 'a') as file:
+        file.write('{"sequence": 2, "mess')
+
+    reopened = Conversation_Log(str(tmp_path), "alec", durable=False)
+    loaded, _ = reopened.load()
+    assert [entry[0] for entry in loaded] == [message(0)]
+    reopened.append(message(1))
+    reopened.close()
+    loaded, _ = Conversation_Log(str(tmp_path), "alec").load()
+    assert [entry[0] for entry in loaded] == [message(0), message(1)]
+
+
+def test_archived_messages_are_kept(tmp_path):
+    log = Conversation_Log(str(tmp_path), "alec", durable=False)
+    log.archive([message(0), message(1)])
+    log.archive([message(2)])
+    with open(log.archive_path, 'r') as file:
+        assert [json.loads(line) for line in file] == [message(0), message(1), message(2)]
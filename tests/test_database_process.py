@@ -0,0 +1,118 @@
+from multiprocessing import Queue
+import sys
+import threading
+import time
+import types
+import pytest
+from Jarvis import database_interaction_process
+
+
+class Fake_Pinecone_Interface:
+    # Records every upsert batch; texts listed in failures fail that many times before they go through
+    failures = {}
+    batches = []
+
+
+    def upsert_batch_to_index(self, texts):
+        self.batches.append(list(texts))
+        failed = []
+        for text in dict.fromkeys(texts):
+            if self.failures.get(text, 0):
+                self.failures[text] -= 1
+                failed.append(text)
+        return failed
+
+
+    def query_index(self, query_text):
+        return [f"memory about {query_text}"]
+
+
+@pytest.fixture
+def database(monkeypatch):
+    monkeypatch.setitem(sys.modules, "Pinecone_Interface", types.SimpleNamespace(Pinecone_Interface=Fake_Pinecone_Interface))
+    Fake_Pinecone_Interface.failures = {}
+    Fake_Pinecone_Interface.batches = []
+    upsert_queue, query_queue, response_queue = Queue(), Queue(), Queue()
+    stop_event = threading.Event()
+    threads = []
+
+    def start(**settings):
+        settings = {"upsert_batch_window": 0.1, "idle_timeout": 0.05, "upsert_retry_delay": 0.1, **settings}
+        thread = threading.Thread(target=database_interaction_process,
+                                  args=(upsert_queue, query_queue, [response_queue], stop_event), kwargs=settings)
+        thread.start()
+        threads.append(thread)
+
+    yield types.SimpleNamespace(start=start, upsert_queue=upsert_queue, query_queue=query_queue,
+                                response_queue=response_queue, stop_event=stop_event,
+                                batches=Fake_Pinecone_Interface.batches)
+    stop_event.set()
+    for thread in threads:
+        thread.join(5)
+    for queue in (upsert_queue, query_queue, response_queue):
+        queue.close()
+
+
+def wait_until(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_upserts_from_one_turn_are_coalesced(database):
+    database.start()
+    for text in ("first", "second", "first"):
+        database.upsert_queue.put(text)
+    assert wait_until(lambda: database.batches)
+    time.sleep(0.2)
+    assert database.batches == [["first", "second", "first"]]
+
+
+def test_a_full_batch_is_written_without_waiting_for_the_window(database):
+    database.start(upsert_batch_size=2, upsert_batch_window=10)
+    for text in ("a", "b", "c"):
+        database.upsert_queue.put(text)
+    assert wait_until(lambda: len(database.batches) == 1)
+    assert database.batches[0] == ["a", "b"]
+
+
+def test_failed_texts_are_retried_not_dropped(database):
+    Fake_Pinecone_Interface.failures = {"flaky": 1}
+    database.start()
+    database.upsert_queue.put("fine")
+    database.upsert_queue.put("flaky")
+    assert wait_until(lambda: len(database.batches) == 2)
+    assert database.batches == [["fine", "flaky"], ["flaky"]]
+
+
+def test_texts_are_dropped_and_logged_after_the_last_attempt(database, capsys):
+    Fake_Pinecone_Interface.failures = {"broken": 10}
+    database.start(max_upsert_attempts=2)
+    database.upsert_queue.put("broken")
+    assert wait_until(lambda: len(database.batches) == 2)
+    time.sleep(0.3)
+    assert database.batches == [["broken"], ["broken"]]
+    assert "Dropped from upsert after 2 attempts: broken" in capsys.readouterr().out
+
+
+def test_pending_upserts_are_flushed_on_shutdown(database):
+    database.start(upsert_batch_window=10)
+    database.upsert_queue.put("last words")
+    time.sleep(0.2)
+    assert database.batches == []
+    database.stop_event.set()
+    assert wait_until(lambda: database.batches)
+    assert database.batches == [["last words"]]
+
+
+def test_queries_are_answered_and_cancelled_ones_skipped(database):
+    # Queued before the process starts, so the query and its cancellation are drained together
+    database.query_queue.put((0, 1, "stale"))
+    database.query_queue.put((0, 1, None))
+    database.query_queue.put((0, 2, "plans"))
+    time.sleep(0.1)
+    database.start()
+    assert database.response_queue.get(timeout=2) == (2, ["memory about plans"])
+    time.sleep(0.1)
+    assert database.response_queue.empty()
@@ -0,0 +1,33 @@
+import time
+from Embedding_Cache import Embedding_Cache
+
+
+def test_vectors_survive_a_restart(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = Embedding_Cache(file_path=path)
+    assert cache.get("model", "hello") is None
+    cache.put("model", "hello", [0.5, -1.0])
+    cache.close()
+
+    reopened = Embedding_Cache(file_path=path)
+    assert reopened.get("model", "hello") == [0.5, -1.0]
+    assert reopened.get("other-model", "hello") is None
+    assert reopened.stats()["disk_hits"] == 1
+    reopened.close()
+
+
+def test_memory_hits_protect_entries_from_disk_eviction(tmp_path):
+    cache = Embedding_Cache(file_path=str(tmp_path / "cache.sqlite"), memory_entries=16, max_entries=3, touch_batch=100)
+    for text in ("a", "b", "c"):
+        cache.put("model", text, [1.0])
+        time.sleep(0.01)
+    # "a" is the oldest write but the most recently used, and only the memory tier has seen that use
+    assert cache.get("model", "a") == [1.0]
+    time.sleep(0.01)
+    cache.put("model", "d", [1.0])
+
+    hashes = {row[0] for row in cache.connection.execute("SELECT text_hash FROM embeddings")}
+    assert cache.hash_text("a") in hashes
+    assert cache.hash_text("b") not in hashes
+    assert cache.stats()["evictions"] == 1
+    cache.close()
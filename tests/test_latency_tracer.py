@@ -0,0 +1,82 @@
+import csv
+import io
+import json
+from multiprocessing import Queue
+import time
+from Latency_Tracer import Latency_Collector, record_stage
+
+
+def feed_turn(collector, trace_id, start, stt_ms, total_ms):
+    # A full turn addressed to Jarvis; stamps are in seconds, the summary in milliseconds
+    stamps = {"capture_end": 0, "preprocessed": 5, "transcribed": 5 + stt_ms, "speaker_identified": 25,
+              "emotion_classified": 26, "retrieval_sent": 30, "retrieved": 60, "llm_request_sent": 70,
+              "first_token": 300, "first_sentence_queued": 400, "first_audio_out": total_ms}
+    for stage, offset_ms in stamps.items():
+        collector.accept(trace_id, stage, start + offset_ms / 1000)
+
+
+def test_per_stage_percentiles_and_total():
+    collector = Latency_Collector()
+    for i, stt_ms in enumerate([10, 20, 30, 40, 50]):
+        feed_turn(collector, (0, i + 1), 1000.0 + i, stt_ms, 500 + 100 * i)
+    stages = collector.summary()["stages"]
+    assert stages["transcribed"] == {"count": 5, "p50_ms": 30.0, "p95_ms": 48.0, "p99_ms": 49.6}
+    assert stages["retrieved"] == {"count": 5, "p50_ms": 30.0, "p95_ms": 30.0, "p99_ms": 30.0}
+    assert stages["first_audio_out"]["p50_ms"] == 300.0
+    assert stages["total"] == {"count": 5, "p50_ms": 700.0, "p95_ms": 880.0, "p99_ms": 896.0}
+    assert not collector.traces
+
+
+def test_stamps_from_interleaved_turns_are_joined_by_trace_id():
+    collector = Latency_Collector()
+    collector.accept((0, 1), "capture_end", 10.0)
+    collector.accept((1, 1), "capture_end", 10.5)
+    collector.accept((1, 1), "preprocessed", 10.52)
+    collector.accept((0, 1), "preprocessed", 10.01)
+    # Only the first sentence reaching the speaker counts; a later one has no capture_end to measure from
+    collector.accept((0, 1), "first_audio_out", 11.0)
+    collector.accept((0, 1), "first_audio_out", 12.0)
+    recent = collector.summary()["recent_turns"]
+    assert recent == [{"source": 0, "utterance": 1, "preprocessed": 10.0, "total": 1000.0}]
+    assert list(collector.traces) == [(1, 1)]
+
+
+def test_turns_that_never_reach_the_llm_are_folded_in_once_quiet():
+    collector = Latency_Collector(ttl=0.05)
+    collector.accept((0, 1), "capture_end", 1.0)
+    collector.accept((0, 1), "preprocessed", 1.02)
+    collector.accept((0, 2), "transcribed", 2.0)
+    time.sleep(0.1)
+    collector.expire()
+    stages = collector.summary()["stages"]
+    assert stages["preprocessed"]["count"] == 1
+    assert "total" not in stages
+    # A trace without capture_end has nothing to measure from and is dropped
+    assert len(collector.summary()["recent_turns"]) == 1
+    assert not collector.traces
+
+
+def test_dump_writes_json_and_csv(tmp_path):
+    collector = Latency_Collector()
+    for i in range(3):
+        feed_turn(collector, (0, i), 100.0 + i, 20, 600)
+    prefix = str(tmp_path / "latency")
+    collector.dump(prefix)
+    with open(prefix + ".json") as file:
+        report = json.load(file)
+    assert report["stages"]["total"]["p99_ms"] == 600.0
+    assert len(report["recent_turns"]) == 3
+    with open(prefix + ".csv", newline='') as file:
+        rows = list(csv.DictReader(file))
+    assert [row["stage"] for row in rows] == list(report["stages"])
+    assert rows[-1] == {"stage": "total", "count": "3", "p50_ms": "600.0", "p95_ms": "600.0", "p99_ms": "600.0"}
+    assert list(csv.reader(io.StringIO(collector.to_csv())))[0] == ["stage", "count", "p50_ms", "p95_ms", "p99_ms"]
+
+
+def test_record_stage_is_a_no_op_without_a_queue_or_trace_id():
+    record_stage(None, (0, 1), "capture_end")
+    queue = Queue()
+    record_stage(queue, None, "capture_end")
+    record_stage(queue, (0, 1), "capture_end", 5.0)
+    assert queue.get(timeout=1) == ((0, 1), "capture_end", 5.0)
+    queue.close()
@@ -0,0 +1,97 @@
+import numpy as np
+import pytest
+from Local_Vector_Store import Local_Vector_Store, Store_In_Use
+
+
+def records(vectors, prefix="v"):
+    return [{"id": f"{prefix}{i}", "values": vector.tolist(), "metadata": {"text": f"{prefix}{i}"}}
+            for i, vector in enumerate(vectors)]
+
+
+@pytest.fixture
+def vectors():
+    return np.random.default_rng(0).normal(size=(300, 16)).astype(np.float32)
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = Local_Vector_Store(path=str(tmp_path / "store"), initial_capacity=64)
+    yield store
+    store.close()
+
+
+def test_query_returns_nearest_first_with_metadata(store, vectors):
+    store.upsert(records(vectors))
+    matches = store.query(vectors[42], top_k=3)["matches"]
+    assert [match.id for match in matches][0] == "v42"
+    assert matches[0].metadata["text"] == "v42"
+    assert matches[0].score == pytest.approx(1.0, abs=1e-5)
+    assert matches[0].score >= matches[1].score >= matches[2].score
+
+
+def test_upsert_of_existing_id_replaces_it(store, vectors):
+    store.upsert(records(vectors[:10]))
+    store.upsert([{"id": "v3", "values": vectors[20].tolist(), "metadata": {"text": "updated"}}])
+    assert store.describe_index_stats()["total_vector_count"] == 10
+    match = store.query(vectors[20], top_k=1)["matches"][0]
+    assert (match.id, match.metadata["text"]) == ("v3", "updated")
+
+
+def test_store_persists_across_reopen(tmp_path, vectors):
+    path = str(tmp_path / "store")
+    store = Local_Vector_Store(path=path, dtype="int8")
+    store.upsert(records(vectors))
+    store.close()
+
+    reopened = Local_Vector_Store(path=path)
+    try:
+        assert reopened.dtype == "int8"
+        assert reopened.count == len(vectors)
+        assert reopened.query(vectors[7], top_k=1)["matches"][0].id == "v7"
+    finally:
+        reopened.close()
+
+
+def test_delete_keeps_remaining_rows_consistent(tmp_path, vectors):
+    path = str(tmp_path / "store")
+    store = Local_Vector_Store(path=path, initial_capacity=64)
+    store.upsert(records(vectors))
+    deleted = {f"v{i}" for i in range(0, 300, 3)}
+    store.delete(list(deleted))
+    store.close()
+
+    reopened = Local_Vector_Store(path=path)
+    try:
+        assert reopened.count == 200
+        assert not deleted & set(reopened.ids)
+        for i in range(1, 300, 7):
+            if f"v{i}" not in deleted:
+                assert reopened.query(vectors[i], top_k=1)["matches"][0].id == f"v{i}"
+        assert reopened.capacity < 512
+    finally:
+        reopened.close()
+
+
+def test_ivf_training_keeps_results_findable(store, vectors):
+    store.n_probe = 4
+    store.upsert(records(vectors))
+    store.train_ivf()
+    assert store.centroids is not None
+    for i in range(0, 300, 11):
+        assert store.query(vectors[i], top_k=1)["matches"][0].id == f"v{i}"
+
+
+def test_upserts_past_the_threshold_train_in_the_background(tmp_path, vectors):
+    store = Local_Vector_Store(path=str(tmp_path / "store"), ivf_threshold=200)
+    try:
+        store.upsert(records(vectors))
+        store.training_thread.join()
+        assert store.trained_count == len(vectors)
+        assert store.query(vectors[5], top_k=1, exact=True)["matches"][0].id == "v5"
+    finally:
+        store.close()
+
+
+def test_a_store_can_only_be_opened_once(store):
+    with pytest.raises(Store_In_Use):
+        Local_Vector_Store(path=store.path)
@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+from Local_Vector_Store import Local_Vector_Store
+from Memory_Compaction import Memory_Compactor
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = Local_Vector_Store(path=str(tmp_path / "store"))
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(200, 32))
+    records = [{"id": f"m{i}", "values": vector.tolist(), "metadata": {"text": f"memory number {i}"}}
+               for i, vector in enumerate(vectors)]
+    # Every fifth memory has a near-duplicate with a shorter text
+    records += [{"id": f"d{i}", "values": (vectors[i] + rng.normal(size=32) * 0.02).tolist(), "metadata": {"text": "dup"}}
+                for i in range(0, 200, 5)]
+    store.upsert(records)
+    yield store
+    store.close()
+
+
+def test_near_duplicates_are_merged_into_the_longest_text(store):
+    report = Memory_Compactor(store, threshold=0.95).compact()
+    assert report["memories_before"] == 240
+    assert report["removed"] == 40
+    assert report["memories_after"] == store.count == 200
+    assert not any(vector_id.startswith("d") for vector_id in store.ids)
+
+
+def test_dry_run_changes_nothing(store):
+    report = Memory_Compactor(store, threshold=0.95).compact(dry_run=True)
+    assert report["removed"] == 40
+    assert store.count == 240
+
+
+def test_clustering_still_finds_duplicates_in_larger_stores(store):
+    report = Memory_Compactor(store, threshold=0.95, cluster_size=32).compact()
+    # Duplicates split across clusters can be missed, but most are found
+    assert report["removed"] >= 30
+    assert all(vector_id in store.id_to_row for vector_id in (f"m{i}" for i in range(200)))
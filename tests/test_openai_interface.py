@@ -0,0 +1,192 @@
+import threading
+import pytest
+pytest.importorskip("dotenv")
+pytest.importorskip("httpx")
+pytest.importorskip("openai")
+pytest.importorskip("tiktoken")
+from Conversation_Log import Conversation_Log
+from OpenAI_Interface import OpenAI_Interface
+
+
+class Word_Encoding:
+    # One token per word, which is all the context bookkeeping needs
+
+
+    def encode(self, text):
+        return text.split()
+
+
+    def decode(self, tokens):
+        return " ".join(tokens)
+
+
+class Upsert_Queue(list):
+
+
+    def put(self, item):
+        self.append(item)
+
+
+def make_interface(tmp_path, **settings):
+    # Skips __init__, which needs the API and the assistant instructions, and sets up only the context state
+    interface = OpenAI_Interface.__new__(OpenAI_Interface)
+    interface.encoding = Word_Encoding()
+    interface.conversation = "alec"
+    interface.default_messages = [{"role": "system", "content": "be helpful"}]
+    interface.max_tokens = 100
+    interface.tools_tokens = 0
+    interface.memory_chunk_tokens = 1000
+    interface.db_upsert_queue = Upsert_Queue()
+    interface.conversation_log = Conversation_Log(str(tmp_path), "alec", durable=False)
+    interface.messages = list(interface.default_messages)
+    interface.message_tokens = [2]
+    interface.tokens_in_context = 2
+    interface.keep_recent_messages = 3
+    interface.compaction_chunk_tokens = 25
+    interface.spr_tokens = 5
+    interface.summary_input_tokens = 1000
+    interface.summary_lock = threading.Lock()
+    interface.summary_thread = None
+    interface.pending_summary = None
+    interface.context_generation = 0
+    for name, value in settings.items():
+        setattr(interface, name, value)
+    return interface
+
+
+def fill_context(interface, count, tokens=10):
+    for i in range(count):
+        interface.append_message({"role": "user" if i % 2 == 0 else "assistant", "content": words(tokens, f"m{i}")})
+
+
+def first_words(interface):
+    return [message["content"].split()[0] for message in interface.messages[1:]]
+
+
+def assert_totals_match(interface):
+    assert len(interface.messages) == len(interface.message_tokens)
+    assert interface.message_tokens == [interface.count_tokens(message["content"]) for message in interface.messages]
+    assert interface.tokens_in_context == sum(interface.message_tokens)
+
+
+def words(count, word="word"):
+    return " ".join([word] * count)
+
+
+def test_history_left_out_at_startup_is_archived_and_upserted_once(tmp_path):
+    log = Conversation_Log(str(tmp_path), "alec", durable=False)
+    for i in range(10):
+        log.append({"role": "user", "content": words(10, f"m{i}")}, 10)
+    log.close()
+
+    # 75% of 100 tokens less the system message leaves room for the newest seven messages
+    interface = make_interface(tmp_path)
+    messages, tokens = interface.load_messages("missing.json", "alec")
+    assert [message["content"].split()[0] for message in messages[1:]] == [f"m{i}" for i in range(3, 10)]
+    assert tokens == [2] + [10] * 7
+    assert len(interface.db_upsert_queue) == 1
+    with open(interface.conversation_log.archive_path) as file:
+        assert len(file.readlines()) == 3
+    interface.conversation_log.close()
+
+    # A restart before the next periodic snapshot finds nothing left out
+    restarted = make_interface(tmp_path)
+    messages, _ = restarted.load_messages("missing.json", "alec")
+    assert len(messages) == 8
+    assert restarted.db_upsert_queue == []
+    with open(restarted.conversation_log.archive_path) as file:
+        assert len(file.readlines()) == 3
+    restarted.conversation_log.close()
+
+
+def test_oldest_chunk_frees_a_chunk_but_never_the_system_message_or_recent_turns(tmp_path):
+    interface = make_interface(tmp_path)
+    fill_context(interface, 8)
+    # At least compaction_chunk_tokens are freed, from index 1 onwards
+    assert interface.oldest_chunk(0) == 4
+    # However much is required, the last keep_recent_messages stay
+    assert interface.oldest_chunk(1000) == len(interface.messages) - interface.keep_recent_messages
+    # The summarizer's input budget caps the chunk before it would be exceeded
+    assert interface.oldest_chunk(0, max_chunk_tokens=25) == 3
+
+
+def test_eviction_at_the_hard_limit_keeps_system_and_recent_messages(tmp_path):
+    interface = make_interface(tmp_path)
+    fill_context(interface, 9)
+    assert interface.tokens_in_context == 92
+    interface.evict_oldest(20)
+    assert interface.messages[0] == interface.default_messages[0]
+    assert first_words(interface) == ["m3", "m4", "m5", "m6", "m7", "m8"]
+    assert interface.tokens_in_context + 20 < interface.max_tokens
+    assert_totals_match(interface)
+    # The evicted turns go to the vector database and the archive
+    assert interface.db_upsert_queue == ["\n".join(words(10, f"m{i}") for i in range(3))]
+    with open(interface.conversation_log.archive_path) as file:
+        assert len(file.readlines()) == 3
+
+
+def test_eviction_with_only_recent_messages_leaves_context_alone(tmp_path):
+    interface = make_interface(tmp_path)
+    fill_context(interface, 3, tokens=30)
+    interface.evict_oldest(50)
+    assert first_words(interface) == ["m0", "m1", "m2"]
+    assert interface.db_upsert_queue == []
+    assert_totals_match(interface)
+
+
+def summarize_with(interface, summarizer):
+    interface.summarize_messages = summarizer
+    interface.start_background_summary()
+    interface.summary_thread.join(5)
+
+
+def test_background_summary_replaces_the_prefix_it_was_written_for(tmp_path):
+    interface = make_interface(tmp_path)
+    fill_context(interface, 8)
+    summarized = []
+
+    def summarizer(messages):
+        summarized.append([message["content"].split()[0] for message in messages])
+        return "short summary"
+
+    summarize_with(interface, summarizer)
+    assert summarized == [["m0", "m1", "m2"]]
+    # A turn added while the summary ran doesn't shift what gets replaced
+    interface.append_message({"role": "user", "content": words(10, "new")})
+    interface.apply_pending_summary()
+    assert interface.messages[1] == {"role": "system", "content": "Summary of earlier conversation:\nshort summary"}
+    assert first_words(interface) == ["Summary", "m3", "m4", "m5", "m6", "m7", "new"]
+    assert interface.db_upsert_queue == ["short summary"]
+    assert interface.pending_summary is None
+    assert_totals_match(interface)
+
+
+def test_summary_of_a_stale_prefix_is_discarded(tmp_path):
+    interface = make_interface(tmp_path)
+    fill_context(interface, 8)
+    summarize_with(interface, lambda messages: "stale summary")
+    # The hard limit evicted the oldest turns before the summary could be applied
+    interface.evict_oldest(80)
+    before = (list(interface.messages), list(interface.message_tokens), interface.tokens_in_context)
+    interface.apply_pending_summary()
+    assert (interface.messages, interface.message_tokens, interface.tokens_in_context) == before
+    assert "stale summary" not in interface.db_upsert_queue
+    assert_totals_match(interface)
+
+
+def test_failed_summary_leaves_the_context_untouched(tmp_path):
+    interface = make_interface(tmp_path)
+    fill_context(interface, 8)
+    before = list(interface.messages)
+
+    def summarizer(messages):
+        raise TimeoutError("model unavailable")
+
+    summarize_with(interface, summarizer)
+    interface.apply_pending_summary()
+    assert interface.messages == before
+    assert_totals_match(interface)
+    # The next turn can start another attempt
+    summarize_with(interface, lambda messages: "second try")
+    interface.apply_pending_summary()
+    assert interface.messages[1]["content"].endswith("second try")
@@ -0,0 +1,53 @@
+import pytest
+pytest.importorskip("dotenv")
+pytest.importorskip("httpx")
+pytest.importorskip("openai")
+pytest.importorskip("pinecone")
+from Pinecone_Interface import Pinecone_Interface
+from Semantic_Query_Cache import Semantic_Query_Cache
+
+
+class Fake_Index:
+
+
+    def __init__(self, fail_calls=0):
+        self.fail_calls = fail_calls
+        self.upserts = []
+
+
+    def upsert(self, vectors):
+        if self.fail_calls:
+            self.fail_calls -= 1
+            raise ConnectionError("index unavailable")
+        self.upserts.append(vectors)
+
+
+def make_interface(index, unembeddable=()):
+    interface = Pinecone_Interface.__new__(Pinecone_Interface)
+    interface.index = index
+    interface.query_cache = Semantic_Query_Cache()
+    interface.embedded = []
+
+    def vectorize_texts(texts):
+        interface.embedded.append(list(texts))
+        return [None if text in unembeddable else [float(len(text)), 1.0] for text in texts]
+
+    interface.vectorize_texts = vectorize_texts
+    return interface
+
+
+def test_repeated_texts_in_a_batch_are_embedded_and_written_once():
+    index = Fake_Index()
+    interface = make_interface(index)
+    assert interface.upsert_batch_to_index(["alpha", "beta", "alpha"]) == []
+    assert interface.embedded == [["alpha", "beta"]]
+    assert [record['metadata']['text'] for record in index.upserts[0]] == ["alpha", "beta"]
+
+
+def test_failed_texts_are_returned_for_retry():
+    index = Fake_Index(fail_calls=1)
+    interface = make_interface(index, unembeddable={"gamma"})
+    texts = [f"text {i}" for i in range(3)] + ["gamma"]
+    # The first chunk's write fails, the second goes through
+    assert sorted(interface.upsert_batch_to_index(texts, chunk_size=2)) == ["gamma", "text 0", "text 1"]
+    assert [record['metadata']['text'] for record in index.upserts[0]] == ["text 2"]
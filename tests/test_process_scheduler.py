@@ -0,0 +1,78 @@
+from multiprocessing import Process, Queue
+import time
+import pytest
+from Process_Scheduler import Pause_Event, drain_fair, drain_queue, wait_for_queues
+
+
+def clear_after(event, delay):
+    time.sleep(delay)
+    event.clear()
+
+
+@pytest.fixture
+def queues():
+    queues = [Queue() for _ in range(3)]
+    yield queues
+    for queue in queues:
+        queue.close()
+
+
+def fill(queue, items):
+    for item in items:
+        queue.put(item)
+    # A multiprocessing queue's feeder thread flushes items into the pipe asynchronously
+    time.sleep(0.1)
+
+
+def test_wait_until_clear_wakes_when_another_process_clears():
+    event = Pause_Event()
+    event.set()
+    assert event.wait_until_clear(timeout=0.05) is False
+    process = Process(target=clear_after, args=(event, 0.2))
+    process.start()
+    try:
+        started = time.monotonic()
+        assert event.wait_until_clear(timeout=5) is True
+        assert time.monotonic() - started < 2
+        assert not event.is_set()
+    finally:
+        process.join()
+
+
+def test_pause_event_wait_returns_once_set():
+    event = Pause_Event()
+    assert event.wait(timeout=0.05) is False
+    assert event.wait_until_clear(timeout=0) is True
+    event.set()
+    assert event.wait(timeout=0) is True
+
+
+def test_drain_fair_takes_round_robin_from_the_start_index(queues):
+    fill(queues[0], ["a1", "a2", "a3"])
+    fill(queues[1], ["b1"])
+    fill(queues[2], ["c1", "c2"])
+    assert drain_fair(queues, limit=5, start=1) == [(1, "b1"), (2, "c1"), (0, "a1"), (2, "c2"), (0, "a2")]
+    assert drain_fair(queues, limit=5) == [(0, "a3")]
+    assert drain_fair(queues, limit=5) == []
+
+
+def test_drain_fair_respects_the_limit(queues):
+    for queue in queues:
+        fill(queue, [1, 2])
+    assert len(drain_fair(queues, limit=4)) == 4
+    assert len(drain_fair(queues, limit=0)) == 0
+    assert len(drain_queue(queues[2])) == 1
+
+
+def test_wait_for_queues_honours_its_timeout(queues):
+    started = time.monotonic()
+    assert wait_for_queues(queues, 0.2) == []
+    assert 0.15 < time.monotonic() - started < 1.0
+    assert wait_for_queues(queues, 0) == []
+
+
+def test_wait_for_queues_returns_the_ready_queues(queues):
+    fill(queues[1], ["item"])
+    started = time.monotonic()
+    assert wait_for_queues(queues, 5) == [queues[1]]
+    assert time.monotonic() - started < 1.0
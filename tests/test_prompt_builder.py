@@ -0,0 +1,115 @@
+from collections import Counter
+import pytest
+tiktoken = pytest.importorskip("tiktoken")
+from Prompt_Builder import Prompt_Builder
+
+# The same pre-tokenization pattern as cl100k_base; BPE merges never cross the chunks it splits text into
+CL100K_PATTERN = (r"""(?i:'s|'t|'re|'ve|'m|'ll|'d)|[^\r\n\p{L}\p{N}]?\p{L}+|\p{N}{1,3}| ?[^\s\p{L}\p{N}]+[\r\n]*|\s*[\r\n]+|\s+(?!\S)|\s+""")
+
+CORPUS = ("**Metadata**\nUser: Alec \nUser emotion: Happy \nTimestamp: 2024-01-01 12:00:00\n\n"
+          "**User's message**\nWhat did we talk about yesterday?\n\n**Vector database results**\n"
+          "1. Alec mentioned that the meeting with the design team moved to Thursday afternoon.\n\n") * 4
+
+
+def trained_encoding(merges=400):
+    # Small byte-level BPE learned on prompt-like text, for when cl100k_base can't be downloaded
+    regex = pytest.importorskip("regex")
+    words = Counter(tuple(bytes([b]) for b in piece.encode()) for piece in regex.findall(CL100K_PATTERN, CORPUS))
+    ranks = {bytes([i]): i for i in range(256)}
+    for _ in range(merges):
+        pairs = Counter()
+        for word, count in words.items():
+            for pair in zip(word, word[1:]):
+                pairs[pair] += count
+        if not pairs:
+            break
+        best = max(pairs, key=pairs.get)
+        ranks[best[0] + best[1]] = len(ranks)
+        merged = Counter()
+        for word, count in words.items():
+            parts, i = [], 0
+            while i < len(word):
+                if i + 1 < len(word) and (word[i], word[i + 1]) == best:
+                    parts.append(best[0] + best[1])
+                    i += 2
+                else:
+                    parts.append(word[i])
+                    i += 1
+            merged[tuple(parts)] += count
+        words = merged
+    return tiktoken.Encoding("test_bpe", pat_str=CL100K_PATTERN, mergeable_ranks=ranks, special_tokens={})
+
+
+@pytest.fixture(scope="module")
+def encoding():
+    try:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return trained_encoding()
+
+
+def memory_section(prompt):
+    return prompt.split("**Vector database results**\n", 1)[1].split("**Response guidelines**", 1)[0]
+
+
+def assert_exact(builder, prompt, tokens):
+    assert tokens == len(builder.encoding.encode(prompt))
+
+
+@pytest.mark.parametrize("results", [None, [], ["", "   "]])
+def test_prompt_without_results_counts_exactly(encoding, results):
+    builder = Prompt_Builder(encoding)
+    prompt, tokens = builder.build("Alec", "Neutral", "2024-01-01 12:00:00", "  hello jarvis \n", results)
+    assert_exact(builder, prompt, tokens)
+    assert "**Vector database results**" not in prompt
+    assert prompt.endswith("etc.")
+
+
+def test_prompt_with_results_counts_exactly(encoding):
+    builder = Prompt_Builder(encoding)
+    results = ["Alec likes green tea.", "Meeting moved to *Thursday* **", "Ends with punctuation!\n\n\n",
+               "Numbers 1234567 and émojis 🎉 too", "Trailing stars***"]
+    prompt, tokens = builder.build("Alec", "Happy", "2024-01-01 12:00:00", "What did I say? **bold**", results)
+    assert_exact(builder, prompt, tokens)
+    assert memory_section(prompt).startswith("1. Alec likes green tea.\n\n2. ")
+    assert prompt.count("\n\n**") == 3
+
+
+def test_long_memory_is_capped_per_result(encoding):
+    builder = Prompt_Builder(encoding)
+    # Longer than max_result_tokens * 32 characters, so it is cut by characters before it is tokenized
+    long_memory = "the quick brown fox jumps over the lazy dog " * 400
+    assert len(long_memory) > builder.max_result_tokens * 32
+    prompt, tokens = builder.build("Alec", "Neutral", "now", "tell me a story", [long_memory, "short one"])
+    assert_exact(builder, prompt, tokens)
+    items = memory_section(prompt).split("\n\n")
+    assert items[0].endswith("...")
+    assert len(encoding.encode(items[0] + "\n\n")) <= builder.max_result_tokens + 8
+    assert items[1] == "2. short one"
+
+
+def test_memories_stay_within_budget(encoding):
+    builder = Prompt_Builder(encoding)
+    results = [f"memory {i}: " + "details about the project plan and who owns which part " * 30 for i in range(20)]
+    prompt, tokens = builder.build("Alec", "Neutral", "now", "what's the plan?", results)
+    assert_exact(builder, prompt, tokens)
+    section = memory_section(prompt)
+    assert len(encoding.encode(section)) <= builder.retrieval_token_budget
+    packed = section.count("\n\n")
+    assert 1 < packed < len(results)
+    # The last memory that fits is cut to the room left, so little of the budget goes unused
+    assert builder.retrieval_token_budget - len(encoding.encode(section)) < builder.min_result_tokens
+
+
+def test_memories_are_cut_to_the_remaining_budget(encoding):
+    builder = Prompt_Builder(encoding, retrieval_token_budget=200, max_result_tokens=150)
+    results = ["first " * 140, "second " * 140, "a small fact"]
+    packed, used = builder.pack_results(results)
+    assert used <= builder.retrieval_token_budget
+    assert used == sum(len(encoding.encode(item)) for item in packed)
+    # The second memory is cut to what is left, after which too little remains for the third
+    assert len(packed) == 2
+    assert packed[1].startswith("2. second") and packed[1].endswith("...\n\n")
+    assert builder.retrieval_token_budget - used < builder.min_result_tokens
+    prompt, tokens = builder.build("Alec", "Neutral", "now", "hi", results)
+    assert_exact(builder, prompt, tokens)
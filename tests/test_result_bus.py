@@ -0,0 +1,108 @@
+from multiprocessing import Queue
+import time
+import pytest
+from Result_Bus import Result_Bus, publish_result, put_bounded
+
+
+@pytest.fixture
+def results_queue():
+    queue = Queue()
+    yield queue
+    queue.close()
+
+
+def test_results_are_joined_by_utterance(results_queue):
+    bus = Result_Bus(results_queue)
+    publish_result(results_queue, 1, "speaker", "Alec")
+    publish_result(results_queue, 1, "transcript", "hello jarvis")
+    assert bus.next_transcript(timeout=1) == (1, "hello jarvis")
+    assert bus.wait_for(1, "speaker", 1) == "Alec"
+    assert bus.wait_for(1, "emotion", 0.05, default="Neutral") == "Neutral"
+
+
+def test_results_for_finished_utterances_are_rejected(results_queue):
+    bus = Result_Bus(results_queue)
+    publish_result(results_queue, 2, "transcript", "two")
+    assert bus.next_transcript(timeout=1) == (2, "two")
+    bus.finish(2)
+    publish_result(results_queue, 1, "speaker", "late")
+    publish_result(results_queue, 2, "emotion", "late")
+    bus.collect(timeout=0.5)
+    time.sleep(0.05)
+    bus.collect()
+    assert bus.dropped == 2
+    assert not bus.pending
+
+
+def test_transcripts_are_handed_out_in_order(results_queue):
+    bus = Result_Bus(results_queue, reorder_window=1.0)
+    publish_result(results_queue, 1, "transcript", "one")
+    assert bus.next_transcript(timeout=1) == (1, "one")
+    # A second STT worker finished utterance 3 before utterance 2
+    publish_result(results_queue, 3, "transcript", "three")
+    publish_result(results_queue, 2, "transcript", "two")
+    assert bus.next_transcript(timeout=1) == (2, "two")
+    bus.finish(2)
+    assert bus.next_transcript(timeout=1) == (3, "three")
+
+
+def test_a_gap_that_never_fills_is_only_waited_out_once(results_queue):
+    bus = Result_Bus(results_queue, reorder_window=0.2)
+    publish_result(results_queue, 1, "transcript", "one")
+    assert bus.next_transcript(timeout=1) == (1, "one")
+    publish_result(results_queue, 3, "transcript", "three")
+    started = time.monotonic()
+    assert bus.next_transcript(timeout=2) == (3, "three")
+    assert 0.15 < time.monotonic() - started < 1.0
+
+
+def test_a_skipped_id_closes_its_gap_at_once(results_queue):
+    bus = Result_Bus(results_queue, reorder_window=5.0)
+    publish_result(results_queue, 1, "transcript", "one")
+    assert bus.next_transcript(timeout=1) == (1, "one")
+    publish_result(results_queue, 3, "transcript", "three")
+    publish_result(results_queue, 2, "skipped", "backlog")
+    started = time.monotonic()
+    assert bus.next_transcript(timeout=2) == (3, "three")
+    assert time.monotonic() - started < 1.0
+
+
+def test_a_skip_marker_after_a_transcript_does_not_repeat_it(results_queue):
+    bus = Result_Bus(results_queue)
+    publish_result(results_queue, 1, "transcript", "one")
+    publish_result(results_queue, 1, "skipped", "not transcribed")
+    assert bus.next_transcript(timeout=1) == (1, "one")
+    assert bus.next_transcript(timeout=0.3) == (None, None)
+
+
+def test_finish_purges_out_of_order_entries(results_queue):
+    bus = Result_Bus(results_queue)
+    for utterance_id in (5, 3, 4, 7):
+        publish_result(results_queue, utterance_id, "speaker", "Alec")
+    bus.collect(timeout=1)
+    time.sleep(0.05)
+    bus.collect()
+    bus.finish(5)
+    assert list(bus.pending) == [7]
+
+
+def test_put_bounded_reports_what_it_drops():
+    queue = Queue(maxsize=1)
+    dropped = []
+    put_bounded(queue, "first", on_drop=dropped.append)
+    time.sleep(0.05)
+    put_bounded(queue, "second", on_drop=dropped.append)
+    put_bounded(queue, "third", policy="drop_newest", on_drop=dropped.append)
+    assert dropped == ["first", "third"]
+    assert queue.get(timeout=1) == "second"
+    queue.close()
+
+
+def test_put_bounded_drops_the_oldest_item_when_full():
+    queue = Queue(maxsize=2)
+    for item in (1, 2):
+        put_bounded(queue, item)
+    time.sleep(0.05)
+    assert put_bounded(queue, 3) == 1
+    assert [queue.get(timeout=1), queue.get(timeout=1)] == [2, 3]
+    queue.close()
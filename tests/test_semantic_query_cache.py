@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+from Semantic_Query_Cache import Semantic_Query_Cache
+
+
+@pytest.fixture
+def query():
+    return np.random.default_rng(0).normal(size=32)
+
+
+def test_near_identical_queries_are_answered_from_the_cache(query):
+    cache = Semantic_Query_Cache(threshold=0.97)
+    cache.put(query, 5, ["memory"], [0.9, 0.8, 0.7, 0.6, 0.5])
+    nearby = query + np.random.default_rng(1).normal(size=32) * 0.01
+    assert cache.get(nearby, 5) == ["memory"]
+    assert cache.get(np.random.default_rng(2).normal(size=32), 5) is None
+    assert cache.get(query, 3) is None
+    assert cache.stats() == {"entries": 1, "hits": 1, "misses": 2}
+
+
+def test_entries_expire_after_the_ttl(query):
+    cache = Semantic_Query_Cache(ttl=0)
+    cache.put(query, 5, ["memory"], [0.9] * 5)
+    assert cache.get(query, 5) is None
+
+
+def test_upserts_only_invalidate_results_they_could_change(query):
+    cache = Semantic_Query_Cache()
+    cache.put(query, 5, ["memory"], [0.9, 0.8, 0.7, 0.6, 0.5])
+    unrelated = -query
+    cache.invalidate([unrelated])
+    assert cache.get(query, 5) == ["memory"]
+    cache.invalidate([query])
+    assert cache.get(query, 5) is None
+
+
+def test_short_result_lists_are_invalidated_by_any_upsert(query):
+    cache = Semantic_Query_Cache()
+    cache.put(query, 5, ["memory"], [0.9])
+    cache.invalidate([-query])
+    assert cache.get(query, 5) is None
+
+
+def test_capacity_keeps_the_newest_entries():
+    cache = Semantic_Query_Cache(max_entries=2)
+    queries = np.eye(3)
+    for i, query in enumerate(queries):
+        cache.put(query, 5, [i], [0.9] * 5)
+    assert cache.get(queries[0], 5) is None
+    assert cache.get(queries[2], 5) == [2]
@@ -0,0 +1,130 @@
+from multiprocessing import Queue
+from queue import Empty
+import threading
+import time
+import pytest
+from Speculative_Retrieval import Speculative_Retriever, normalize_query, query_similarity
+
+
+class Fake_Database:
+    # Stands in for the database process: answers each query after a delay and records every message,
+    # where a None query is a cancellation
+
+
+    def __init__(self, query_queue, response_queue, delay=0.05):
+        self.query_queue = query_queue
+        self.response_queue = response_queue
+        self.delay = delay
+        self.received = []
+        self.timers = []
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+
+    def run(self):
+        while self.running:
+            try:
+                _, request_id, query = self.query_queue.get(timeout=0.05)
+            except Empty:
+                continue
+            self.received.append((request_id, query))
+            if query is not None:
+                timer = threading.Timer(self.delay, self.response_queue.put, ((request_id, [f"memories for {query}"]),))
+                self.timers.append(timer)
+                timer.start()
+
+
+    def wait_for(self, count, timeout=1.0):
+        deadline = time.monotonic() + timeout
+        while len(self.received) < count and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return self.received
+
+
+    def stop(self):
+        self.running = False
+        self.thread.join()
+        for timer in self.timers:
+            timer.cancel()
+
+
+@pytest.fixture
+def database():
+    query_queue, response_queue = Queue(), Queue()
+    database = Fake_Database(query_queue, response_queue)
+    yield database
+    database.stop()
+    query_queue.close()
+    response_queue.close()
+
+
+@pytest.fixture
+def retriever(database):
+    return Speculative_Retriever(database.query_queue, database.response_queue)
+
+
+def test_similar_final_text_reuses_the_speculative_query(database, retriever):
+    partial = "Jarvis, what's on my calendar for tomorrow"
+    final = "Jarvis, what's on my calendar for tomorrow morning?"
+    assert query_similarity(normalize_query(final), normalize_query(partial)) >= 0.85
+    retriever.start(1, partial, "speculative query")
+    assert retriever.result(1, final, timeout=1) == ["memories for speculative query"]
+    assert (retriever.hits, retriever.misses) == (1, 0)
+    assert database.wait_for(1) == [(1, "speculative query")]
+    assert not retriever.in_flight and not retriever.responses
+
+
+def test_dissimilar_final_text_sends_a_new_query_and_cancels_the_old_one(database, retriever):
+    text = "Jarvis, what did I say about the budget review"
+    assert query_similarity(normalize_query(text), "jarvis play some music") < 0.85
+    retriever.start(1, "Jarvis, play some music")
+    assert retriever.result(1, text, "final query", timeout=1) == ["memories for final query"]
+    assert (retriever.hits, retriever.misses) == (0, 1)
+    assert database.wait_for(3) == [(1, "jarvis play some music"), (1, None), (2, "final query")]
+
+
+def test_results_are_never_reused_across_utterances(database, retriever):
+    retriever.start(1, "Jarvis, what time is it", "first")
+    database.wait_for(1)
+    time.sleep(0.1)
+    assert retriever.result(2, "Jarvis, what time is it", "second", timeout=1) == ["memories for second"]
+    # The earlier utterance's answer had already arrived, so it is discarded rather than reused
+    assert database.wait_for(2) == [(1, "first"), (2, "second")]
+    assert not retriever.responses and not retriever.in_flight
+
+
+def test_superseded_partials_are_cancelled_and_late_responses_dropped(database, retriever):
+    database.delay = 0.3
+    retriever.start(1, "Jarvis, remind me", "short")
+    retriever.start(1, "Jarvis, remind me to call the dentist on Friday afternoon", "long")
+    assert retriever.result(1, "Jarvis, remind me to call the dentist on Friday afternoon.", timeout=2) == ["memories for long"]
+    assert database.wait_for(3) == [(1, "short"), (2, "long"), (1, None)]
+
+    # The cancelled request's response still arrives, after the fact, and is ignored
+    time.sleep(0.1)
+    retriever.collect(timeout=0.5)
+    assert not retriever.responses and not retriever.in_flight
+
+
+def test_discarded_utterance_cancels_its_queries(database, retriever):
+    retriever.start(1, "Jarvis, turn on the lights")
+    retriever.start(2, "Jarvis, open the blinds")
+    retriever.discard(1)
+    assert database.wait_for(3)[2] == (1, None)
+    assert [utterance_id for utterance_id, _ in retriever.in_flight.values()] == [2]
+
+
+def test_in_flight_queries_are_bounded(database):
+    retriever = Speculative_Retriever(database.query_queue, database.response_queue, max_in_flight=2)
+    for utterance_id, text in enumerate(["jarvis one", "jarvis two", "jarvis three"], start=1):
+        retriever.start(utterance_id, text)
+    assert (1, None) in database.wait_for(4)
+    assert list(retriever.in_flight) == [2, 3]
+
+
+def test_timeout_cancels_and_returns_no_memories(database, retriever):
+    database.delay = 1.0
+    assert retriever.result(1, "Jarvis, hello", timeout=0.1) == []
+    assert database.wait_for(2) == [(1, "jarvis hello"), (1, None)]
+    assert not retriever.in_flight
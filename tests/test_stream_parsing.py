@@ -0,0 +1,58 @@
+from types import SimpleNamespace
+import pytest
+from Stream_Parsing import Sentence_Segmenter, Streaming_JSON_Parser, Tool_Call_Stream
+
+
+def segment(text, step, min_clause_length=None):
+    segmenter = Sentence_Segmenter(min_clause_length)
+    segments = []
+    for start in range(0, len(text), step):
+        segments += segmenter.feed(text[start:start + step])
+    remainder = segmenter.flush()
+    return segments + ([remainder] if remainder else [])
+
+
+@pytest.mark.parametrize("step", [1, 2, 7, 1000])
+@pytest.mark.parametrize("text, expected", [
+    ("Hello there. How are you? Great!", ["Hello there.", "How are you?", "Great!"]),
+    ("Mr. Smith paid $3.50 at 9 a.m. today. Then he left.", ["Mr. Smith paid $3.50 at 9 a.m. today.", "Then he left."]),
+    ("Visit example.com/a.b later. Ok.", ["Visit example.com/a.b later.", "Ok."]),
+    ('It is a 6" pipe. Next one. And another.', ['It is a 6" pipe.', "Next one.", "And another."]),
+    ('He said "Stop." Then left.', ['He said "Stop."', "Then left."]),
+    ("She said “Wait. Not yet.” Then sat down.", ["She said “Wait. Not yet.”", "Then sat down."]),
+])
+def test_sentences_are_the_same_however_the_text_is_chunked(text, expected, step):
+    assert segment(text, step) == expected
+
+
+def test_long_clauses_split_at_punctuation():
+    text = "This first clause is fairly long, and so is the second one here; short: end."
+    assert segment(text, 3, min_clause_length=20) == ["This first clause is fairly long,", "and so is the second one here;", "short: end."]
+
+
+def test_an_unclosed_curly_quote_stops_holding_sentences_together():
+    segmenter = Sentence_Segmenter(max_quote_length=40)
+    segments = segmenter.feed("“An unclosed quote. " + "Filler words go here. " * 5)
+    assert len(segments) >= 4
+
+
+def test_parser_reports_string_deltas_as_they_arrive():
+    parser = Streaming_JSON_Parser()
+    arguments = '{"response": "Caf\\u00e9 \\"open\\"", "n": 1, "other": "x"}'
+    text = {}
+    for char in arguments:
+        for key, delta in parser.feed(char).items():
+            text[key] = text.get(key, "") + delta
+    assert text == {"response": 'Café "open"', "other": "x"}
+    assert parser.complete
+    assert parser.value() == {"response": 'Café "open"', "n": 1, "other": "x"}
+
+
+def test_tool_calls_are_accumulated_by_index():
+    stream = Tool_Call_Stream()
+    chunks = [(0, "respond_to_user", '{"resp'), (1, "save_to_vector_database", '{"text": "a"}'), (0, None, 'onse": "hi"}')]
+    for index, name, arguments in chunks:
+        stream.feed(SimpleNamespace(index=index, function=SimpleNamespace(name=name, arguments=arguments)))
+    assert stream.calls[0]["name"] == "respond_to_user"
+    assert stream.calls[0]["parser"].value() == {"response": "hi"}
+    assert stream.calls[1]["parser"].value() == {"text": "a"}